@@ -11,30 +11,155 @@ from pathlib import Path
 # Рекомендуется задавать через переменную окружения
 BOT_TOKEN = os.getenv("RUNNING_BOT_TOKEN")
 
-if not BOT_TOKEN:
+# Несколько ботов (клубов) в одном процессе: путь к JSON-файлу со списком арендаторов
+# (токен, папка данных, админы каждого — см. services/tenants.py); тогда RUNNING_BOT_TOKEN не нужен
+TENANTS_FILE = os.getenv("RUNNING_BOT_TENANTS", "")
+
+if not BOT_TOKEN and not TENANTS_FILE:
     raise RuntimeError("❌ RUNNING_BOT_TOKEN не задан")
  
 
+# Адрес Bot API: по умолчанию api.telegram.org; для локального сервера Bot API или
+# нагрузочного теста (scripts/load_test.py) — свой, токен дописывается в конец
+BOT_API_BASE_URL = os.getenv("BOT_API_BASE_URL", "https://api.telegram.org/bot")
+BOT_API_FILE_URL = os.getenv("BOT_API_FILE_URL", "https://api.telegram.org/file/bot")
+
 # Корень проекта
 BASE_DIR = Path(__file__).resolve().parent
 
 # Режим хранения данных: "json" или "sqlite"
 # JSON — простой вариант для старта, данные в файлах
 # SQLite — для больших объёмов и быстрого поиска
+# memory — копия SQLite-базы в памяти процесса (поиск через FTS5, без обращений к диску)
 STORAGE_MODE = os.getenv("STORAGE_MODE", "json")
 
-# Пути к файлам данных (для режима JSON)
-DATA_DIR = BASE_DIR / "data"
+# Пути к файлам данных (для режима JSON); RUNNING_BOT_DATA_DIR — другая папка данных
+# (например, временная копия для нагрузочного теста)
+DATA_DIR = Path(os.getenv("RUNNING_BOT_DATA_DIR", str(BASE_DIR / "data")))
 EXERCISES_JSON = DATA_DIR / "exercises.json"
 COMPLEXES_JSON = DATA_DIR / "complexes.json"
 EDUCATION_JSON = DATA_DIR / "education.json"
 TERMINOLOGY_JSON = DATA_DIR / "terminology.json"
+# Журнал правок контента из бота (режим JSON): переносится в *.json при остановке
+CONTENT_JOURNAL = DATA_DIR / "content_journal.jsonl"
 
 # Путь к SQLite (для режима SQLite)
-SQLITE_DB_PATH = BASE_DIR / "data" / "running_club.db"
+SQLITE_DB_PATH = DATA_DIR / "running_club.db"
+
+# Защита от блокировок SQLite: сколько секунд ждать освобождения БД, сколько раз подряд
+# «БД занята» размыкают цепь и через сколько секунд пробовать снова. Пока цепь разомкнута,
+# чтение идёт из снимка в памяти (снимок не строится, если строк больше SQLITE_SNAPSHOT_MAX_ROWS,
+# и обновляется в фоне не чаще раза в SQLITE_SNAPSHOT_REFRESH_SECONDS сек).
+SQLITE_QUERY_TIMEOUT = float(os.getenv("SQLITE_QUERY_TIMEOUT", "0.5"))
+SQLITE_BREAKER_FAILURES = int(os.getenv("SQLITE_BREAKER_FAILURES", "3"))
+SQLITE_BREAKER_RESET_SECONDS = float(os.getenv("SQLITE_BREAKER_RESET_SECONDS", "5"))
+SQLITE_SNAPSHOT_MAX_ROWS = int(os.getenv("SQLITE_SNAPSHOT_MAX_ROWS", "200000"))
+SQLITE_SNAPSHOT_REFRESH_SECONDS = float(os.getenv("SQLITE_SNAPSHOT_REFRESH_SECONDS", "30"))
+
+# Кэш результатов поиска (LRU + TTL): лимит записей, суммарный размер в байтах, время жизни в секундах
+QUERY_CACHE_MAX_ENTRIES = int(os.getenv("QUERY_CACHE_MAX_ENTRIES", "2048"))
+QUERY_CACHE_MAX_BYTES = int(os.getenv("QUERY_CACHE_MAX_BYTES", str(8 * 1024 * 1024)))
+QUERY_CACHE_TTL_SECONDS = float(os.getenv("QUERY_CACHE_TTL_SECONDS", "600"))
+
+# Inline-режим (@бот запрос): сколько результатов отдавать и сколько секунд Telegram кэширует ответ
+INLINE_RESULTS_LIMIT = int(os.getenv("INLINE_RESULTS_LIMIT", "20"))
+INLINE_CACHE_TIME = int(os.getenv("INLINE_CACHE_TIME", "300"))
+
+# Сколько комплексов на одной странице списка (фильтр по длительности и структуре)
+COMPLEXES_PAGE_SIZE = int(os.getenv("COMPLEXES_PAGE_SIZE", "8"))
+
+# Сколько материалов на одной странице категории раздела «Образование»
+EDUCATION_PAGE_SIZE = int(os.getenv("EDUCATION_PAGE_SIZE", "10"))
+
+# Сохранение состояния диалога (режим ввода, курсор пагинации) между перезапусками
+# STATE_PERSISTENCE=0 — хранить только в памяти, как раньше
+STATE_PERSISTENCE = os.getenv("STATE_PERSISTENCE", "1") != "0"
+STATE_DB_PATH = DATA_DIR / "state.db"
+# Записи без активности дольше TTL удаляются из памяти и БД; изменения пишутся раз в FLUSH_INTERVAL сек
+STATE_TTL_SECONDS = float(os.getenv("STATE_TTL_SECONDS", str(24 * 3600)))
+STATE_FLUSH_INTERVAL = float(os.getenv("STATE_FLUSH_INTERVAL", "10"))
+
+# Ограничение исходящих запросов к Bot API (сообщений в секунду): всего, в личный чат, в группу;
+# запас токенов на чат и число повторов при flood control / сетевых ошибках
+OUTBOUND_GLOBAL_RATE = float(os.getenv("OUTBOUND_GLOBAL_RATE", "30"))
+OUTBOUND_CHAT_RATE = float(os.getenv("OUTBOUND_CHAT_RATE", "1"))
+OUTBOUND_GROUP_RATE = float(os.getenv("OUTBOUND_GROUP_RATE", str(20 / 60)))
+OUTBOUND_CHAT_BURST = float(os.getenv("OUTBOUND_CHAT_BURST", "3"))
+OUTBOUND_MAX_RETRIES = int(os.getenv("OUTBOUND_MAX_RETRIES", "3"))
+
+# Защита от флуда (services/admission.py): сколько апдейтов обрабатываются одновременно
+# (апдейты одного пользователя — всегда по очереди); сколько сообщений и нажатий кнопок
+# в секунду допускается от пользователя и запас на всплеск (0 — без ограничения); лишние
+# отбрасываются до обращения к данным, а просьба подождать — не чаще раза в NOTICE_INTERVAL сек.
+# 4/с с запасом 10 пропускают быстрое листание страниц и двойные нажатия человека,
+# а флуд скриптом (десятки апдейтов в секунду) всё равно отсекается
+ADMISSION_MAX_CONCURRENT = int(os.getenv("ADMISSION_MAX_CONCURRENT", "32"))
+ADMISSION_USER_RATE = float(os.getenv("ADMISSION_USER_RATE", "4"))
+ADMISSION_USER_BURST = float(os.getenv("ADMISSION_USER_BURST", "10"))
+ADMISSION_NOTICE_INTERVAL = float(os.getenv("ADMISSION_NOTICE_INTERVAL", "10"))
+
+# HTTP-транспорт к Bot API: отдельные пулы соединений для long polling (getUpdates) и для
+# отправки; размер пула отправки и сколько его соединений держать открытыми (keep-alive)
+# и сколько секунд, ожидание свободного соединения и прочие таймауты (сек);
+# HTTP_VERSION=2 — HTTP/2 (нужен пакет httpx[http2]), иначе 1.1
+HTTP_SEND_POOL_SIZE = int(os.getenv("HTTP_SEND_POOL_SIZE", "256"))
+HTTP_SEND_KEEPALIVE = int(os.getenv("HTTP_SEND_KEEPALIVE", "64"))
+HTTP_SEND_POOL_TIMEOUT = float(os.getenv("HTTP_SEND_POOL_TIMEOUT", "1"))
+HTTP_UPDATES_POOL_SIZE = int(os.getenv("HTTP_UPDATES_POOL_SIZE", "1"))
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "30"))
+HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", "5"))
+HTTP_READ_TIMEOUT = float(os.getenv("HTTP_READ_TIMEOUT", "5"))
+HTTP_WRITE_TIMEOUT = float(os.getenv("HTTP_WRITE_TIMEOUT", "5"))
+HTTP_VERSION = os.getenv("HTTP_VERSION", "1.1")
+
+# Аналитика поиска: события копятся в кольцевом буфере (SEARCH_STATS_BUFFER) и раз в
+# SEARCH_STATS_FLUSH_INTERVAL сек агрегируются в хранилище: sqlite (data/search_stats.db),
+# jsonl (data/search_stats.jsonl) или off (агрегаты только в памяти процесса, до перезапуска)
+SEARCH_STATS_STORE = os.getenv("SEARCH_STATS_STORE", "sqlite")
+SEARCH_STATS_BUFFER = int(os.getenv("SEARCH_STATS_BUFFER", "10000"))
+SEARCH_STATS_FLUSH_INTERVAL = float(os.getenv("SEARCH_STATS_FLUSH_INTERVAL", "30"))
+SEARCH_STATS_DB_PATH = DATA_DIR / "search_stats.db"
+SEARCH_STATS_JSONL = DATA_DIR / "search_stats.jsonl"
+
+# Режим запуска: fast — long polling сразу, загрузка контента и индексов в фоне после старта;
+# eager — сначала загрузка, потом приём апдейтов; lazy — всё загружается при первом обращении
+STARTUP_MODE = os.getenv("STARTUP_MODE", "fast")
+
+# Тёплый перезапуск: при остановке горячие кэши (выдача поиска, inline-карточки, без
+# STATE_PERSISTENCE — курсоры листания) сохраняются в WARM_STATE_PATH и восстанавливаются
+# при запуске, если версия контента та же; затем прогрев повторяет WARM_TOP_QUERIES самых
+# частых запросов за WARM_TOP_DAYS дней. WARM_RESTART=0 — выключить
+WARM_RESTART = os.getenv("WARM_RESTART", "1") != "0"
+WARM_STATE_PATH = DATA_DIR / "warm_state.pickle"
+WARM_TOP_QUERIES = int(os.getenv("WARM_TOP_QUERIES", "100"))
+WARM_TOP_DAYS = int(os.getenv("WARM_TOP_DAYS", "7"))
+
+# Профилирование по команде /profile: интервал семплирования (мс) и предел длительности (сек)
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "5"))
+PROFILE_MAX_SECONDS = int(os.getenv("PROFILE_MAX_SECONDS", "60"))
+
+# Трассировка: доля апдейтов, для которых пишутся спаны (0 — выключено, 1 — все),
+# предел спанов на один апдейт и размер очереди записи в data/traces.jsonl
+TRACE_SAMPLE_RATE = float(os.getenv("TRACE_SAMPLE_RATE", "0"))
+TRACE_MAX_SPANS = int(os.getenv("TRACE_MAX_SPANS", "200"))
+TRACE_QUEUE_SIZE = int(os.getenv("TRACE_QUEUE_SIZE", "10000"))
+TRACES_JSONL = DATA_DIR / "traces.jsonl"
+
+# Логирование: уровень, формат (text или json), размер очереди фонового потока записи;
+# доля сохраняемых INFO-записей шумных логгеров (через запятую) и предел повторов
+# WARNING+ с одного места: LOG_ERROR_BURST записей за LOG_ERROR_WINDOW сек
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text")
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+LOG_INFO_SAMPLE_RATE = float(os.getenv("LOG_INFO_SAMPLE_RATE", "1"))
+LOG_SAMPLED_LOGGERS = tuple(x.strip() for x in os.getenv("LOG_SAMPLED_LOGGERS", "httpx").split(",") if x.strip())
+LOG_ERROR_BURST = int(os.getenv("LOG_ERROR_BURST", "5"))
+LOG_ERROR_WINDOW = float(os.getenv("LOG_ERROR_WINDOW", "60"))
 
 # Пользователи, нажавшие /start (список подписчиков бота)
 USERS_JSON = DATA_DIR / "users.json"
+# В режиме SQLite подписчики хранятся в отдельной БД (при первом запуске переносятся из users.json)
+USERS_DB_PATH = DATA_DIR / "users.db"
 
 # ID администраторов (Telegram user_id). Только они могут вызвать /users и увидеть список подписчиков.
 # Узнать свой ID: напишите в Telegram боту @userinfobot или @getmyid_bot
@@ -2,13 +2,50 @@
 """
 Модуль работы с данными.
 Экспортирует фабрику get_db() в зависимости от config.STORAGE_MODE.
+Поиск обслуживается через кэш запросов (database/cache.py). У каждого арендатора
+(services/tenants.py) своё хранилище — данные из его папки — и свой кэш.
 """
 
-from config import STORAGE_MODE
+from config import QUERY_CACHE_MAX_BYTES, QUERY_CACHE_MAX_ENTRIES, QUERY_CACHE_TTL_SECONDS, STORAGE_MODE
+from database.cache import CachedDB, QueryCache
+from services import metrics, tenants, warm_restart
+from services.startup import register_warmup
+from services.tenants import Tenant, TenantLocal
 
 if STORAGE_MODE == "sqlite":
-    from database.sqlite_db import RunningClubDB as get_db
+    from database.sqlite_db import RunningClubDB as _Backend
+elif STORAGE_MODE == "memory":
+    from database.memory_db import MemoryDB as _Backend
 else:
-    from database.json_db import JsonDB as get_db
+    from database.json_db import JsonDB as _Backend
+
+
+def _open(tenant: Tenant) -> CachedDB:
+    cache = QueryCache(
+        max_entries=QUERY_CACHE_MAX_ENTRIES,
+        max_bytes=QUERY_CACHE_MAX_BYTES,
+        ttl=QUERY_CACHE_TTL_SECONDS,
+    )
+    # У арендатора по умолчанию — пути из config.py, как без арендаторов
+    return CachedDB(_Backend, cache, None if tenant is tenants.DEFAULT else tenant.data_dir)
+
+
+def _cache_bytes(tenant: Tenant) -> int:
+    db = _dbs.peek(tenant)
+    return db.cache.stats()["bytes"] if db is not None else 0
+
+
+_dbs: TenantLocal[CachedDB] = TenantLocal(_open)
+metrics.register("query_cache", lambda: get_db().cache.stats())
+tenants.register_cache_size("query_cache", _cache_bytes)
+warm_restart.register_cache("query_cache", lambda: get_db().cache)
+# Загрузка контента (для memory — копия БД и триграммные индексы) при старте, а не на первом запросе
+register_warmup("content", lambda: get_db().backend)
+
+
+def get_db() -> CachedDB:
+    """Хранилище текущего арендатора (бэкенд по STORAGE_MODE + кэш запросов)."""
+    return _dbs.get()
+
 
 __all__ = ["get_db"]
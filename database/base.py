@@ -1,19 +1,65 @@
 # -*- coding: utf-8 -*-
 """
 Базовый интерфейс хранилища данных.
-Оба бэкенда (JSON и SQLite) реализуют эти методы.
+Все бэкенды (json, sqlite, memory) реализуют эти методы и отвечают одинаково:
+правила поиска и порядок списков — в database/search_rules.py,
+проверка — scripts/bench_backends.py.
+Правка одной записи (apply_change) и сброс правок на диск (compact) — необязательная
+часть интерфейса: бэкенд без записи отвечает NotImplementedError.
+Бэкенд, отвечающий из запасных данных (снимок SQLite при заблокированной БД), отмечает
+это note_fallback(): такие ответы и построенные из них индексы не кэшируются.
 """
 
 from abc import ABC, abstractmethod
-from typing import Any, Dict, List, Optional
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from database.records import Record
+
+# Сколько ответов в текущем контексте дано из запасных данных
+_fallbacks: ContextVar[int] = ContextVar("fallbacks", default=0)
+
+
+class ContentUnavailable(RuntimeError):
+    """Хранилище недоступно, а запасных данных нет: пустой ответ был бы неправдой."""
+
+
+def note_fallback() -> None:
+    """Ответ дан из запасных данных: вызывающий код не должен его кэшировать."""
+    _fallbacks.set(_fallbacks.get() + 1)
+
+
+def fallback_count() -> int:
+    """Счётчик ответов из запасных данных в текущем контексте (сравнивать до и после вызова)."""
+    return _fallbacks.get()
 
 
 class BaseDB(ABC):
     """Абстрактный класс для работы с данными."""
 
+    @classmethod
+    def content_version(cls, data_dir: Optional[Path] = None) -> str:
+        """
+        Версия контента (дешёвая проверка без загрузки данных).
+        Меняется при изменении данных на диске; используется для сброса кэшей.
+        data_dir — папка данных арендатора вместо путей из config.py.
+        """
+        return ""
+
+    @classmethod
+    def open(cls, data_dir: Optional[Path] = None) -> "BaseDB":
+        """Экземпляр бэкенда для папки данных data_dir (None — пути из config.py)."""
+        return cls() if data_dir is None else cls(data_dir)  # type: ignore[call-arg]
+
     @abstractmethod
     def search_exercises(self, query: str) -> List[Dict[str, Any]]:
-        """Поиск упражнений по названию или ключевым словам."""
+        """Упражнения, где каждое слово запроса есть в названии, ключевых словах или описании; по названию."""
+        pass
+
+    @abstractmethod
+    def get_all_exercises(self) -> List[Dict[str, Any]]:
+        """Список всех упражнений по названию (для индексов поиска)."""
         pass
 
     @abstractmethod
@@ -23,7 +69,7 @@ class BaseDB(ABC):
 
     @abstractmethod
     def get_all_education(self) -> List[Dict[str, Any]]:
-        """Список всех материалов раздела «Образование»."""
+        """Список всех материалов раздела «Образование» (по title)."""
         pass
 
     @abstractmethod
@@ -33,7 +79,7 @@ class BaseDB(ABC):
 
     @abstractmethod
     def get_all_complexes(self) -> List[Dict[str, Any]]:
-        """Список всех комплексов."""
+        """Список всех комплексов (по названию)."""
         pass
 
     @abstractmethod
@@ -43,15 +89,62 @@ class BaseDB(ABC):
 
     @abstractmethod
     def search_terminology(self, term: str) -> Optional[Dict[str, Any]]:
-        """Поиск термина (точное совпадение или по ключевым словам)."""
+        """Термин: точное совпадение или первый по алфавиту, содержащий все слова запроса."""
         pass
 
     @abstractmethod
     def get_all_terms(self) -> List[str]:
-        """Список всех терминов (для подсказок)."""
+        """Список всех терминов по алфавиту (для подсказок)."""
         pass
 
     @abstractmethod
     def get_all_terminology(self) -> List[Dict[str, Any]]:
         """Список всех терминов с определениями (для кнопок)."""
         pass
+
+    def filter_complexes(
+        self, min_minutes: Optional[int] = None, max_minutes: Optional[int] = None, structure: str = ""
+    ) -> List[Dict[str, Any]]:
+        """
+        Комплексы длительностью от min_minutes до max_minutes минут, в структуре которых
+        есть слова, начинающиеся со слов structure (правила — search_rules.filter_complexes).
+        """
+        # Импорт здесь: search_rules импортирует database.cache, а тот — этот модуль
+        from database.search_rules import filter_complexes
+
+        return filter_complexes(self.get_all_complexes(), min_minutes, max_minutes, structure)
+
+    def get_education_categories(self) -> List[Tuple[str, int]]:
+        """Категории материалов и число материалов в каждой («» — без категории, последней)."""
+        from database.search_rules import education_categories
+
+        return education_categories(self.get_all_education())
+
+    def get_education_by_category(self, category: str) -> List[Dict[str, Any]]:
+        """Материалы категории («» — без категории) по title."""
+        from database.search_rules import education_category
+
+        return [m for m in self.get_all_education() if education_category(m) == category]
+
+    def get_record(self, kind: str, key: str) -> Optional[Record]:
+        """Запись вида kind (exercises, complexes, education, terminology) по ключевому полю."""
+        if kind == "exercises":
+            return self.get_exercise_by_id(key)  # type: ignore[return-value]
+        if kind == "complexes":
+            return self.get_complex_by_id(key)  # type: ignore[return-value]
+        if kind == "education":
+            return self.get_education_by_id(key)  # type: ignore[return-value]
+        for t in self.get_all_terminology():
+            if t.get("term") == key:
+                return t  # type: ignore[return-value]
+        return None
+
+    def apply_change(self, kind: str, key: str, record: Optional[Record]) -> None:
+        """
+        Добавить или заменить (record) либо удалить (None) одну запись: сразу в данных
+        в памяти и атомарно на диске. Остальные записи не перечитываются.
+        """
+        raise NotImplementedError(f"{type(self).__name__} не поддерживает изменение данных")
+
+    def compact(self) -> None:
+        """Сбросить накопленные правки в основные файлы данных (если бэкенд их копит)."""
@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+"""
+Circuit breaker для обращений к хранилищу.
+После failure_threshold ошибок подряд цепь размыкается на reset_timeout секунд:
+запросы к бэкенду не выполняются, вызывающий код сразу берёт запасной вариант.
+Затем пропускается пробный запрос: успех замыкает цепь, ошибка — снова размыкает.
+"""
+
+import threading
+import time
+from typing import Any, Dict
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    """Счётчик ошибок с тремя состояниями: closed → open → half_open → closed."""
+
+    def __init__(self, failure_threshold: int, reset_timeout: float) -> None:
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._lock = threading.Lock()
+        self.opens = 0
+        self.rejected = 0
+
+    def allow(self) -> bool:
+        """Можно ли сейчас обращаться к бэкенду."""
+        with self._lock:
+            if self.state == OPEN:
+                if time.monotonic() - self._opened_at < self.reset_timeout:
+                    self.rejected += 1
+                    return False
+                self.state = HALF_OPEN
+            return True
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._failures = 0
+            self.state = CLOSED
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            if self.state == HALF_OPEN or self._failures >= self.failure_threshold:
+                if self.state != OPEN:
+                    self.opens += 1
+                self.state = OPEN
+                self._opened_at = time.monotonic()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "state": self.state,
+                "consecutive_failures": self._failures,
+                "opens": self.opens,
+                "rejected": self.rejected,
+            }
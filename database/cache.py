@@ -0,0 +1,310 @@
+# -*- coding: utf-8 -*-
+"""
+Кэш результатов поиска (LRU + TTL) перед бэкендом данных.
+Ключ — нормализованный запрос и версия контента: повторные запросы
+не доходят до бэкенда, а изменение данных на диске сбрасывает кэш.
+Правки через CachedDB.apply_change версию не меняют: удаляются только записи
+кэша по запросам, на которые правка могла повлиять.
+"""
+
+import sys
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Callable, Dict, Hashable, List, Optional, Tuple, Type
+
+from database.base import BaseDB, fallback_count
+from database.records import Record
+from services import tenants
+from services.tracing import traced
+
+_MISSING = object()
+
+
+def normalize_query(text: str) -> str:
+    """Нижний регистр, без пробелов по краям, повторные пробелы схлопнуты."""
+    return " ".join((text or "").lower().split())
+
+
+def estimate_size(obj: Any) -> int:
+    """Приблизительный размер объекта в байтах (вместе с вложенными dict/list, записями и объектами Bot API)."""
+    size = sys.getsizeof(obj)
+    if isinstance(obj, Record):
+        for v in obj.values():
+            size += estimate_size(v)
+    elif isinstance(obj, dict):
+        for k, v in obj.items():
+            size += estimate_size(k) + estimate_size(v)
+    elif isinstance(obj, (list, tuple)):
+        for v in obj:
+            size += estimate_size(v)
+    elif hasattr(obj, "to_json"):
+        # Объект Bot API (карточка inline-ответа): атрибуты в __slots__, getsizeof их не видит —
+        # размер по сериализованному виду
+        size += len(obj.to_json().encode("utf-8"))
+    return size
+
+
+class QueryCache:
+    """LRU-кэш с TTL и ограничением по числу записей и суммарному размеру."""
+
+    def __init__(self, max_entries: int, max_bytes: int, ttl: float) -> None:
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        # ключ -> (истекает_в, размер, значение); порядок = давность использования
+        self._data: "OrderedDict[Hashable, Tuple[float, int, Any]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """Значение по ключу или default (None тоже кэшируется как значение)."""
+        now = time.monotonic()
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                self.misses += 1
+                return default
+            expires_at, size, value = item
+            if expires_at < now:
+                del self._data[key]
+                self._bytes -= size
+                self.expirations += 1
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key: Hashable, value: Any, size: Optional[int] = None) -> None:
+        """
+        Сохранить значение; при переполнении вытесняются самые старые записи.
+        size — размер значения, если вызывающий знает его дешевле, чем estimate_size.
+        """
+        size = estimate_size(key) + (estimate_size(value) if size is None else size)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._data.pop(key, None)
+            if old is not None:
+                self._bytes -= old[1]
+            self._data[key] = (time.monotonic() + self.ttl, size, value)
+            self._bytes += size
+            while len(self._data) > self.max_entries or self._bytes > self.max_bytes:
+                _, (_, evicted_size, _) = self._data.popitem(last=False)
+                self._bytes -= evicted_size
+                self.evictions += 1
+
+    def get_or_load(self, key: Hashable, loader: Callable[[], Any]) -> Any:
+        """
+        Значение из кэша, а при промахе — loader() с сохранением результата
+        (кроме ответа из запасных данных бэкенда: он не кэшируется).
+        """
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            fallbacks = fallback_count()
+            value = loader()
+            if fallback_count() == fallbacks:
+                self.put(key, value)
+        return value
+
+    def dump(self) -> List[Tuple[Hashable, Any]]:
+        """Живые записи (ключ, значение) от давно использованных к недавним — для тёплого перезапуска."""
+        now = time.monotonic()
+        with self._lock:
+            return [(key, value) for key, (expires_at, _, value) in self._data.items() if expires_at >= now]
+
+    def load(self, items: List[Tuple[Hashable, Any]]) -> int:
+        """Положить записи из dump() (порядок LRU сохраняется, TTL отсчитывается заново). Возвращает их число."""
+        for key, value in items:
+            self.put(key, value)
+        return len(items)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self._bytes = 0
+
+    def invalidate(self, predicate: Callable[[Hashable], bool]) -> int:
+        """Удалить записи, ключ которых подходит под predicate (перебор кэша, не данных). Возвращает их число."""
+        with self._lock:
+            keys = [key for key in self._data if predicate(key)]
+            for key in keys:
+                self._bytes -= self._data.pop(key)[1]
+            self.invalidations += len(keys)
+        return len(keys)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "entries": len(self._data),
+                "bytes": self._bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations,
+            }
+
+
+class CachedDB(BaseDB):
+    """
+    Обёртка над бэкендом: поиск идёт через QueryCache, остальные методы — напрямую.
+    Бэкенд создаётся лениво и пересоздаётся (с перечитыванием данных) при смене версии контента.
+    Создание под блокировкой: фоновый прогрев и первый запрос не загружают данные дважды.
+    Правки (apply_change) идут в бэкенд без пересоздания: версия на диске после своей
+    записи запоминается, и перечитывание вызывает только изменение файлов извне.
+    """
+
+    def __init__(self, backend_cls: Type[BaseDB], cache: QueryCache, data_dir: Optional[Path] = None) -> None:
+        """data_dir — папка данных арендатора (None — пути из config.py)."""
+        self._backend_cls = backend_cls
+        self._cache = cache
+        self._data_dir = data_dir
+        self._backend: Optional[BaseDB] = None
+        # Версия в ключах кэша; меняется только вместе с disk_version при изменении файлов извне
+        self._version: Optional[str] = None
+        self._disk_version: Optional[str] = None
+        self._lock = threading.Lock()
+
+    def content_version(self) -> str:  # type: ignore[override]
+        """Текущая версия контента; при изменении файлов данных извне сбрасывает кэш и бэкенд."""
+        disk_version = self._backend_cls.content_version(self._data_dir)
+        if disk_version != self._disk_version:
+            # Сброс под блокировкой, по версии, перечитанной под ней: параллельные запросы
+            # не сбрасывают бэкенд и кэш повторно, не откатывают версию и не мешают apply_change
+            with self._lock:
+                disk_version = self._backend_cls.content_version(self._data_dir)
+                if disk_version != self._disk_version:
+                    self._disk_version = self._version = disk_version
+                    self._backend = None
+                    self._cache.clear()
+        return self._version  # type: ignore[return-value]
+
+    def _get_backend(self) -> BaseDB:
+        backend = self._backend
+        if backend is None:
+            with self._lock:
+                backend = self._backend
+                if backend is None:
+                    with tenants.measure_load("content"):
+                        backend = self._backend = self._backend_cls.open(self._data_dir)
+        return backend
+
+    @property
+    def cache(self) -> QueryCache:
+        """Кэш запросов этого хранилища."""
+        return self._cache
+
+    @property
+    def backend(self) -> BaseDB:
+        """Актуальный экземпляр бэкенда."""
+        self.content_version()
+        return self._get_backend()
+
+    def cached(self, kind: str, query: str, loader: Callable[[str], Any]) -> Any:
+        """
+        Результат loader(q) для нормализованного запроса q из кэша.
+        kind разделяет пространства ключей (exercises, terminology, universal...).
+        """
+        version = self.content_version()
+        q = normalize_query(query)
+        return self._cache.get_or_load((kind, q, version), lambda: loader(q))
+
+    @traced("db.apply_change")
+    def apply_change(  # type: ignore[override]
+        self,
+        kind: str,
+        key: str,
+        record: Optional[Record],
+        affected: Optional[Callable[[str, str], bool]] = None,
+    ) -> int:
+        """
+        Правка одной записи в бэкенде. affected(вид кэша, запрос) — затронута ли
+        закэшированная выдача; без него кэш сбрасывается целиком. Возвращает число
+        удалённых записей кэша.
+        """
+        backend = self.backend
+        with self._lock:
+            backend.apply_change(kind, key, record)
+            # Своя запись на диск — не повод перечитывать данные: бэкенд уже их содержит
+            self._disk_version = self._backend_cls.content_version(self._data_dir)
+        return self._cache.invalidate(lambda k: affected is None or affected(k[0], k[1]))
+
+    def compact(self) -> None:
+        """Перенести накопленные правки в основные файлы данных (при остановке бота)."""
+        with self._lock:
+            if self._backend is not None:
+                self._backend.compact()
+                self._disk_version = self._backend_cls.content_version(self._data_dir)
+
+    def get_record(self, kind: str, key: str) -> Optional[Record]:
+        return self.backend.get_record(kind, key)
+
+    @traced("db.search_exercises")
+    def search_exercises(self, query: str) -> List[Dict[str, Any]]:
+        return self.cached("exercises", query, lambda q: self._get_backend().search_exercises(q))
+
+    @traced("db.get_all_exercises")
+    def get_all_exercises(self) -> List[Dict[str, Any]]:
+        return self.backend.get_all_exercises()
+
+    @traced("db.get_exercise_by_id")
+    def get_exercise_by_id(self, exercise_id: str) -> Optional[Dict[str, Any]]:
+        return self.backend.get_exercise_by_id(exercise_id)
+
+    @traced("db.get_all_education")
+    def get_all_education(self) -> List[Dict[str, Any]]:
+        return self.backend.get_all_education()
+
+    @traced("db.get_education_categories")
+    def get_education_categories(self) -> List[Tuple[str, int]]:
+        return self.backend.get_education_categories()
+
+    @traced("db.get_education_by_category")
+    def get_education_by_category(self, category: str) -> List[Dict[str, Any]]:
+        return self.backend.get_education_by_category(category)
+
+    @traced("db.get_education_by_id")
+    def get_education_by_id(self, education_id: str) -> Optional[Dict[str, Any]]:
+        return self.backend.get_education_by_id(education_id)
+
+    @traced("db.get_all_complexes")
+    def get_all_complexes(self) -> List[Dict[str, Any]]:
+        return self.backend.get_all_complexes()
+
+    @traced("db.filter_complexes")
+    def filter_complexes(
+        self, min_minutes: Optional[int] = None, max_minutes: Optional[int] = None, structure: str = ""
+    ) -> List[Dict[str, Any]]:
+        """Результат фильтра кэшируется целиком (страницы — срезы одного списка)."""
+        version = self.content_version()
+        words = normalize_query(structure)
+        return self._cache.get_or_load(
+            ("complexes", (min_minutes, max_minutes, words), version),
+            lambda: self._get_backend().filter_complexes(min_minutes, max_minutes, words),
+        )
+
+    @traced("db.get_complex_by_id")
+    def get_complex_by_id(self, complex_id: str) -> Optional[Dict[str, Any]]:
+        return self.backend.get_complex_by_id(complex_id)
+
+    @traced("db.search_terminology")
+    def search_terminology(self, term: str) -> Optional[Dict[str, Any]]:
+        return self.cached("terminology", term, lambda q: self._get_backend().search_terminology(q))
+
+    @traced("db.get_all_terms")
+    def get_all_terms(self) -> List[str]:
+        return self.backend.get_all_terms()
+
+    @traced("db.get_all_terminology")
+    def get_all_terminology(self) -> List[Dict[str, Any]]:
+        return self.backend.get_all_terminology()
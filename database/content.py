@@ -0,0 +1,177 @@
+# -*- coding: utf-8 -*-
+"""
+Правка контента из бота: добавление, изменение и удаление упражнений, комплексов,
+материалов и терминов.
+Запись передаётся текстом «поле: значение» по строке на поле (строка без «поле:» —
+продолжение предыдущего значения), ключевые слова — через запятую. Правка
+существующей записи меняет только перечисленные поля.
+Записи неизменяемые: правка создаёт новую запись и заменяет старую в бэкенде
+(get_db().apply_change), в кэше запросов удаляются только затронутые запросы,
+подписчики on_change (индекс inline-поиска) обновляют только свои записи о ней.
+"""
+
+import logging
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from database import get_db
+from database.records import KINDS, Record
+from database.search_index import tokenize
+from database.search_rules import complex_matches, exercise_text, matches
+from services import metrics
+from services.metrics import LatencyWindow
+
+logger = logging.getLogger(__name__)
+
+# Названия видов в командах (в т. ч. по-русски) -> вид
+ALIASES: Dict[str, str] = {
+    "exercise": "exercises", "exercises": "exercises", "упражнение": "exercises", "упражнения": "exercises",
+    "complex": "complexes", "complexes": "complexes", "комплекс": "complexes", "комплексы": "complexes",
+    "material": "education", "education": "education", "материал": "education", "материалы": "education",
+    "term": "terminology", "terminology": "terminology", "термин": "terminology", "термины": "terminology",
+}
+
+# Обязательное поле записи помимо ключа (NOT NULL в схеме SQLite)
+REQUIRED_FIELDS = {"exercises": "name", "complexes": "name", "education": "title", "terminology": "definition"}
+
+Listener = Callable[[str, Optional[Record], Optional[Record]], None]
+_listeners: List[Listener] = []
+_latency = LatencyWindow()
+_stats = {"added": 0, "updated": 0, "deleted": 0, "failed": 0, "invalidated": 0}
+
+
+def _content_stats() -> Dict[str, Any]:
+    return {**_stats, **_latency.percentiles()}
+
+
+metrics.register("content", _content_stats)
+
+
+def on_change(listener: Listener) -> None:
+    """Подписаться на правки: listener(вид, старая запись или None, новая запись или None)."""
+    _listeners.append(listener)
+
+
+def resolve_kind(name: str) -> str:
+    kind = ALIASES.get((name or "").strip().lower())
+    if kind is None:
+        raise ValueError(f"Неизвестный вид записи {name!r}: упражнение, комплекс, материал или термин")
+    return kind
+
+
+def parse_fields(kind: str, text: str) -> Dict[str, str]:
+    """Поля из строк «поле: значение»; неизвестное поле в начале строки — часть предыдущего значения."""
+    known = KINDS[kind].record._fields
+    fields: Dict[str, str] = {}
+    current: Optional[str] = None
+    for line in (text or "").splitlines():
+        name, sep, value = line.partition(":")
+        name = name.strip().lower()
+        if sep and name in known:
+            current = name
+            fields[name] = value.strip()
+        elif current is not None:
+            fields[current] = f"{fields[current]}\n{line.rstrip()}".strip()
+        elif line.strip():
+            raise ValueError(f"Строка {line.strip()[:40]!r} не начинается с поля: {', '.join(known)}")
+    return fields
+
+
+def _value(field: str, value: str) -> Any:
+    if field == "keywords":
+        return [w.strip() for w in value.replace("\n", ",").split(",") if w.strip()]
+    if field == "duration_minutes":
+        # Пустое значение — длительность не указана (как у комплекса без поля в JSON)
+        if not value:
+            return None
+        if not value.isdigit():
+            raise ValueError(f"duration_minutes — целое число минут, а не {value!r}")
+        return int(value)
+    return value
+
+
+def build_record(kind: str, fields: Dict[str, str], old: Optional[Record]) -> Record:
+    """Новая запись: поля старой (если есть), поверх — заданные. ValueError — нет обязательных полей."""
+    spec = KINDS[kind]
+    data = old.to_dict() if old is not None else {}
+    data.update((field, _value(field, value)) for field, value in fields.items())
+    for field in (spec.key, REQUIRED_FIELDS[kind]):
+        if not str(data.get(field) or "").strip():
+            raise ValueError(f"Не заполнено поле {field}")
+    return spec.record(**data)
+
+
+def format_fields(record: Record) -> str:
+    """Запись текстом «поле: значение» (его можно отправить в /edit после правки)."""
+    lines = []
+    for field, value in record.items():
+        if isinstance(value, tuple):
+            value = ", ".join(value)
+        lines.append(f"{field}: {'' if value is None else value}")
+    return "\n".join(lines)
+
+
+def _affected(kind: str, old: Optional[Record], new: Optional[Record]) -> Callable[[str, str], bool]:
+    """
+    Затронута ли закэшированная выдача (вид кэша, нормализованный запрос) правкой:
+    запрос находит старую или новую запись по тем же правилам, что и поиск (search_rules).
+    """
+    records = [r for r in (old, new) if r is not None]
+    if kind == "exercises":
+        texts = [exercise_text(r.get("name"), r.get("keywords"), r.get("description")) for r in records]
+        return lambda cache_kind, q: cache_kind in ("exercises", "universal") and any(
+            matches(t, tokenize(q)) for t in texts
+        )
+    if kind == "terminology":
+        terms = [(r.get("term") or "").lower() for r in records]
+        return lambda cache_kind, q: cache_kind in ("terminology", "universal") and any(
+            matches(t, tokenize(q)) for t in terms
+        )
+    if kind == "complexes":
+        names = [(r.get("name") or "").lower() for r in records]
+        # Ключ фильтра комплексов — (от, до, слова структуры), см. CachedDB.filter_complexes
+        return lambda cache_kind, q: (
+            cache_kind == "universal" and any(q in n for n in names)
+            or cache_kind == "complexes" and any(complex_matches(r, *q) for r in records)
+        )
+    # Материалы не ищутся и не кэшируются
+    return lambda cache_kind, q: False
+
+
+def _apply(kind: str, key: str, old: Optional[Record], new: Optional[Record]) -> None:
+    started = time.perf_counter()
+    try:
+        _stats["invalidated"] += get_db().apply_change(kind, key, new, _affected(kind, old, new))
+    except Exception:
+        _stats["failed"] += 1
+        raise
+    for listener in _listeners:
+        try:
+            listener(kind, old, new)
+        except Exception:
+            logger.exception("Ошибка подписчика правок контента %s", getattr(listener, "__name__", listener))
+    _latency.observe(time.perf_counter() - started)
+
+
+def upsert(kind: str, text: str) -> Tuple[Optional[Record], Record]:
+    """Добавить или изменить запись по тексту «поле: значение». Возвращает (старая, новая)."""
+    fields = parse_fields(kind, text)
+    key = fields.get(KINDS[kind].key, "").strip()
+    if not key:
+        raise ValueError(f"Не заполнено поле {KINDS[kind].key}")
+    fields[KINDS[kind].key] = key
+    db = get_db()
+    old = db.get_record(kind, key)
+    new = build_record(kind, fields, old)
+    _apply(kind, key, old, new)
+    _stats["updated" if old is not None else "added"] += 1
+    return old, new
+
+
+def delete(kind: str, key: str) -> Optional[Record]:
+    """Удалить запись; возвращает удалённую или None, если её не было."""
+    old = get_db().get_record(kind, key)
+    if old is not None:
+        _apply(kind, key, old, None)
+        _stats["deleted"] += 1
+    return old
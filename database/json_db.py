@@ -2,93 +2,268 @@
 """
 Хранилище данных в JSON-файлах.
 Подходит для небольшого объёма данных и простого деплоя.
+Правки администраторов (apply_change) не переписывают файлы целиком: изменение
+записывается строкой в журнал content_journal.jsonl (append + fsync) и применяется
+к спискам в памяти. При загрузке журнал накладывается поверх файлов; compact()
+(при остановке бота) атомарно переписывает изменённые файлы и очищает журнал.
+Для фильтра комплексов при загрузке строятся индексы: список по длительности
+(диапазон — два bisect) и префиксный индекс слов структуры.
 """
 
 import json
-import re
+import logging
+import os
+from bisect import bisect_left, bisect_right
 from pathlib import Path
-from typing import Any, Dict, List, Optional
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple, Type
 
 from config import (
     COMPLEXES_JSON,
+    CONTENT_JOURNAL,
     EDUCATION_JSON,
     EXERCISES_JSON,
     TERMINOLOGY_JSON,
 )
 from database.base import BaseDB
+from database.records import KINDS, Complex, EducationMaterial, Exercise, Record, Term
+from database.search_index import PrefixIndex, tokenize
+from database.search_rules import (
+    category_order,
+    complex_duration,
+    complex_order,
+    duration_bounds,
+    education_category,
+    filter_exercises,
+    find_term,
+    sort_key,
+)
 
+logger = logging.getLogger(__name__)
 
-def _normalize_query(text: str) -> str:
-    """Приведение запроса к нижнему регистру и разбиение на слова."""
-    return text.lower().strip()
-
-
-def _match_keywords(text: str, query: str) -> bool:
-    """Проверка вхождения ключевых слов запроса в текст."""
-    if not query:
-        return True
-    text_lower = _normalize_query(text)
-    words = re.findall(r"\w+", query)
-    return all(w in text_lower for w in words)
+# Ключ сортировки списков по видам (как ORDER BY в SQLite, см. search_rules)
+_SORT_KEYS: Dict[str, Callable[[Any], Any]] = {
+    "exercises": sort_key,
+    "complexes": sort_key,
+    "education": lambda m: sort_key(m, "title"),
+    "terminology": lambda t: t.get("term") or "",
+}
 
 
-def _load_json(path: Path):
+def _load_json(path: Path, object_hook: Optional[Callable[[dict], Any]] = None):
     """Безопасная загрузка JSON. Возвращает пустой список/словарь при ошибке."""
     if not path.exists():
         return []
     try:
         with open(path, "r", encoding="utf-8") as f:
-            return json.load(f)
+            return json.load(f, object_hook=object_hook)
     except (json.JSONDecodeError, OSError):
         return []
 
 
+def _load_records(path: Path, key: str, record_cls: Type[Record]) -> List[Record]:
+    """
+    Список записей из файла: [...] или {key: [...]}; элементы-не-словари пропускаются.
+    Записи создаются прямо при разборе (object_hook), без промежуточного списка dict.
+    """
+
+    def hook(obj: dict) -> Any:
+        # Обёртка {key: [...]} остаётся словарём, всё остальное — записи
+        if isinstance(obj.get(key), list):
+            return obj
+        return record_cls.from_mapping(obj)
+
+    data = _load_json(path, hook)
+    if isinstance(data, dict):
+        data = data.get(key, [])
+    if not isinstance(data, list):
+        return []
+    return [item for item in data if isinstance(item, record_cls)]
+
+
+def _replace_sorted(
+    items: List[Record], sort: Callable[[Any], Any], old: Optional[Record], new: Optional[Record]
+) -> None:
+    """
+    Заменить, добавить или удалить запись в отсортированном списке:
+    позиция — bisect по ключу сортировки, сдвиг списка — memmove без перебора записей.
+    """
+    if old is not None:
+        i = bisect_left(items, sort(old), key=sort)
+        while items[i] is not old:
+            i += 1
+        del items[i]
+    if new is not None:
+        items.insert(bisect_left(items, sort(new), key=sort), new)
+
+
+def _structure_entry(c: Record) -> Tuple[str, Any, str, str, Record]:
+    return str(c.get("id")), sort_key(c), "", c.get("structure") or "", c
+
+
+def _content_paths(data_dir: Optional[Path]) -> Tuple[Path, ...]:
+    paths = (EXERCISES_JSON, COMPLEXES_JSON, EDUCATION_JSON, TERMINOLOGY_JSON)
+    return paths if data_dir is None else tuple(data_dir / p.name for p in paths)
+
+
+def write_json_atomic(path: Path, data: Any) -> None:
+    """Записать JSON во временный файл рядом и заменить им path (os.replace атомарна)."""
+    tmp = path.with_name(f".{path.name}.tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+def append_journal(path: Path, kind: str, key: str, record: Optional[Record]) -> None:
+    """Дописать правку строкой в журнал (с fsync): её наложат JsonDB и скрипт заливки SQLite."""
+    line = json.dumps(
+        {"kind": kind, "key": key, "record": record.to_dict() if record is not None else None},
+        ensure_ascii=False,
+    )
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "a", encoding="utf-8") as f:
+        f.write(line + "\n")
+        f.flush()
+        os.fsync(f.fileno())
+
+
 class JsonDB(BaseDB):
     """Работа с данными через JSON-файлы."""
 
-    def __init__(self) -> None:
-        self._exercises: list[dict] = []
-        self._complexes: list[dict] = []
-        self._education: list[dict] = []
-        self._terminology: list[dict] = []
+    def __init__(self, data_dir: Optional[Path] = None) -> None:
+        """data_dir — каталог с *.json вместо путей из config (арендатор, скрипты и бенчмарки)."""
+        self._paths = _content_paths(data_dir)
+        self._journal = CONTENT_JOURNAL if data_dir is None else data_dir / CONTENT_JOURNAL.name
+        self._exercises: List[Record] = []
+        self._complexes: List[Record] = []
+        self._education: List[Record] = []
+        self._terminology: List[Record] = []
+        # Вид -> {ключ: запись}: поиск по id и позиции правки без перебора списка
+        self._by_key: Dict[str, Dict[str, Record]] = {}
+        # Виды с правками в журнале (их файлы перепишет compact)
+        self._dirty: Set[str] = set()
+        # Индексы фильтра комплексов: по длительности (complex_order) и по словам структуры
+        self._complexes_by_duration: List[Record] = []
+        self._structure_index: PrefixIndex[Record] = PrefixIndex([])
+        # Категория -> материалы по title (фасеты раздела «Образование»)
+        self._education_by_category: Dict[str, List[Record]] = {}
         self._reload()
 
+    @classmethod
+    def content_version(cls, data_dir: Optional[Path] = None) -> str:
+        """Версия по времени изменения и размеру JSON-файлов."""
+        parts = []
+        for path in _content_paths(data_dir):
+            try:
+                st = path.stat()
+                parts.append(f"{st.st_mtime_ns}:{st.st_size}")
+            except OSError:
+                parts.append("-")
+        return "|".join(parts)
+
     def _reload(self) -> None:
         """Перезагрузить все данные с диска."""
-        self._exercises = _load_json(EXERCISES_JSON)
-        if isinstance(self._exercises, dict):
-            self._exercises = self._exercises.get("exercises", [])
-        self._complexes = _load_json(COMPLEXES_JSON)
-        if isinstance(self._complexes, dict):
-            self._complexes = self._complexes.get("complexes", [])
-        self._education = _load_json(EDUCATION_JSON)
-        if isinstance(self._education, dict):
-            self._education = self._education.get("materials", [])
-        self._terminology = _load_json(TERMINOLOGY_JSON)
-        if isinstance(self._terminology, dict):
-            self._terminology = self._terminology.get("terms", [])
+        exercises_path, complexes_path, education_path, terminology_path = self._paths
+        self._exercises = _load_records(exercises_path, "exercises", Exercise)
+        self._complexes = _load_records(complexes_path, "complexes", Complex)
+        self._education = _load_records(education_path, "materials", EducationMaterial)
+        self._terminology = _load_records(terminology_path, "terms", Term)
+        # Порядок списков — как ORDER BY в SQLite (см. search_rules)
+        self._exercises.sort(key=sort_key)
+        self._complexes.sort(key=sort_key)
+        self._education.sort(key=lambda m: sort_key(m, "title"))
+        self._terminology.sort(key=lambda t: t.get("term") or "")
+        self._by_key = {
+            kind: {str(r.get(spec.key)): r for r in self._list(kind)} for kind, spec in KINDS.items()
+        }
+        self._complexes_by_duration = sorted(self._complexes, key=complex_order)
+        self._structure_index = PrefixIndex(_structure_entry(c) for c in self._complexes)
+        self._education_by_category = {}
+        for m in self._education:
+            self._education_by_category.setdefault(education_category(m), []).append(m)
+        self._dirty = set()
+        self._replay_journal()
+
+    def _list(self, kind: str) -> List[Record]:
+        return getattr(self, f"_{kind}")
+
+    def _replay_journal(self) -> None:
+        """Наложить правки из журнала (оборванная последняя строка после сбоя пропускается)."""
+        try:
+            with open(self._journal, "r", encoding="utf-8") as f:
+                lines = f.readlines()
+        except OSError:
+            return
+        for line in lines:
+            try:
+                change = json.loads(line)
+                kind, key, data = change["kind"], change["key"], change["record"]
+                spec = KINDS[kind]
+            except (ValueError, KeyError, TypeError):
+                logger.warning("Пропущена повреждённая строка журнала правок: %r", line[:100])
+                continue
+            self._apply(kind, key, spec.record.from_mapping(data) if data is not None else None)
+            self._dirty.add(kind)
+
+    def _apply(self, kind: str, key: str, record: Optional[Record]) -> None:
+        """Заменить, добавить или удалить одну запись в списке вида и в индексах."""
+        by_key = self._by_key[kind]
+        old = by_key.pop(key, None)
+        if record is not None:
+            by_key[key] = record
+        _replace_sorted(self._list(kind), _SORT_KEYS[kind], old, record)
+        if kind == "complexes":
+            _replace_sorted(self._complexes_by_duration, complex_order, old, record)
+            if record is not None:
+                self._structure_index.add(*_structure_entry(record))
+            else:
+                self._structure_index.remove(key)
+        elif kind == "education":
+            # Старая и новая запись могут быть в разных категориях
+            if old is not None:
+                self._replace_in_category(old, None)
+            if record is not None:
+                self._replace_in_category(None, record)
+
+    def _replace_in_category(self, old: Optional[Record], new: Optional[Record]) -> None:
+        category = education_category(old if old is not None else new)
+        items = self._education_by_category.setdefault(category, [])
+        _replace_sorted(items, _SORT_KEYS["education"], old, new)
+        if not items:
+            del self._education_by_category[category]
+
+    def get_record(self, kind: str, key: str) -> Optional[Record]:
+        return self._by_key[kind].get(str(key))
+
+    def apply_change(self, kind: str, key: str, record: Optional[Record]) -> None:
+        """Правка одной записи: строка в журнал (fsync), затем — списки в памяти."""
+        append_journal(self._journal, kind, key, record)
+        self._apply(kind, key, record)
+        self._dirty.add(kind)
+
+    def compact(self) -> None:
+        """Переписать файлы видов с правками (атомарно) и очистить журнал."""
+        if not self._dirty:
+            return
+        paths = dict(zip(("exercises", "complexes", "education", "terminology"), self._paths))
+        for kind in sorted(self._dirty):
+            write_json_atomic(paths[kind], {KINDS[kind].array: [r.to_dict() for r in self._list(kind)]})
+        # Если сбой случится до очистки, повторное наложение журнала ничего не изменит
+        open(self._journal, "w").close()
+        self._dirty = set()
 
     def search_exercises(self, query: str) -> List[Dict[str, Any]]:
-        """Поиск упражнений по названию и ключевым словам."""
-        q = _normalize_query(query)
-        if not q:
-            return []
-        results = []
-        for ex in self._exercises:
-            name = (ex.get("name") or "").lower()
-            keywords = " ".join(ex.get("keywords", [])).lower()
-            desc = (ex.get("description") or "").lower()
-            searchable = f"{name} {keywords} {desc}"
-            if q in name or _match_keywords(searchable, q):
-                results.append(ex)
-        return results
+        """Поиск упражнений: все слова запроса — в названии, ключевых словах или описании."""
+        return filter_exercises(self._exercises, query)
+
+    def get_all_exercises(self) -> List[Dict[str, Any]]:
+        """Список всех упражнений."""
+        return list(self._exercises)
 
     def get_exercise_by_id(self, exercise_id: str) -> Optional[Dict[str, Any]]:
         """Получить упражнение по id."""
-        for ex in self._exercises:
-            if str(ex.get("id")) == str(exercise_id):
-                return ex
-        return None
+        return self._by_key["exercises"].get(str(exercise_id))
 
     def get_all_education(self) -> List[Dict[str, Any]]:
         """Список всех материалов раздела «Образование»."""
@@ -96,32 +271,49 @@ class JsonDB(BaseDB):
 
     def get_education_by_id(self, education_id: str) -> Optional[Dict[str, Any]]:
         """Получить материал по id."""
-        for m in self._education:
-            if str(m.get("id")) == str(education_id):
-                return m
-        return None
+        return self._by_key["education"].get(str(education_id))
+
+    def get_education_categories(self) -> List[Tuple[str, int]]:
+        """Категории материалов с числом материалов — по готовому разбиению по категориям."""
+        return sorted(
+            ((c, len(items)) for c, items in self._education_by_category.items()),
+            key=lambda item: category_order(item[0]),
+        )
+
+    def get_education_by_category(self, category: str) -> List[Dict[str, Any]]:
+        """Материалы категории по title — один поиск в словаре."""
+        return list(self._education_by_category.get(category, ()))
 
     def get_all_complexes(self) -> List[Dict[str, Any]]:
         """Список всех комплексов."""
         return list(self._complexes)
 
+    def filter_complexes(
+        self, min_minutes: Optional[int] = None, max_minutes: Optional[int] = None, structure: str = ""
+    ) -> List[Dict[str, Any]]:
+        """Диапазон длительности — срез списка по bisect; слова структуры — префиксный индекс."""
+        items = self._complexes_by_duration
+        bounds = duration_bounds(min_minutes, max_minutes)
+        if bounds is not None:
+            lo = bisect_left(items, bounds[0], key=complex_duration)
+            items = items[lo:bisect_right(items, bounds[1], lo, key=complex_duration)]
+        if not tokenize(structure):
+            return list(items)
+        found = self._structure_index.match(structure)
+        if len(found) < len(items):
+            if bounds is not None:
+                found = [c for c in found if bounds[0] <= complex_duration(c) <= bounds[1]]
+            return sorted(found, key=complex_order)
+        ids = {id(c) for c in found}
+        return [c for c in items if id(c) in ids]
+
     def get_complex_by_id(self, complex_id: str) -> Optional[Dict[str, Any]]:
         """Получить комплекс по id."""
-        for c in self._complexes:
-            if str(c.get("id")) == str(complex_id):
-                return c
-        return None
+        return self._by_key["complexes"].get(str(complex_id))
 
     def search_terminology(self, term: str) -> Optional[Dict[str, Any]]:
-        """Поиск термина (точное совпадение или по ключевым словам)."""
-        t = _normalize_query(term)
-        if not t:
-            return None
-        for item in self._terminology:
-            term_name = (item.get("term") or "").lower()
-            if t == term_name or t in term_name or _match_keywords(term_name, t):
-                return item
-        return None
+        """Поиск термина (точное совпадение или по словам запроса)."""
+        return find_term(self._terminology, term)
 
     def get_all_terms(self) -> List[str]:
         """Список всех терминов."""
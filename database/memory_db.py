@@ -0,0 +1,121 @@
+# -*- coding: utf-8 -*-
+"""
+Хранилище в памяти процесса: копия running_club.db в SQLite :memory:.
+БД с диска копируется целиком через backup API при создании бэкенда — при старте
+и при каждой смене версии контента (CachedDB пересоздаёт бэкенд). Запросы идут
+к одному соединению в памяти без дискового ввода-вывода. Запросы те же, что в режиме
+sqlite, в том числе поиск по триграммным индексам из файла БД (их строит скрипт заливки) —
+при загрузке ничего не перестраивается.
+Правка записи (apply_change) пишется в файл БД (и в журнал правок, как в режиме sqlite)
+и в копию в памяти вместе со строками FTS-индексов — без повторного копирования всей БД.
+Если скопировать БД не удалось, бэкенд продолжает работать на последней удачной копии
+этого файла, а без неё — ContentUnavailable: пустая база вместо каталога не подставляется.
+"""
+
+import logging
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from config import CONTENT_JOURNAL, SQLITE_DB_PATH, SQLITE_QUERY_TIMEOUT
+from database.base import BaseDB, ContentUnavailable
+from database.records import Record
+from database.search_rules import register_functions
+from database.sqlite_db import SCHEMA, RunningClubDB, write_change
+from services import metrics
+from services.tenants import TenantLocal
+
+logger = logging.getLogger(__name__)
+
+# Статистика загрузки — своя у каждого арендатора (бэкенд создаётся в его контексте)
+_stats: TenantLocal[Dict[str, Any]] = TenantLocal(
+    lambda tenant: {"loads": 0, "load_errors": 0, "load_ms": 0.0, "bytes": 0, "fts": False, "stale": False}
+)
+metrics.register("memory_db", lambda: dict(_stats.get()))
+
+# Путь к БД -> последняя удачная копия в памяти и блокировка её соединения
+_copies: Dict[Path, Tuple[sqlite3.Connection, threading.Lock]] = {}
+
+
+class MemoryDB(RunningClubDB):
+    """
+    SQL-запросы RunningClubDB поверх копии БД в памяти.
+    Breaker и снимок не нужны: после загрузки ошибок ввода-вывода уже не бывает.
+    """
+
+    def __init__(self, db_path: Path = SQLITE_DB_PATH, data_dir: Optional[Path] = None) -> None:
+        self._path = db_path
+        self._data_dir = data_dir
+        self._journal = CONTENT_JOURNAL if data_dir is None else data_dir / CONTENT_JOURNAL.name
+        stats = _stats.get()
+        try:
+            # Файл пропал после удачной загрузки — это сбой, а не новая пустая база
+            if db_path in _copies and not db_path.exists():
+                raise FileNotFoundError(f"{db_path} не найден")
+            self._mem = self._load(db_path)
+        except (sqlite3.Error, OSError) as e:
+            stats["load_errors"] += 1
+            previous = _copies.get(db_path)
+            if previous is None:
+                logger.exception("Не удалось скопировать %s в память, прежней копии нет", db_path)
+                raise ContentUnavailable(f"Не удалось загрузить {db_path} в память: {e}") from e
+            logger.exception("Не удалось скопировать %s в память — работаем на прежней копии", db_path)
+            # Общая с прежним экземпляром копия — и общая блокировка её соединения
+            self._mem, self._lock = previous
+            stats["stale"] = True
+            return
+        self._lock = threading.Lock()
+        self._mem.execute("PRAGMA query_only = 1")
+        fts = self._mem.execute(
+            "SELECT count(*) FROM sqlite_master WHERE name IN ('exercises_trgm', 'terminology_trgm')"
+        ).fetchone()[0] == 2
+        if not fts:
+            logger.warning("В %s нет триграммных индексов — поиск без FTS; выполните скрипт заливки", db_path)
+        stats["fts"] = fts
+        stats["stale"] = False
+        _copies[db_path] = (self._mem, self._lock)
+
+    @staticmethod
+    def _load(db_path: Path) -> sqlite3.Connection:
+        """Скопировать БД с диска в :memory: (пустая схема, только если файла ещё нет)."""
+        started = time.perf_counter()
+        mem = sqlite3.connect(":memory:", check_same_thread=False)
+        mem.row_factory = sqlite3.Row
+        try:
+            if db_path.exists():
+                src = sqlite3.connect(db_path, timeout=SQLITE_QUERY_TIMEOUT)
+                try:
+                    src.backup(mem)
+                finally:
+                    src.close()
+            mem.executescript(SCHEMA)
+        except BaseException:
+            mem.close()
+            raise
+        register_functions(mem)
+        page_count = mem.execute("PRAGMA page_count").fetchone()[0]
+        page_size = mem.execute("PRAGMA page_size").fetchone()[0]
+        stats = _stats.get()
+        stats["loads"] += 1
+        stats["load_ms"] = (time.perf_counter() - started) * 1000
+        stats["bytes"] = page_count * page_size
+        return mem
+
+    def _read(
+        self, query: Callable[[sqlite3.Connection], Any], fallback: Optional[Callable[[BaseDB], Any]]
+    ) -> Any:
+        with self._lock:
+            return query(self._mem)
+
+    def apply_change(self, kind: str, key: str, record: Optional[Record]) -> None:
+        """Записать правку на диск (как в режиме sqlite), затем в копию в памяти."""
+        super().apply_change(kind, key, record)
+        with self._lock:
+            self._mem.execute("PRAGMA query_only = 0")
+            try:
+                with self._mem:
+                    write_change(self._mem, kind, key, record)
+            finally:
+                self._mem.execute("PRAGMA query_only = 1")
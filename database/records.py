@@ -0,0 +1,184 @@
+# -*- coding: utf-8 -*-
+"""
+Компактные записи каталога: упражнения, комплексы, материалы и термины.
+Классы со __slots__ вместо dict: нет словаря на каждую запись, повторяющиеся строки
+(категории, ключевые слова) интернируются. Записи неизменяемые и ведут себя как
+Mapping — .get(), [ключ], in, items() — поэтому _format_* и клавиатуры работают с ними,
+как со словарями.
+"""
+
+import json
+import sys
+from collections.abc import Mapping
+from typing import Any, Callable, Dict, FrozenSet, Iterator, NamedTuple, Tuple, Type
+
+# Поле отсутствовало в исходных данных: .get() вернёт default, как у dict
+_MISSING: Any = object()
+
+
+def _intern(value: Any) -> Any:
+    return sys.intern(value) if type(value) is str else value
+
+
+def keywords_tuple(value: Any) -> Tuple[str, ...]:
+    """Ключевые слова кортежем: из списка (JSON), JSON-строки или текста через запятую (SQLite)."""
+    if value is None or value is _MISSING:
+        return ()
+    if isinstance(value, (list, tuple)):
+        items = value
+    else:
+        text = str(value).strip()
+        items = None
+        if text.startswith('["') and text.endswith('"]') and "\\" not in text:
+            # Быстрый путь для json.dumps(список строк): без экранирования кавычек в значениях нет
+            items = text[2:-2].split('", "')
+            if any('"' in v for v in items):
+                items = None
+        if items is None and text.startswith("["):
+            try:
+                items = json.loads(text)
+            except ValueError:
+                pass
+        if not isinstance(items, list):
+            items = [p.strip() for p in text.split(",")]
+    return tuple(sys.intern(v if type(v) is str else str(v)) for v in items if v is not None and v != "")
+
+
+class Record(Mapping):
+    """
+    Базовая запись. Подкласс задаёт _fields (они же __slots__) и _interned —
+    поля, значения которых интернируются. Неизвестные ключи исходного словаря
+    сохраняются в _extra (None, если их нет).
+    """
+
+    __slots__ = ("_extra",)
+    _fields: Tuple[str, ...] = ()
+    _interned: Tuple[str, ...] = ()
+    _field_set: FrozenSet[str] = frozenset()
+    _setters: Tuple[Tuple[str, Callable[[Any, Any], None], bool], ...] = ()
+
+    def __init_subclass__(cls, **kwargs: Any) -> None:
+        super().__init_subclass__(**kwargs)
+        # Дескрипторы слотов: запись значений в обход запрещённого __setattr__
+        cls._field_set = frozenset(cls._fields)
+        cls._setters = tuple(
+            (field, getattr(cls, field).__set__, field in cls._interned) for field in cls._fields
+        )
+
+    def __init__(self, **values: Any) -> None:
+        self._fill(values)
+
+    def _fill(self, values: Dict[str, Any]) -> None:
+        extra = None
+        if not values.keys() <= self._field_set:
+            extra = {k: v for k, v in values.items() if k not in self._field_set}
+        Record._extra.__set__(self, extra)
+        for field, setter, interned in self._setters:
+            value = values.get(field, _MISSING)
+            setter(self, self._normalize(field, value) if interned else value)
+
+    @classmethod
+    def _normalize(cls, field: str, value: Any) -> Any:
+        return _intern(value)
+
+    @classmethod
+    def from_mapping(cls, data: Any) -> "Record":
+        """Запись из dict или sqlite3.Row."""
+        if isinstance(data, cls):
+            return data
+        record = cls.__new__(cls)
+        record._fill(data if isinstance(data, dict) else {k: data[k] for k in data.keys()})
+        return record
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        raise AttributeError(f"{type(self).__name__} is immutable")
+
+    def __delattr__(self, name: str) -> None:
+        raise AttributeError(f"{type(self).__name__} is immutable")
+
+    def __reduce__(self):
+        return (_restore, (type(self), dict(self.items())))
+
+    # --- Mapping ---
+
+    def __getitem__(self, key: str) -> Any:
+        if key in self._fields:
+            value = getattr(self, key)
+            if value is not _MISSING:
+                return value
+        elif self._extra is not None and key in self._extra:
+            return self._extra[key]
+        raise KeyError(key)
+
+    def get(self, key: str, default: Any = None) -> Any:
+        if key in self._fields:
+            value = getattr(self, key)
+            return default if value is _MISSING else value
+        if self._extra is not None:
+            return self._extra.get(key, default)
+        return default
+
+    def __iter__(self) -> Iterator[str]:
+        for field in self._fields:
+            if getattr(self, field) is not _MISSING:
+                yield field
+        if self._extra is not None:
+            yield from self._extra
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self)
+
+    def __contains__(self, key: object) -> bool:
+        return self.get(key, _MISSING) is not _MISSING  # type: ignore[arg-type]
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Обычный dict (для JSON и кода, который меняет данные)."""
+        return {k: list(v) if isinstance(v, tuple) else v for k, v in self.items()}
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}({dict(self.items())!r})"
+
+
+def _restore(cls: type, values: Dict[str, Any]) -> Record:
+    return cls(**values)
+
+
+class Exercise(Record):
+    __slots__ = ("id", "name", "description", "link", "keywords")
+    _fields = __slots__
+    _interned = ("keywords",)
+
+    @classmethod
+    def _normalize(cls, field: str, value: Any) -> Any:
+        return keywords_tuple(value)
+
+
+class Complex(Record):
+    __slots__ = ("id", "name", "description", "structure", "duration_minutes")
+    _fields = __slots__
+
+
+class EducationMaterial(Record):
+    __slots__ = ("id", "title", "description", "link", "category")
+    _fields = __slots__
+    _interned = ("category",)
+
+
+class Term(Record):
+    __slots__ = ("term", "definition")
+    _fields = __slots__
+
+
+class Kind(NamedTuple):
+    record: Type[Record]
+    key: str  # ключевое поле (первичный ключ в SQLite)
+    array: str  # ключ массива в JSON-файле
+
+
+# Вид контента (он же имя таблицы SQLite) -> тип записи, ключевое поле, ключ массива в JSON
+KINDS: Dict[str, Kind] = {
+    "exercises": Kind(Exercise, "id", "exercises"),
+    "complexes": Kind(Complex, "id", "complexes"),
+    "education": Kind(EducationMaterial, "id", "materials"),
+    "terminology": Kind(Term, "term", "terms"),
+}
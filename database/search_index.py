@@ -0,0 +1,150 @@
+# -*- coding: utf-8 -*-
+"""
+Префиксный индекс для поиска «по мере ввода» (inline-режим).
+Слова из названий и ключевых слов нормализуются и хранятся в отсортированном списке;
+поиск по префиксу — два bisect вместо перебора всех записей.
+"""
+
+import heapq
+import json
+import re
+import sys
+from bisect import bisect_left, insort
+from typing import Any, Dict, Generic, Hashable, Iterable, List, Optional, Set, Tuple, TypeVar, Union
+
+from database.cache import normalize_query
+
+T = TypeVar("T")
+
+_WORD_RE = re.compile(r"\w+")
+
+
+def tokenize(text: str) -> List[str]:
+    """Слова нормализованного текста."""
+    return _WORD_RE.findall(normalize_query(text))
+
+
+def keywords_text(value: Any) -> str:
+    """Ключевые слова одной строкой: список/кортеж (записи) или JSON-строка/текст (SQLite)."""
+    if isinstance(value, (list, tuple)):
+        return " ".join(str(v) for v in value)
+    text = str(value or "")
+    if text.startswith("["):
+        try:
+            return " ".join(str(v) for v in json.loads(text))
+        except ValueError:
+            pass
+    return text
+
+
+class PrefixIndex(Generic[T]):
+    """
+    Индекс документов (произвольные payload) по их словам.
+    Запрос из нескольких слов — пересечение документов по префиксу каждого слова.
+    Документ меняется на месте (add, remove): затрагиваются только его слова —
+    документы по слову (кортеж превращается в множество при первой правке этого слова)
+    и, для новых или исчезнувших слов, вставка/удаление в отсортированном списке (bisect).
+    """
+
+    def __init__(self, entries: Iterable[Tuple[Hashable, Any, str, str, T]]) -> None:
+        """entries: (ключ, ранг — порядок в выдаче, название, доп. текст для индекса, payload)."""
+        self._names: List[str] = []
+        self._ranks: List[Any] = []
+        # payload None — удалённый документ (номера документов не переиспользуются)
+        self._payloads: List[Optional[T]] = []
+        self._doc_words: List[Tuple[str, ...]] = []
+        self._docs: Dict[Hashable, int] = {}
+        postings: Dict[str, List[int]] = {}
+        for key, rank, name, extra, payload in entries:
+            doc_id = self._docs[key] = len(self._payloads)
+            self._append(rank, name, extra, payload)
+            for word in self._doc_words[doc_id]:
+                postings.setdefault(word, []).append(doc_id)
+        # Кортежи компактнее множеств; множество — только у слов, документы которых правились
+        self._postings: Dict[str, Union[Tuple[int, ...], Set[int]]] = {w: tuple(ids) for w, ids in postings.items()}
+        self._words: List[str] = sorted(self._postings)
+
+    def __len__(self) -> int:
+        return len(self._docs)
+
+    def _append(self, rank: Any, name: str, extra: str, payload: T) -> None:
+        self._names.append(normalize_query(name))
+        self._ranks.append(rank)
+        self._payloads.append(payload)
+        # Слова интернируются: одна строка на слово в индексе и в словах документов
+        self._doc_words.append(tuple(sys.intern(w) for w in set(tokenize(f"{name} {extra}"))))
+
+    def _docs_of(self, word: str) -> Set[int]:
+        docs = self._postings[word]
+        if type(docs) is tuple:
+            docs = self._postings[word] = set(docs)
+        return docs  # type: ignore[return-value]
+
+    def _unlink(self, doc_id: int) -> None:
+        for word in self._doc_words[doc_id]:
+            docs = self._docs_of(word)
+            docs.discard(doc_id)
+            if not docs:
+                del self._postings[word]
+                del self._words[bisect_left(self._words, word)]
+
+    def words(self, key: Hashable) -> Tuple[str, ...]:
+        """Слова документа (пусто, если его нет)."""
+        doc_id = self._docs.get(key)
+        return self._doc_words[doc_id] if doc_id is not None else ()
+
+    def add(self, key: Hashable, rank: Any, name: str, extra: str, payload: T) -> None:
+        """Добавить документ или заменить документ с тем же ключом."""
+        self.remove(key)
+        doc_id = self._docs[key] = len(self._payloads)
+        self._append(rank, name, extra, payload)
+        for word in self._doc_words[doc_id]:
+            if word not in self._postings:
+                self._postings[word] = set()
+                insort(self._words, word)
+            self._docs_of(word).add(doc_id)
+
+    def remove(self, key: Hashable) -> None:
+        doc_id = self._docs.pop(key, None)
+        if doc_id is None:
+            return
+        self._unlink(doc_id)
+        self._payloads[doc_id] = None
+        self._doc_words[doc_id] = ()
+
+    def _prefix_docs(self, prefix: str) -> Set[int]:
+        lo = bisect_left(self._words, prefix)
+        hi = bisect_left(self._words, prefix + "\uffff", lo)
+        docs: Set[int] = set()
+        for word in self._words[lo:hi]:
+            docs.update(self._postings[word])
+        return docs
+
+    def match(self, query: str) -> List[T]:
+        """Все документы, подходящие под запрос (без ранжирования)."""
+        words = tokenize(query)
+        if not words:
+            return [self._payloads[i] for i in self._docs.values()]  # type: ignore[misc]
+        return [self._payloads[i] for i in self._match(words)]  # type: ignore[misc]
+
+    def _match(self, words: List[str]) -> Set[int]:
+        # Сначала самые редкие слова: пересечение быстрее сужается
+        doc_sets = sorted((self._prefix_docs(w) for w in words), key=len)
+        docs = doc_sets[0]
+        for other in doc_sets[1:]:
+            if not docs:
+                break
+            docs = docs & other
+        return docs
+
+    def search(self, query: str, limit: int) -> List[T]:
+        """До limit документов, у которых каждое слово запроса — префикс какого-то слова."""
+        words = tokenize(query)
+        if not words:
+            first = heapq.nsmallest(limit, self._docs.values(), key=self._ranks.__getitem__)
+            return [self._payloads[i] for i in first]  # type: ignore[misc]
+        docs = self._match(words)
+        q = normalize_query(query)
+        # Названия, начинающиеся с запроса, — выше; иначе по рангу
+        ranked = sorted(docs, key=lambda i: (not self._names[i].startswith(q), self._ranks[i]))
+        return [self._payloads[i] for i in ranked[:limit]]  # type: ignore[misc]
@@ -0,0 +1,151 @@
+# -*- coding: utf-8 -*-
+"""
+Единые правила поиска и сортировки для всех бэкендов (json, sqlite, memory).
+Упражнение подходит, если каждое слово запроса входит (как подстрока, без учёта
+регистра) в название, ключевые слова или описание. Термин — так же по самому термину;
+точное совпадение важнее, иначе первый по алфавиту. Списки упорядочены по названию
+(порядок кодовых точек, как BINARY в SQLite), при равенстве — по id.
+Фильтр комплексов: длительность в диапазоне (комплекс без длительности под фильтр по
+длительности не попадает) и каждое слово запроса — начало какого-то слова структуры;
+порядок — по длительности, затем по названию.
+Категории материалов: пустая и отсутствующая категория — одна («без категории»,
+в списке последней), материалы категории — по названию.
+scripts/bench_backends.py проверяет, что бэкенды отвечают одинаково.
+"""
+
+import sqlite3
+import sys
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from database.cache import normalize_query
+from database.search_index import keywords_text, tokenize
+
+
+def exercise_text(name: Any, keywords: Any, description: Any) -> str:
+    """Текст упражнения для поиска в нижнем регистре."""
+    return f"{name or ''} {keywords_text(keywords)} {description or ''}".lower()
+
+
+def matches(text: str, words: Sequence[str]) -> bool:
+    return all(w in text for w in words)
+
+
+def sort_key(record: Any, title_key: str = "name") -> Tuple[str, str]:
+    """Ключ сортировки списков: название, затем id."""
+    return (record.get(title_key) or "", str(record.get("id", "")))
+
+
+def filter_exercises(exercises: Iterable[Any], query: str) -> List[Any]:
+    """Упражнения, подходящие под запрос, в порядке входного списка."""
+    words = tokenize(query)
+    if not words:
+        return []
+    return [
+        ex for ex in exercises
+        if matches(exercise_text(ex.get("name"), ex.get("keywords"), ex.get("description")), words)
+    ]
+
+
+def find_term(terms: Iterable[Any], query: str) -> Optional[Any]:
+    """Точное совпадение термина или первый по алфавиту термин, содержащий все слова запроса."""
+    words = tokenize(query)
+    if not words:
+        return None
+    exact = normalize_query(query)
+    best = None
+    for item in terms:
+        term = item.get("term") or ""
+        if not matches(term.lower(), words):
+            continue
+        if normalize_query(term) == exact:
+            return item
+        if best is None or term < (best.get("term") or ""):
+            best = item
+    return best
+
+
+def complex_duration(record: Any) -> int:
+    return int(record.get("duration_minutes") or 0)
+
+
+def complex_order(record: Any) -> Tuple[int, str, str]:
+    """Порядок комплексов в фильтре: длительность, название, id."""
+    return (complex_duration(record), *sort_key(record))
+
+
+def duration_bounds(min_minutes: Optional[int], max_minutes: Optional[int]) -> Optional[Tuple[int, int]]:
+    """Границы длительности включительно или None, если фильтра по длительности нет."""
+    if min_minutes is None and max_minutes is None:
+        return None
+    return max(min_minutes or 0, 1), max_minutes if max_minutes is not None else sys.maxsize
+
+
+def has_word_prefixes(text: Any, words: Sequence[str]) -> bool:
+    """Каждое слово из words — начало какого-то слова текста."""
+    tokens = tokenize(text or "")
+    return all(any(t.startswith(w) for t in tokens) for w in words)
+
+
+def complex_matches(record: Any, min_minutes: Optional[int], max_minutes: Optional[int], structure: str) -> bool:
+    bounds = duration_bounds(min_minutes, max_minutes)
+    if bounds is not None and not bounds[0] <= complex_duration(record) <= bounds[1]:
+        return False
+    return has_word_prefixes(record.get("structure"), tokenize(structure))
+
+
+def education_category(record: Any) -> str:
+    return record.get("category") or ""
+
+
+def category_order(category: str) -> Tuple[bool, str]:
+    """Порядок категорий: по названию, «без категории» — последней."""
+    return (category == "", category)
+
+
+def education_categories(materials: Iterable[Any]) -> List[Tuple[str, int]]:
+    """Категории материалов с числом материалов в каждой, в порядке category_order."""
+    counts: Dict[str, int] = {}
+    for m in materials:
+        category = education_category(m)
+        counts[category] = counts.get(category, 0) + 1
+    return sorted(counts.items(), key=lambda item: category_order(item[0]))
+
+
+def filter_complexes(
+    complexes: Iterable[Any], min_minutes: Optional[int], max_minutes: Optional[int], structure: str
+) -> List[Any]:
+    """Комплексы под фильтр по длительности и словам структуры, в порядке complex_order."""
+    found = [c for c in complexes if complex_matches(c, min_minutes, max_minutes, structure)]
+    return sorted(found, key=complex_order)
+
+
+def register_functions(conn: sqlite3.Connection) -> None:
+    """SQL-функции с теми же правилами: регистр по Unicode (встроенный lower() — только ASCII)."""
+    conn.create_function("exercise_text", 3, exercise_text, deterministic=True)
+    conn.create_function("norm", 1, normalize_query, deterministic=True)
+    conn.create_function("lower_u", 1, lambda s: (s or "").lower(), deterministic=True)
+    conn.create_function(
+        "has_word_prefixes", 2, lambda text, words: has_word_prefixes(text, words.split()), deterministic=True
+    )
+
+
+def words_where(column: str, words: Sequence[str]) -> Tuple[str, List[str]]:
+    """Условие «все слова входят в column» для SQL: (текст условия, параметры)."""
+    return " AND ".join(f"instr({column}, ?) > 0" for _ in words), list(words)
+
+
+def trigram_where(table: str, words: Sequence[str]) -> Tuple[str, List[str]]:
+    """
+    То же условие по триграммному индексу table (FTS5, текст поиска в колонке text, алиас f):
+    слова от 3 символов — через MATCH (точная подстрока), более короткие — instr по тексту.
+    """
+    long_words = [w for w in words if len(w) >= 3]
+    clauses, params = [], []
+    if long_words:
+        clauses.append(f"{table} MATCH ?")
+        params.append(" AND ".join(f'"{w}"' for w in long_words))
+    short_where, short_params = words_where("f.text", [w for w in words if len(w) < 3])
+    if short_where:
+        clauses.append(short_where)
+        params.extend(short_params)
+    return " AND ".join(clauses), params
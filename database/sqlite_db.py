@@ -2,131 +2,602 @@
 """
 Хранилище данных в SQLite.
 Удобно для больших объёмов и быстрого поиска.
+Ожидание блокировки БД ограничено SQLITE_QUERY_TIMEOUT; «БД занята / заблокирована»
+считает circuit breaker (прочие ошибки и долгие, но рабочие запросы — не его дело).
+Пока цепь разомкнута (БД заблокирована перезаливкой), чтение идёт из последнего удачного
+снимка таблиц в памяти; такие ответы не кэшируются (database/base.py: note_fallback),
+а без снимка — ContentUnavailable вместо пустого ответа. Снимок обновляется в фоне
+после удачных чтений, не чаще SQLITE_SNAPSHOT_REFRESH_SECONDS.
+Поиск упражнений и терминов идёт по триграммным FTS5-индексам exercises_trgm и
+terminology_trgm, которые строит и обновляет скрипт заливки (без них — проверка каждой строки).
+Правка одной записи (apply_change) — одна транзакция: UPSERT строки (rowid сохраняется)
+и строки FTS-индексов, если они созданы скриптом заливки. До COMMIT правка дописывается
+в журнал content_journal.jsonl (как в режиме json): скрипт заливки накладывает его поверх
+JSON и не откатывает правку, а compact() при остановке переносит журнал в *.json.
+Версия контента — счётчик в таблице content_meta, который заливка и правка увеличивают
+в своей транзакции: кэши сбрасываются один раз после COMMIT, а не по ходу записи.
 """
 
+import json
+import logging
 import sqlite3
+import threading
+import time
 from pathlib import Path
-from typing import Any, Dict, List, Optional
+from typing import Any, Callable, Dict, List, Optional, Tuple
 
-from config import SQLITE_DB_PATH
-from database.base import BaseDB
+from config import (
+    CONTENT_JOURNAL,
+    SQLITE_BREAKER_FAILURES,
+    SQLITE_BREAKER_RESET_SECONDS,
+    SQLITE_DB_PATH,
+    SQLITE_QUERY_TIMEOUT,
+    SQLITE_SNAPSHOT_MAX_ROWS,
+    SQLITE_SNAPSHOT_REFRESH_SECONDS,
+)
+from database.base import BaseDB, ContentUnavailable, note_fallback
+from database.breaker import CircuitBreaker
+from database.cache import normalize_query
+from database.json_db import JsonDB, append_journal
+from database.records import KINDS, Complex, EducationMaterial, Exercise, Record, Term
+from database.search_index import tokenize
+from database.search_rules import (
+    category_order,
+    duration_bounds,
+    exercise_text,
+    filter_exercises,
+    find_term,
+    register_functions,
+    sort_key,
+    trigram_where,
+    words_where,
+)
+from services import metrics, tenants
+
+logger = logging.getLogger(__name__)
+
+
+class _DbState:
+    """Breaker и снимок одного файла БД: общие для всех его экземпляров (бэкенд пересоздаётся при смене версии)."""
+
+    def __init__(self) -> None:
+        self.breaker = CircuitBreaker(SQLITE_BREAKER_FAILURES, SQLITE_BREAKER_RESET_SECONDS)
+        self.snapshot: Optional["SqliteSnapshot"] = None
+        # Обновление снимка в фоне: не больше одного сразу и не чаще SQLITE_SNAPSHOT_REFRESH_SECONDS
+        self.lock = threading.Lock()
+        self.refreshing = False
+        self.refresh_after = 0.0
+        # Соединение для чтения версии контента: (inode файла, соединение), и последняя версия
+        self.version_lock = threading.Lock()
+        self.version_conn: Optional[Tuple[int, sqlite3.Connection]] = None
+        self.version = "-"
+
+
+# Путь к БД -> состояние (у каждого арендатора своя БД и свой снимок)
+_states: Dict[Path, _DbState] = {}
+_stats = {"errors": 0, "busy": 0, "fallbacks": 0, "unavailable": 0, "snapshot_rows": 0, "snapshot_age_s": 0.0}
+
+
+def _breaker_stats() -> Dict[str, Any]:
+    state = _states.get(tenants.current().path(SQLITE_DB_PATH)) or _DbState()
+    stats = {**state.breaker.stats(), **_stats}
+    if state.snapshot is not None:
+        stats["snapshot_age_s"] = time.monotonic() - state.snapshot.loaded_at
+    return stats
+
+
+metrics.register("sqlite", _breaker_stats)
+
+# Схема таблиц каталога (общая для режимов sqlite и memory)
+SCHEMA = """
+    CREATE TABLE IF NOT EXISTS exercises (
+        id TEXT PRIMARY KEY,
+        name TEXT NOT NULL,
+        description TEXT,
+        link TEXT,
+        keywords TEXT
+    );
+    CREATE TABLE IF NOT EXISTS education (
+        id TEXT PRIMARY KEY,
+        title TEXT NOT NULL,
+        description TEXT,
+        link TEXT,
+        category TEXT
+    );
+    CREATE TABLE IF NOT EXISTS complexes (
+        id TEXT PRIMARY KEY,
+        name TEXT NOT NULL,
+        description TEXT,
+        structure TEXT,
+        duration_minutes INTEGER
+    );
+    CREATE TABLE IF NOT EXISTS terminology (
+        term TEXT PRIMARY KEY,
+        definition TEXT NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS idx_exercises_name ON exercises(name);
+    CREATE INDEX IF NOT EXISTS idx_terminology_term ON terminology(term);
+    CREATE INDEX IF NOT EXISTS idx_complexes_duration ON complexes(duration_minutes, name, id);
+    CREATE INDEX IF NOT EXISTS idx_education_category ON education(category, title, id);
+    -- Версия контента: растёт в каждой транзакции, меняющей каталог (заливка, правка из бота)
+    CREATE TABLE IF NOT EXISTS content_meta (
+        key TEXT PRIMARY KEY,
+        value INTEGER NOT NULL
+    ) WITHOUT ROWID;
+"""
+
+# Увеличить версию контента (внутри транзакции вызывающего: видна только после COMMIT)
+BUMP_VERSION = (
+    "INSERT INTO content_meta (key, value) VALUES ('version', 1) "
+    "ON CONFLICT(key) DO UPDATE SET value = value + 1"
+)
+
+# Таблица -> тип записи
+_RECORDS = {"exercises": Exercise, "education": EducationMaterial, "complexes": Complex, "terminology": Term}
+
+# FTS-индексы из scripts/seed_sqlite_from_json.py: таблица -> (FTS-таблица, её колонки по записи)
+_FTS: Dict[str, Tuple[str, Callable[[Record], Dict[str, Any]]]] = {
+    "exercises": (
+        "exercises_trgm",
+        lambda r: {"text": exercise_text(r.get("name"), r.get("keywords"), r.get("description"))},
+    ),
+    "complexes": ("complexes_fts", lambda r: {"structure": r.get("structure")}),
+    "terminology": ("terminology_trgm", lambda r: {"text": (r.get("term") or "").lower()}),
+}
+
+
+def _row(record: Record) -> List[Any]:
+    """Значения колонок таблицы, как при заливке: ключевые слова — JSON-массивом, нет длительности — 0."""
+    values = []
+    for field in record._fields:
+        value = record.get(field)
+        if isinstance(value, tuple):
+            value = json.dumps(list(value), ensure_ascii=False)
+        elif value is None and field == "duration_minutes":
+            value = 0
+        values.append(value)
+    return values
+
+
+def _has_table(conn: sqlite3.Connection, name: str) -> bool:
+    return conn.execute("SELECT 1 FROM sqlite_master WHERE name = ?", (name,)).fetchone() is not None
+
+
+def _is_busy(error: sqlite3.Error) -> bool:
+    """БД занята другой записью (перезаливка) — временная недоступность, а не ошибка запроса."""
+    code = getattr(error, "sqlite_errorcode", None)
+    if code is not None:
+        return code & 0xFF in (sqlite3.SQLITE_BUSY, sqlite3.SQLITE_LOCKED)
+    return isinstance(error, sqlite3.OperationalError) and "locked" in str(error)
+
+
+def write_change(conn: sqlite3.Connection, kind: str, key: str, record: Optional[Record]) -> None:
+    """Заменить, добавить или удалить строку таблицы kind (внутри транзакции вызывающего)."""
+    pk = KINDS[kind].key
+    fts_table, fts_values = _FTS.get(kind, ("", None))
+    fts = bool(fts_table) and _has_table(conn, fts_table)
+    if fts:
+        conn.execute(f"DELETE FROM {fts_table} WHERE rowid = (SELECT rowid FROM {kind} WHERE {pk} = ?)", (key,))
+    if record is None:
+        conn.execute(f"DELETE FROM {kind} WHERE {pk} = ?", (key,))
+    else:
+        columns = record._fields
+        updates = ", ".join(f"{c} = excluded.{c}" for c in columns if c != pk)
+        conn.execute(
+            f"INSERT INTO {kind} ({', '.join(columns)}) VALUES ({','.join('?' * len(columns))}) "
+            f"ON CONFLICT({pk}) DO UPDATE SET {updates}",
+            _row(record),
+        )
+        if fts:
+            values = fts_values(record)
+            conn.execute(
+                f"INSERT INTO {fts_table} (rowid, {', '.join(values)}) "
+                f"SELECT rowid, {','.join('?' * len(values))} FROM {kind} WHERE {pk} = ?",
+                (*values.values(), key),
+            )
+    # Строка изменена не заливкой: следующая заливка сверит её с JSON заново
+    if _has_table(conn, "seed_hashes"):
+        conn.execute("DELETE FROM seed_hashes WHERE tbl = ? AND id = ?", (kind, key))
+    if _has_table(conn, "content_meta"):
+        conn.execute(BUMP_VERSION)
+
+
+class SqliteSnapshot(BaseDB):
+    """Снимок таблиц в памяти с теми же правилами поиска и порядком, что и SQL-запросы (search_rules)."""
+
+    def __init__(self, tables: Dict[str, List[Record]]) -> None:
+        self.loaded_at = time.monotonic()
+        self._exercises = sorted(tables["exercises"], key=sort_key)
+        self._education = sorted(tables["education"], key=lambda r: sort_key(r, "title"))
+        self._complexes = sorted(tables["complexes"], key=sort_key)
+        self._terminology = sorted(tables["terminology"], key=lambda r: r.get("term") or "")
+
+    def __len__(self) -> int:
+        return len(self._exercises) + len(self._education) + len(self._complexes) + len(self._terminology)
+
+    @staticmethod
+    def _by_id(rows: List[Dict[str, Any]], row_id: str) -> Optional[Dict[str, Any]]:
+        for r in rows:
+            if str(r.get("id")) == str(row_id):
+                return r
+        return None
+
+    def search_exercises(self, query: str) -> List[Dict[str, Any]]:
+        return filter_exercises(self._exercises, query)
+
+    def get_all_exercises(self) -> List[Dict[str, Any]]:
+        return list(self._exercises)
+
+    def get_exercise_by_id(self, exercise_id: str) -> Optional[Dict[str, Any]]:
+        return self._by_id(self._exercises, exercise_id)
+
+    def get_all_education(self) -> List[Dict[str, Any]]:
+        return list(self._education)
+
+    def get_education_by_id(self, education_id: str) -> Optional[Dict[str, Any]]:
+        return self._by_id(self._education, education_id)
+
+    def get_all_complexes(self) -> List[Dict[str, Any]]:
+        return list(self._complexes)
+
+    def get_complex_by_id(self, complex_id: str) -> Optional[Dict[str, Any]]:
+        return self._by_id(self._complexes, complex_id)
+
+    def search_terminology(self, term: str) -> Optional[Dict[str, Any]]:
+        return find_term(self._terminology, term)
+
+    def get_all_terms(self) -> List[str]:
+        return [t["term"] for t in self._terminology]
+
+    def get_all_terminology(self) -> List[Dict[str, Any]]:
+        return list(self._terminology)
 
 
 class RunningClubDB(BaseDB):
     """Работа с данными через SQLite."""
 
-    def __init__(self) -> None:
-        SQLITE_DB_PATH.parent.mkdir(parents=True, exist_ok=True)
-        self._path = SQLITE_DB_PATH
-        self._init_schema()
+    def __init__(self, db_path: Path = SQLITE_DB_PATH, data_dir: Optional[Path] = None) -> None:
+        """data_dir — папка JSON и журнала правок арендатора (None — пути из config.py)."""
+        db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._path = db_path
+        self._data_dir = data_dir
+        self._journal = CONTENT_JOURNAL if data_dir is None else data_dir / CONTENT_JOURNAL.name
+        self._state = _states.setdefault(db_path, _DbState())
+        try:
+            self._init_schema()
+        except sqlite3.Error as e:
+            if not _is_busy(e):
+                raise
+            logger.warning("SQLite занята при инициализации схемы: %s", e)
+            self._record_busy()
+        self._schedule_refresh()
+
+    @classmethod
+    def open(cls, data_dir: Optional[Path] = None) -> BaseDB:
+        return cls() if data_dir is None else cls(data_dir / SQLITE_DB_PATH.name, data_dir)
+
+    @classmethod
+    def content_version(cls, data_dir: Optional[Path] = None) -> str:
+        """
+        Версия из строки content_meta: только закоммиченное состояние, поэтому рост WAL
+        во время заливки её не меняет. Читается через постоянное соединение без ожидания
+        блокировки; если БД занята — последняя прочитанная версия.
+        """
+        db_path = SQLITE_DB_PATH if data_dir is None else data_dir / SQLITE_DB_PATH.name
+        state = _states.setdefault(db_path, _DbState())
+        try:
+            inode = db_path.stat().st_ino
+        except OSError:
+            return "-"
+        with state.version_lock:
+            try:
+                # Файл подменили целиком (копирование другой БД) — переоткрыть соединение
+                if state.version_conn is None or state.version_conn[0] != inode:
+                    if state.version_conn is not None:
+                        state.version_conn[1].close()
+                        state.version_conn = None
+                    conn = sqlite3.connect(db_path, timeout=0, isolation_level=None, check_same_thread=False)
+                    state.version_conn = (inode, conn)
+                conn = state.version_conn[1]
+                if _has_table(conn, "content_meta"):
+                    rows = conn.execute("SELECT value FROM content_meta WHERE key = 'version'").fetchall()
+                else:
+                    rows = []
+                state.version = f"{inode}:{rows[0][0] if rows else 0}"
+            except sqlite3.Error as e:
+                if not _is_busy(e):
+                    logger.warning("Не удалось прочитать версию контента %s: %s", db_path, e)
+            return state.version
 
     def _conn(self) -> sqlite3.Connection:
-        conn = sqlite3.connect(self._path)
+        """Соединение; ожидание блокировки — не дольше SQLITE_QUERY_TIMEOUT, сам запрос не ограничен."""
+        conn = sqlite3.connect(self._path, timeout=SQLITE_QUERY_TIMEOUT)
         conn.row_factory = sqlite3.Row
+        register_functions(conn)
         return conn
 
-    def _row_to_dict(self, row: sqlite3.Row) -> Dict[str, Any]:
-        return dict(row) if row else {}
+    def _record_busy(self) -> None:
+        _stats["busy"] += 1
+        self._state.breaker.record_failure()
+
+    def _read(self, query: Callable[[sqlite3.Connection], Any], fallback: Callable[[BaseDB], Any]) -> Any:
+        """
+        Выполнить чтение через breaker. Если БД занята или цепь разомкнута — ответ
+        из последнего удачного снимка (некэшируемый), без снимка — ContentUnavailable.
+        Прочие ошибки SQLite пробрасываются: это ошибка запроса или файла, а не блокировка.
+        """
+        if self._state.breaker.allow():
+            conn = None
+            try:
+                conn = self._conn()
+                result = query(conn)
+                self._state.breaker.record_success()
+            except sqlite3.Error as e:
+                if not _is_busy(e):
+                    _stats["errors"] += 1
+                    raise
+                logger.warning("SQLite занята: %s — ответ из снимка", e)
+                self._record_busy()
+            else:
+                self._schedule_refresh()
+                return result
+            finally:
+                if conn is not None:
+                    conn.close()
+        snapshot = self._state.snapshot
+        if snapshot is None:
+            _stats["unavailable"] += 1
+            logger.error("SQLite %s недоступна, а снимка таблиц нет — ответить нечем", self._path)
+            raise ContentUnavailable(f"SQLite {self._path} недоступна, снимка нет")
+        _stats["fallbacks"] += 1
+        note_fallback()
+        return fallback(snapshot)
+
+    def _schedule_refresh(self) -> None:
+        """Обновить снимок в фоновом потоке, если он старше SQLITE_SNAPSHOT_REFRESH_SECONDS."""
+        state = self._state
+        now = time.monotonic()
+        with state.lock:
+            if state.refreshing or now < state.refresh_after:
+                return
+            state.refreshing = True
+            state.refresh_after = now + SQLITE_SNAPSHOT_REFRESH_SECONDS
+        threading.Thread(target=self._refresh_snapshot, name="sqlite-snapshot", daemon=True).start()
+
+    def _refresh_snapshot(self) -> None:
+        """Перечитать таблицы в снимок (если строк не больше SQLITE_SNAPSHOT_MAX_ROWS)."""
+
+        def load(c: sqlite3.Connection) -> Optional[Dict[str, List[Record]]]:
+            tables = ("exercises", "education", "complexes", "terminology")
+            total = sum(c.execute(f"SELECT count(*) FROM {t}").fetchone()[0] for t in tables)
+            if total > SQLITE_SNAPSHOT_MAX_ROWS:
+                return None
+            return {t: [_RECORDS[t].from_mapping(r) for r in c.execute(f"SELECT * FROM {t}")] for t in tables}
+
+        conn = None
+        try:
+            conn = sqlite3.connect(self._path, timeout=SQLITE_QUERY_TIMEOUT)
+            conn.row_factory = sqlite3.Row
+            # Одна транзакция чтения: снимок согласован, даже если рядом идёт запись
+            conn.execute("BEGIN")
+            tables = load(conn)
+        except sqlite3.Error as e:
+            logger.warning("Не удалось обновить снимок SQLite: %s", e)
+            if _is_busy(e):
+                self._record_busy()
+            else:
+                _stats["errors"] += 1
+            return
+        finally:
+            if conn is not None:
+                conn.close()
+            with self._state.lock:
+                self._state.refreshing = False
+        if tables is not None:
+            self._state.snapshot = SqliteSnapshot(tables)
+            _stats["snapshot_rows"] = len(self._state.snapshot)
+
+    def get_record(self, kind: str, key: str) -> Optional[Record]:
+        pk = KINDS[kind].key
+
+        def run(c: sqlite3.Connection) -> Optional[Record]:
+            row = c.execute(f"SELECT * FROM {kind} WHERE {pk} = ?", (key,)).fetchone()
+            return _RECORDS[kind].from_mapping(row) if row else None
+
+        return self._read(run, lambda s: BaseDB.get_record(s, kind, key))
+
+    def apply_change(self, kind: str, key: str, record: Optional[Record]) -> None:
+        """
+        Правка одной записи в отдельной транзакции (BEGIN IMMEDIATE — без ожидания посреди записи).
+        Журнал пишется до COMMIT: если он недоступен, правка откатывается целиком.
+        """
+        conn = sqlite3.connect(self._path, timeout=SQLITE_QUERY_TIMEOUT, isolation_level=None)
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                write_change(conn, kind, key, record)
+                append_journal(self._journal, kind, key, record)
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+        finally:
+            conn.close()
+
+    def compact(self) -> None:
+        """Перенести правки из журнала в *.json (как режим json при остановке бота)."""
+        try:
+            if self._journal.stat().st_size == 0:
+                return
+        except OSError:
+            return
+        JsonDB(self._data_dir).compact()
 
     def _init_schema(self) -> None:
         """Создание таблиц при первом запуске."""
-        with self._conn() as c:
-            c.executescript("""
-                CREATE TABLE IF NOT EXISTS exercises (
-                    id TEXT PRIMARY KEY,
-                    name TEXT NOT NULL,
-                    description TEXT,
-                    link TEXT,
-                    keywords TEXT
-                );
-                CREATE TABLE IF NOT EXISTS education (
-                    id TEXT PRIMARY KEY,
-                    title TEXT NOT NULL,
-                    description TEXT,
-                    link TEXT,
-                    category TEXT
-                );
-                CREATE TABLE IF NOT EXISTS complexes (
-                    id TEXT PRIMARY KEY,
-                    name TEXT NOT NULL,
-                    description TEXT,
-                    structure TEXT,
-                    duration_minutes INTEGER
-                );
-                CREATE TABLE IF NOT EXISTS terminology (
-                    term TEXT PRIMARY KEY,
-                    definition TEXT NOT NULL
-                );
-                CREATE INDEX IF NOT EXISTS idx_exercises_name ON exercises(name);
-                CREATE INDEX IF NOT EXISTS idx_terminology_term ON terminology(term);
-            """)
+        conn = self._conn()
+        try:
+            with conn:
+                conn.executescript(SCHEMA)
+        finally:
+            conn.close()
 
     def search_exercises(self, query: str) -> List[Dict[str, Any]]:
-        """Поиск упражнений по названию и ключевым словам."""
-        q = query.strip().lower()
-        if not q:
+        """
+        Поиск упражнений: все слова запроса — в названии, ключевых словах или описании.
+        По индексу exercises_trgm, без него — проверка каждой строки.
+        """
+        words = tokenize(query)
+        if not words:
             return []
-        with self._conn() as c:
+
+        def run(c: sqlite3.Connection) -> List[Dict[str, Any]]:
+            if _has_table(c, "exercises_trgm"):
+                joins = "JOIN exercises_trgm f ON f.rowid = e.rowid"
+                where, params = trigram_where("exercises_trgm", words)
+            else:
+                joins = ""
+                where, params = words_where("exercise_text(e.name, e.keywords, e.description)", words)
             cur = c.execute(
-                """
-                SELECT id, name, description, link, keywords
-                FROM exercises
-                WHERE lower(name) LIKE ? OR lower(description) LIKE ?
-                   OR lower(keywords) LIKE ?
-                ORDER BY name
-                """,
-                (f"%{q}%", f"%{q}%", f"%{q}%"),
+                f"SELECT e.id, e.name, e.description, e.link, e.keywords FROM exercises e {joins} "
+                f"WHERE {where} ORDER BY e.name, e.id",
+                params,
             )
-            rows = cur.fetchall()
-        return [self._row_to_dict(r) for r in rows]
+            return [Exercise.from_mapping(r) for r in cur.fetchall()]
+
+        return self._read(run, lambda s: s.search_exercises(query))
+
+    def get_all_exercises(self) -> List[Dict[str, Any]]:
+        return self._read(
+            lambda c: [Exercise.from_mapping(r) for r in c.execute("SELECT * FROM exercises ORDER BY name, id")],
+            lambda s: s.get_all_exercises(),
+        )
 
     def get_exercise_by_id(self, exercise_id: str) -> Optional[Dict[str, Any]]:
-        row = None
-        with self._conn() as c:
-            cur = c.execute("SELECT * FROM exercises WHERE id = ?", (exercise_id,))
-            row = cur.fetchone()
-        return self._row_to_dict(row) if row else None
+        def run(c: sqlite3.Connection) -> Optional[Dict[str, Any]]:
+            row = c.execute("SELECT * FROM exercises WHERE id = ?", (exercise_id,)).fetchone()
+            return Exercise.from_mapping(row) if row else None
+
+        return self._read(run, lambda s: s.get_exercise_by_id(exercise_id))
 
     def get_all_education(self) -> List[Dict[str, Any]]:
-        with self._conn() as c:
-            cur = c.execute("SELECT * FROM education ORDER BY title")
-            return [self._row_to_dict(r) for r in cur.fetchall()]
+        return self._read(
+            lambda c: [EducationMaterial.from_mapping(r) for r in c.execute("SELECT * FROM education ORDER BY title, id")],
+            lambda s: s.get_all_education(),
+        )
 
     def get_education_by_id(self, education_id: str) -> Optional[Dict[str, Any]]:
-        with self._conn() as c:
-            cur = c.execute("SELECT * FROM education WHERE id = ?", (education_id,))
-            row = cur.fetchone()
-        return self._row_to_dict(row) if row else None
+        def run(c: sqlite3.Connection) -> Optional[Dict[str, Any]]:
+            row = c.execute("SELECT * FROM education WHERE id = ?", (education_id,)).fetchone()
+            return EducationMaterial.from_mapping(row) if row else None
+
+        return self._read(run, lambda s: s.get_education_by_id(education_id))
+
+    def get_education_categories(self) -> List[Tuple[str, int]]:
+        """Категории и число материалов — GROUP BY по индексу idx_education_category."""
+
+        def run(c: sqlite3.Connection) -> List[Tuple[str, int]]:
+            counts: Dict[str, int] = {}
+            for category, n in c.execute("SELECT category, count(*) FROM education GROUP BY category"):
+                # NULL и пустая строка — одна категория «без категории»
+                counts[category or ""] = counts.get(category or "", 0) + n
+            return sorted(counts.items(), key=lambda item: category_order(item[0]))
+
+        return self._read(run, lambda s: s.get_education_categories())
+
+    def get_education_by_category(self, category: str) -> List[Dict[str, Any]]:
+        """Материалы категории по индексу idx_education_category (он же задаёт порядок title, id)."""
+
+        def run(c: sqlite3.Connection) -> List[Dict[str, Any]]:
+            if category:
+                cur = c.execute("SELECT * FROM education WHERE category = ? ORDER BY title, id", (category,))
+            else:
+                cur = c.execute(
+                    "SELECT * FROM education WHERE category = '' OR category IS NULL ORDER BY title, id"
+                )
+            return [EducationMaterial.from_mapping(r) for r in cur]
+
+        return self._read(run, lambda s: s.get_education_by_category(category))
 
     def get_all_complexes(self) -> List[Dict[str, Any]]:
-        with self._conn() as c:
-            cur = c.execute("SELECT * FROM complexes ORDER BY name")
-            return [self._row_to_dict(r) for r in cur.fetchall()]
+        return self._read(
+            lambda c: [Complex.from_mapping(r) for r in c.execute("SELECT * FROM complexes ORDER BY name, id")],
+            lambda s: s.get_all_complexes(),
+        )
 
     def get_complex_by_id(self, complex_id: str) -> Optional[Dict[str, Any]]:
-        with self._conn() as c:
-            cur = c.execute("SELECT * FROM complexes WHERE id = ?", (complex_id,))
-            row = cur.fetchone()
-        return self._row_to_dict(row) if row else None
+        def run(c: sqlite3.Connection) -> Optional[Dict[str, Any]]:
+            row = c.execute("SELECT * FROM complexes WHERE id = ?", (complex_id,)).fetchone()
+            return Complex.from_mapping(row) if row else None
 
-    def search_terminology(self, term: str) -> Optional[Dict[str, Any]]:
-        t = term.strip().lower()
-        if not t:
-            return None
-        with self._conn() as c:
+        return self._read(run, lambda s: s.get_complex_by_id(complex_id))
+
+    def filter_complexes(
+        self, min_minutes: Optional[int] = None, max_minutes: Optional[int] = None, structure: str = ""
+    ) -> List[Dict[str, Any]]:
+        """
+        Диапазон длительности — по индексу idx_complexes_duration; слова структуры —
+        префиксный запрос к complexes_fts (без FTS-таблицы — проверка каждой строки).
+        """
+        words = tokenize(structure)
+        bounds = duration_bounds(min_minutes, max_minutes)
+
+        def run(c: sqlite3.Connection) -> List[Dict[str, Any]]:
+            joins = ""
+            where: List[str] = []
+            params: List[Any] = []
+            if bounds is not None:
+                where.append("c.duration_minutes BETWEEN ? AND ?")
+                params += bounds
+            if words and _has_table(c, "complexes_fts"):
+                joins = "JOIN complexes_fts f ON f.rowid = c.rowid"
+                where.append("complexes_fts MATCH ?")
+                params.append(" AND ".join(f'"{w}"*' for w in words))
+            elif words:
+                where.append("has_word_prefixes(c.structure, ?)")
+                params.append(" ".join(words))
             cur = c.execute(
-                "SELECT term, definition FROM terminology WHERE lower(term) LIKE ?",
-                (f"%{t}%",),
+                f"SELECT c.id, c.name, c.description, c.structure, c.duration_minutes FROM complexes c {joins} "
+                f"WHERE {' AND '.join(where) or '1'} ORDER BY c.duration_minutes, c.name, c.id",
+                params,
             )
-            row = cur.fetchone()
-        return self._row_to_dict(row) if row else None
+            return [Complex.from_mapping(r) for r in cur]
+
+        return self._read(run, lambda s: s.filter_complexes(min_minutes, max_minutes, structure))
+
+    def search_terminology(self, term: str) -> Optional[Dict[str, Any]]:
+        """Точное совпадение термина или первый по алфавиту; по индексу terminology_trgm, если он есть."""
+        words = tokenize(term)
+        if not words:
+            return None
+
+        def run(c: sqlite3.Connection) -> Optional[Dict[str, Any]]:
+            if _has_table(c, "terminology_trgm"):
+                joins = "JOIN terminology_trgm f ON f.rowid = t.rowid"
+                where, params = trigram_where("terminology_trgm", words)
+            else:
+                joins = ""
+                where, params = words_where("lower_u(t.term)", words)
+            row = c.execute(
+                f"SELECT t.term, t.definition FROM terminology t {joins} WHERE {where} "
+                "ORDER BY norm(t.term) = ? DESC, t.term LIMIT 1",
+                (*params, normalize_query(term)),
+            ).fetchone()
+            return Term.from_mapping(row) if row else None
+
+        return self._read(run, lambda s: s.search_terminology(term))
 
     def get_all_terms(self) -> List[str]:
-        with self._conn() as c:
-            cur = c.execute("SELECT term FROM terminology ORDER BY term")
-            return [r[0] for r in cur.fetchall()]
+        return self._read(
+            lambda c: [r[0] for r in c.execute("SELECT term FROM terminology ORDER BY term")],
+            lambda s: s.get_all_terms(),
+        )
 
     def get_all_terminology(self) -> List[Dict[str, Any]]:
-        with self._conn() as c:
-            cur = c.execute("SELECT term, definition FROM terminology ORDER BY term")
-            return [{"term": r[0], "definition": r[1]} for r in cur.fetchall()]
+        return self._read(
+            lambda c: [
+                Term.from_mapping(r)
+                for r in c.execute("SELECT term, definition FROM terminology ORDER BY term")
+            ],
+            lambda s: s.get_all_terminology(),
+        )
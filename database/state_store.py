@@ -0,0 +1,265 @@
+# -*- coding: utf-8 -*-
+"""
+Персистентность состояния диалога (user_data / chat_data) в SQLite.
+Хранится только компактное состояние (ключи STATE_KEYS: режим ввода, курсор пагинации),
+простаивающие записи удаляются по TTL. Изменения пишутся только в цикле update_interval
+Application: всё, что он передал, — одной транзакцией в отдельном потоке (не в цикле
+событий), одновременно идёт не больше одной записи.
+"""
+
+import asyncio
+import json
+import logging
+import sqlite3
+import time
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+
+from telegram.ext import Application, BasePersistence, PersistenceInput
+
+from config import STATE_DB_PATH, STATE_FLUSH_INTERVAL, STATE_TTL_SECONDS
+from database.cache import estimate_size
+from services import metrics, tenants
+
+logger = logging.getLogger(__name__)
+
+# Какие ключи user_data/chat_data сохраняются; всё остальное живёт только в памяти
+STATE_KEYS = ("expect", "cursor")
+
+_TABLES = ("user_state", "chat_state")
+
+
+def _compact(data: Dict[str, Any]) -> Dict[str, Any]:
+    return {k: data[k] for k in STATE_KEYS if data.get(k) is not None}
+
+
+# Арендатор -> его хранилище состояния (у каждого Application своё)
+_instances: Dict[str, "CompactStatePersistence"] = {}
+
+
+def _stats() -> Dict[str, Any]:
+    persistence = _instances.get(tenants.current().name)
+    return persistence.stats() if persistence is not None else {}
+
+
+metrics.register("user_state", _stats)
+
+
+class CompactStatePersistence(BasePersistence):
+    """BasePersistence, сохраняющая в SQLite только компактное состояние пользователей и чатов."""
+
+    def __init__(
+        self,
+        path: Path = STATE_DB_PATH,
+        ttl: float = STATE_TTL_SECONDS,
+        update_interval: float = STATE_FLUSH_INTERVAL,
+    ) -> None:
+        super().__init__(
+            store_data=PersistenceInput(bot_data=False, chat_data=True, user_data=True, callback_data=False),
+            update_interval=update_interval,
+        )
+        self._path = path
+        self._ttl = ttl
+        # Последнее записанное состояние и время последнего изменения: (таблица, id) -> ...
+        self._state: Dict[Tuple[str, int], Dict[str, Any]] = {}
+        self._touched: Dict[Tuple[str, int], float] = {}
+        # Ожидающие записи: (таблица, id) -> состояние или None (удалить)
+        self._dirty: Dict[Tuple[str, int], Optional[Dict[str, Any]]] = {}
+        # Текущая запись в БД (не больше одной сразу)
+        self._flush_task: Optional["asyncio.Task[None]"] = None
+        self._eviction_task: Optional[asyncio.Task] = None
+        self.rows_written = 0
+        self.batches = 0
+        self.evicted = 0
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # Пишет поток записи, но всегда один: запись начинается, только когда прежняя закончилась
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        for table in _TABLES:
+            self._db.execute(
+                f"CREATE TABLE IF NOT EXISTS {table} ("
+                "id INTEGER PRIMARY KEY, state TEXT NOT NULL, updated_at REAL NOT NULL)"
+            )
+        self._db.commit()
+        _instances[tenants.current().name] = self
+
+    # --- загрузка ---
+
+    def _load(self, table: str) -> Dict[int, Dict[str, Any]]:
+        """Прочитать таблицу, удалив записи старше TTL."""
+        cutoff = time.time() - self._ttl
+        with self._db:
+            self._db.execute(f"DELETE FROM {table} WHERE updated_at < ?", (cutoff,))
+        result: Dict[int, Dict[str, Any]] = {}
+        for row_id, state, updated_at in self._db.execute(f"SELECT id, state, updated_at FROM {table}"):
+            try:
+                data = json.loads(state)
+            except ValueError:
+                continue
+            result[row_id] = data
+            self._state[(table, row_id)] = dict(data)
+            self._touched[(table, row_id)] = updated_at
+        return result
+
+    async def get_user_data(self) -> Dict[int, Dict[str, Any]]:
+        return self._load("user_state")
+
+    async def get_chat_data(self) -> Dict[int, Dict[str, Any]]:
+        return self._load("chat_state")
+
+    async def get_bot_data(self) -> Dict[str, Any]:
+        return {}
+
+    async def get_callback_data(self) -> None:
+        return None
+
+    async def get_conversations(self, name: str) -> Dict:
+        return {}
+
+    # --- изменения ---
+
+    def _stage(self, table: str, row_id: int, data: Dict[str, Any]) -> None:
+        key = (table, row_id)
+        compact = _compact(data)
+        self._touched[key] = time.time()
+        if compact == self._state.get(key, {}):
+            return
+        if compact:
+            self._state[key] = compact
+            self._dirty[key] = compact
+        else:
+            self._state.pop(key, None)
+            self._dirty[key] = None
+
+    async def _commit(self) -> None:
+        """
+        Дождаться записи накопленных изменений. Вызовы одного цикла update_persistence
+        (Application собирает их в asyncio.gather) ждут одну и ту же запись: задача
+        запускается первым из них и выполняется, когда остальные уже внесли свои изменения.
+        """
+        if self._flush_task is None:
+            if not self._dirty:
+                return
+            self._flush_task = asyncio.get_running_loop().create_task(self._flush_dirty())
+        await asyncio.shield(self._flush_task)
+
+    async def _flush_dirty(self) -> None:
+        """Писать пачки в потоке, пока есть изменения (пришедшие во время записи — следующей пачкой)."""
+        try:
+            while self._dirty:
+                dirty, self._dirty = self._dirty, {}
+                try:
+                    await asyncio.to_thread(self._write, dirty)
+                except sqlite3.Error:
+                    logger.exception("Не удалось сохранить состояние пользователей")
+                    # Вернуть несохранённое, не затирая более свежие изменения; повтор — в следующем цикле
+                    for key, state in dirty.items():
+                        self._dirty.setdefault(key, state)
+                    return
+                self.rows_written += len(dirty)
+                self.batches += 1
+        finally:
+            self._flush_task = None
+
+    def _write(self, dirty: Dict[Tuple[str, int], Optional[Dict[str, Any]]]) -> None:
+        """Одна транзакция: вставки и удаления всех таблиц (в потоке записи)."""
+        now = time.time()
+        with self._db:
+            for table in _TABLES:
+                upserts = [
+                    (row_id, json.dumps(state, ensure_ascii=False, separators=(",", ":")), now)
+                    for (t, row_id), state in dirty.items()
+                    if t == table and state is not None
+                ]
+                deletes = [(row_id,) for (t, row_id), state in dirty.items() if t == table and state is None]
+                if upserts:
+                    self._db.executemany(
+                        f"INSERT OR REPLACE INTO {table} (id, state, updated_at) VALUES (?,?,?)",
+                        upserts,
+                    )
+                if deletes:
+                    self._db.executemany(f"DELETE FROM {table} WHERE id = ?", deletes)
+
+    async def update_user_data(self, user_id: int, data: Dict[str, Any]) -> None:
+        self._stage("user_state", user_id, data)
+        await self._commit()
+
+    async def update_chat_data(self, chat_id: int, data: Dict[str, Any]) -> None:
+        self._stage("chat_state", chat_id, data)
+        await self._commit()
+
+    async def drop_user_data(self, user_id: int) -> None:
+        self._drop("user_state", user_id)
+        await self._commit()
+
+    async def drop_chat_data(self, chat_id: int) -> None:
+        self._drop("chat_state", chat_id)
+        await self._commit()
+
+    def _drop(self, table: str, row_id: int) -> None:
+        key = (table, row_id)
+        self._touched.pop(key, None)
+        if self._state.pop(key, None) is not None:
+            self._dirty[key] = None
+
+    async def update_bot_data(self, data: Dict[str, Any]) -> None:
+        pass
+
+    async def update_callback_data(self, data: Any) -> None:
+        pass
+
+    async def update_conversation(self, name: str, key: Tuple[int, ...], new_state: Optional[object]) -> None:
+        pass
+
+    async def refresh_user_data(self, user_id: int, user_data: Dict[str, Any]) -> None:
+        pass
+
+    async def refresh_chat_data(self, chat_id: int, chat_data: Dict[str, Any]) -> None:
+        pass
+
+    async def refresh_bot_data(self, bot_data: Dict[str, Any]) -> None:
+        pass
+
+    async def flush(self) -> None:
+        if self._eviction_task:
+            self._eviction_task.cancel()
+            self._eviction_task = None
+        await self._commit()
+
+    # --- вытеснение по TTL ---
+
+    def evict_idle(self, application: Application) -> int:
+        """Удалить из памяти (и из БД) пользователей и чаты, не активные дольше TTL."""
+        cutoff = time.time() - self._ttl
+        count = 0
+        for (table, row_id), touched in list(self._touched.items()):
+            if touched >= cutoff:
+                continue
+            if table == "user_state":
+                application.drop_user_data(row_id)
+            else:
+                application.drop_chat_data(row_id)
+            self._touched.pop((table, row_id), None)
+            count += 1
+        self.evicted += count
+        return count
+
+    def start_eviction(self, application: Application) -> None:
+        """Фоновая задача: раз в update_interval вытеснять простаивающие записи."""
+
+        async def _loop() -> None:
+            while True:
+                await asyncio.sleep(self.update_interval)
+                self.evict_idle(application)
+
+        self._eviction_task = asyncio.get_running_loop().create_task(_loop())
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "entries": len(self._state),
+            "tracked": len(self._touched),
+            "dirty": len(self._dirty),
+            "memory_bytes": estimate_size(self._state),
+            "rows_written": self.rows_written,
+            "batches": self.batches,
+            "evicted": self.evicted,
+        }
@@ -1,42 +1,230 @@
 # -*- coding: utf-8 -*-
 """
 Хранение списка пользователей, нажавших /start (подписчики бота).
-Один общий файл users.json, независимо от режима SQLite/JSON для контента.
+У каждого арендатора (services/tenants.py) свои файлы в его папке данных.
+В режиме JSON — один файл users.json. В режиме SQLite — отдельная БД users.db
+с индексами по first_seen/last_seen/username и агрегатами по дням (регистрации
+и активные пользователи), которые обновляются при каждом /start.
+При первом запуске в режиме SQLite существующий users.json переносится в БД.
 """
 
 import json
-from datetime import datetime
+import sqlite3
+import threading
+from collections import Counter
+from datetime import datetime, timedelta
 from pathlib import Path
-from typing import Any, Dict, List
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
 
-from config import USERS_JSON
+from config import STORAGE_MODE, USERS_DB_PATH, USERS_JSON
+from services import tenants
+from services.startup import register_warmup
+from services.tracing import traced
+
+_TIME_FORMAT = "%Y-%m-%d %H:%M"
+
+
+def _now() -> str:
+    return datetime.utcnow().strftime(_TIME_FORMAT)
+
+
+def _user_row(user_id: Any, u: Dict[str, Any], first_seen: str) -> Dict[str, Any]:
+    return {
+        "user_id": user_id,
+        "username": u.get("username", ""),
+        "first_name": u.get("first_name", ""),
+        "last_name": u.get("last_name", ""),
+        "first_seen": first_seen,
+        "last_seen": u.get("last_seen", ""),
+    }
+
+
+# --- JSON ---
+
+def _users_json() -> Path:
+    return tenants.current().path(USERS_JSON)
 
 
 def _load() -> Dict[str, Any]:
     """Загрузить данные из users.json."""
-    USERS_JSON.parent.mkdir(parents=True, exist_ok=True)
-    if not USERS_JSON.exists():
+    path = _users_json()
+    path.parent.mkdir(parents=True, exist_ok=True)
+    if not path.exists():
         return {"users": {}, "by_date": []}
     try:
-        with open(USERS_JSON, "r", encoding="utf-8") as f:
+        with open(path, "r", encoding="utf-8") as f:
             return json.load(f)
     except (json.JSONDecodeError, OSError):
         return {"users": {}, "by_date": []}
 
 
 def _save(data: Dict[str, Any]) -> None:
-    with open(USERS_JSON, "w", encoding="utf-8") as f:
+    with open(_users_json(), "w", encoding="utf-8") as f:
         json.dump(data, f, ensure_ascii=False, indent=2)
 
 
+def _json_all_users(data: Dict[str, Any]) -> List[Dict[str, Any]]:
+    by_date = data.get("by_date", [])
+    users_dict = data.get("users", {})
+    result = []
+    seen = set()
+    for e in by_date:
+        uid = str(e["user_id"])
+        if uid in seen:
+            continue
+        seen.add(uid)
+        result.append(_user_row(e["user_id"], users_dict.get(uid, {}), e.get("at", "")))
+    for uid, u in users_dict.items():
+        if uid not in seen:
+            result.append(_user_row(u.get("user_id", int(uid)), u, u.get("last_seen", "")))
+    return result
+
+
+# --- SQLite ---
+
+# Арендатор -> (соединение с его users.db, блокировка соединения)
+_dbs: Dict[str, Tuple[sqlite3.Connection, threading.Lock]] = {}
+_open_lock = threading.Lock()
+
+_SCHEMA = """
+    CREATE TABLE IF NOT EXISTS users (
+        user_id INTEGER PRIMARY KEY,
+        username TEXT NOT NULL DEFAULT '',
+        username_lc TEXT NOT NULL DEFAULT '',
+        first_name TEXT NOT NULL DEFAULT '',
+        last_name TEXT NOT NULL DEFAULT '',
+        first_seen TEXT NOT NULL,
+        last_seen TEXT NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS idx_users_first_seen ON users(first_seen);
+    CREATE INDEX IF NOT EXISTS idx_users_last_seen ON users(last_seen);
+    CREATE INDEX IF NOT EXISTS idx_users_username ON users(username_lc);
+    -- Агрегаты по дням: регистрации и уникальные активные пользователи
+    CREATE TABLE IF NOT EXISTS daily_stats (
+        day TEXT PRIMARY KEY,
+        signups INTEGER NOT NULL DEFAULT 0,
+        active INTEGER NOT NULL DEFAULT 0
+    );
+    CREATE TABLE IF NOT EXISTS daily_active (
+        day TEXT NOT NULL,
+        user_id INTEGER NOT NULL,
+        PRIMARY KEY (day, user_id)
+    ) WITHOUT ROWID;
+"""
+
+
+def _use_sqlite() -> bool:
+    return STORAGE_MODE in ("sqlite", "memory")
+
+
+def _conn() -> sqlite3.Connection:
+    """Общее соединение с users.db арендатора; при первом открытии — схема и перенос из users.json."""
+    tenant = tenants.current()
+    db = _dbs.get(tenant.name)
+    if db is None:
+        with _open_lock:
+            db = _dbs.get(tenant.name)
+            if db is None:
+                path = tenant.path(USERS_DB_PATH)
+                path.parent.mkdir(parents=True, exist_ok=True)
+                conn = sqlite3.connect(path, check_same_thread=False)
+                conn.row_factory = sqlite3.Row
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.executescript(_SCHEMA)
+                db = _dbs[tenant.name] = (conn, threading.Lock())
+                if not conn.execute("SELECT 1 FROM users LIMIT 1").fetchone():
+                    migrate_json_to_sqlite()
+    return db[0]
+
+
+def _lock() -> threading.Lock:
+    """Блокировка соединения арендатора (после _conn())."""
+    return _dbs[tenants.current().name][1]
+
+
+def _touch_day(conn: sqlite3.Connection, user_id: int, day: str, is_new: bool) -> None:
+    """Обновить агрегаты дня: регистрация и (однократно за день) активность."""
+    conn.execute("INSERT OR IGNORE INTO daily_stats (day) VALUES (?)", (day,))
+    if is_new:
+        conn.execute("UPDATE daily_stats SET signups = signups + 1 WHERE day = ?", (day,))
+    cur = conn.execute("INSERT OR IGNORE INTO daily_active (day, user_id) VALUES (?, ?)", (day, user_id))
+    if cur.rowcount:
+        conn.execute("UPDATE daily_stats SET active = active + 1 WHERE day = ?", (day,))
+
+
+def migrate_json_to_sqlite(path: Optional[Path] = None) -> int:
+    """Перенести пользователей из users.json в users.db (повторный запуск ничего не дублирует)."""
+    path = path or _users_json()
+    if not path.exists():
+        return 0
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except (json.JSONDecodeError, OSError):
+        return 0
+    users = _json_all_users(data)
+    conn = _conn()
+    with _lock(), conn:
+        before = conn.total_changes
+        conn.executemany(
+            "INSERT OR IGNORE INTO users "
+            "(user_id, username, username_lc, first_name, last_name, first_seen, last_seen) "
+            "VALUES (?,?,?,?,?,?,?)",
+            [
+                (
+                    int(u["user_id"]), u["username"] or "", (u["username"] or "").lower(),
+                    u["first_name"] or "", u["last_name"] or "",
+                    u["first_seen"] or u["last_seen"] or "", u["last_seen"] or u["first_seen"] or "",
+                )
+                for u in users
+            ],
+        )
+        migrated = conn.total_changes - before
+        # Агрегаты по дням пересчитываются из перенесённых данных
+        conn.execute("DELETE FROM daily_stats")
+        conn.execute("DELETE FROM daily_active")
+        conn.execute(
+            "INSERT INTO daily_active (day, user_id) "
+            "SELECT DISTINCT substr(last_seen, 1, 10), user_id FROM users WHERE last_seen != ''"
+        )
+        conn.execute(
+            "INSERT INTO daily_stats (day, signups, active) "
+            "SELECT day, sum(signups), sum(active) FROM ("
+            "  SELECT substr(first_seen, 1, 10) AS day, count(*) AS signups, 0 AS active "
+            "  FROM users WHERE first_seen != '' GROUP BY day"
+            "  UNION ALL"
+            "  SELECT day, 0, count(*) FROM daily_active GROUP BY day"
+            ") GROUP BY day"
+        )
+    return migrated
+
+
+# --- Общий интерфейс ---
+
+@traced()
 def add_user(user_id: int, username: str = "", first_name: str = "", last_name: str = "") -> bool:
     """
     Добавить или обновить пользователя (вызвать при /start).
     Возвращает True, если пользователь новый (впервые нажал /start), False если уже был.
     """
+    now = _now()
+    if _use_sqlite():
+        conn = _conn()
+        with _lock(), conn:
+            is_new = conn.execute("SELECT 1 FROM users WHERE user_id = ?", (user_id,)).fetchone() is None
+            conn.execute(
+                "INSERT INTO users (user_id, username, username_lc, first_name, last_name, first_seen, last_seen) "
+                "VALUES (?,?,?,?,?,?,?) "
+                "ON CONFLICT(user_id) DO UPDATE SET username = excluded.username, "
+                "username_lc = excluded.username_lc, first_name = excluded.first_name, "
+                "last_name = excluded.last_name, last_seen = excluded.last_seen",
+                (user_id, username or "", (username or "").lower(), first_name or "", last_name or "", now, now),
+            )
+            _touch_day(conn, user_id, now[:10], is_new)
+        return is_new
+
     data = _load()
     uid = str(user_id)
-    now = datetime.utcnow().strftime("%Y-%m-%d %H:%M")
     is_new = uid not in data["users"]
     if is_new:
         data["by_date"].append({"user_id": user_id, "at": now})
@@ -51,41 +239,160 @@ def add_user(user_id: int, username: str = "", first_name: str = "", last_name:
     return is_new
 
 
+_ITER_BATCH = 1000
+_USER_COLUMNS = "user_id, username, first_name, last_name, first_seen, last_seen"
+
+
+def _select_users(where: str = "", params: tuple = ()) -> List[Dict[str, Any]]:
+    conn = _conn()
+    with _lock():
+        rows = conn.execute(
+            f"SELECT {_USER_COLUMNS} FROM users {where} ORDER BY first_seen, user_id",
+            params,
+        ).fetchall()
+    return [dict(r) for r in rows]
+
+
+def _iter_select_users(where: str = "", params: tuple = ()) -> Iterator[Dict[str, Any]]:
+    """
+    Построчное чтение пользователей пачками по _ITER_BATCH.
+    Отдельное соединение: долгий экспорт читает снимок (WAL) и не держит блокировку соединения,
+    поэтому /start других пользователей в это время не блокируется.
+    """
+    _conn()  # схема и перенос из users.json
+    conn = sqlite3.connect(tenants.current().path(USERS_DB_PATH), check_same_thread=False)
+    conn.row_factory = sqlite3.Row
+    try:
+        cur = conn.execute(
+            f"SELECT {_USER_COLUMNS} FROM users {where} ORDER BY first_seen, user_id",
+            params,
+        )
+        while True:
+            rows = cur.fetchmany(_ITER_BATCH)
+            if not rows:
+                break
+            for r in rows:
+                yield dict(r)
+    finally:
+        conn.close()
+
+
+def _user_filter(
+    date_from: Optional[str], date_to: Optional[str], username_prefix: Optional[str]
+) -> Tuple[str, tuple, Callable[[Dict[str, Any]], bool]]:
+    """Условие WHERE для SQLite и эквивалентный предикат для JSON."""
+    prefix = (username_prefix or "").lstrip("@").lower()
+    # Верхняя граница дня: "YYYY-MM-DD" < "YYYY-MM-DD HH:MM" < "YYYY-MM-DD~"
+    upper = f"{date_to}~" if date_to else None
+    clauses, params = [], []
+    if date_from:
+        clauses.append("first_seen >= ?")
+        params.append(date_from)
+    if upper:
+        clauses.append("first_seen < ?")
+        params.append(upper)
+    if prefix:
+        # Диапазон по индексу вместо LIKE: username_lc >= prefix AND < prefix + максимальный символ
+        clauses.append("username_lc >= ? AND username_lc < ?")
+        params.extend([prefix, prefix + "\uffff"])
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+
+    def match(u: Dict[str, Any]) -> bool:
+        return (
+            (not date_from or u["first_seen"] >= date_from)
+            and (not upper or u["first_seen"] < upper)
+            and (not prefix or (u["username"] or "").lower().startswith(prefix))
+        )
+
+    return where, tuple(params), match
+
+
+@traced()
 def get_all_users() -> List[Dict[str, Any]]:
     """Список всех сохранённых пользователей (для админ-команды /users)."""
-    data = _load()
-    by_date = data.get("by_date", [])
-    users_dict = data.get("users", {})
-    result = []
-    seen = set()
-    for e in by_date:
-        uid = str(e["user_id"])
-        if uid in seen:
-            continue
-        seen.add(uid)
-        u = users_dict.get(uid, {})
-        result.append({
-            "user_id": e["user_id"],
-            "username": u.get("username", ""),
-            "first_name": u.get("first_name", ""),
-            "last_name": u.get("last_name", ""),
-            "first_seen": e.get("at", ""),
-            "last_seen": u.get("last_seen", ""),
-        })
-    for uid, u in users_dict.items():
-        if uid not in seen:
-            result.append({
-                "user_id": u.get("user_id", int(uid)),
-                "username": u.get("username", ""),
-                "first_name": u.get("first_name", ""),
-                "last_name": u.get("last_name", ""),
-                "first_seen": u.get("last_seen", ""),
-                "last_seen": u.get("last_seen", ""),
-            })
-    return result
+    if _use_sqlite():
+        return _select_users()
+    return _json_all_users(_load())
+
+
+@traced()
+def find_users(
+    date_from: Optional[str] = None,
+    date_to: Optional[str] = None,
+    username_prefix: Optional[str] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Пользователи с первым /start в диапазоне дат (YYYY-MM-DD, включительно)
+    и/или с username, начинающимся с username_prefix (без учёта регистра).
+    """
+    where, params, match = _user_filter(date_from, date_to, username_prefix)
+    if _use_sqlite():
+        return _select_users(where, params)
+    return [u for u in _json_all_users(_load()) if match(u)]
 
 
+def iter_users(
+    date_from: Optional[str] = None,
+    date_to: Optional[str] = None,
+    username_prefix: Optional[str] = None,
+) -> Iterator[Dict[str, Any]]:
+    """
+    То же, что find_users, но генератором — для экспорта без списка в памяти.
+    В режиме SQLite строки читаются пачками; в режиме JSON файл и так загружается целиком.
+    """
+    where, params, match = _user_filter(date_from, date_to, username_prefix)
+    if _use_sqlite():
+        yield from _iter_select_users(where, params)
+        return
+    for u in _json_all_users(_load()):
+        if match(u):
+            yield u
+
+
+@traced()
+def daily_stats(days: int = 14) -> List[Dict[str, Any]]:
+    """Регистрации и активные пользователи по дням за последние days дней (новые дни первыми)."""
+    since = (datetime.utcnow() - timedelta(days=days - 1)).strftime("%Y-%m-%d")
+    if _use_sqlite():
+        conn = _conn()
+        with _lock():
+            rows = conn.execute(
+                "SELECT day, signups, active FROM daily_stats WHERE day >= ? ORDER BY day DESC",
+                (since,),
+            ).fetchall()
+        return [dict(r) for r in rows]
+    users = _json_all_users(_load())
+    # В JSON известен только последний визит, поэтому «активные» — по last_seen
+    signups = Counter(u["first_seen"][:10] for u in users if u["first_seen"][:10] >= since)
+    active = Counter(u["last_seen"][:10] for u in users if u["last_seen"][:10] >= since)
+    return [
+        {"day": day, "signups": signups.get(day, 0), "active": active.get(day, 0)}
+        for day in sorted(set(signups) | set(active), reverse=True)
+    ]
+
+
+@traced()
+def count_active(days: int) -> int:
+    """Сколько пользователей нажимали /start за последние days дней."""
+    since = (datetime.utcnow() - timedelta(days=days)).strftime(_TIME_FORMAT)
+    if _use_sqlite():
+        conn = _conn()
+        with _lock():
+            return conn.execute("SELECT count(*) FROM users WHERE last_seen >= ?", (since,)).fetchone()[0]
+    return sum(1 for u in _load().get("users", {}).values() if u.get("last_seen", "") >= since)
+
+
+@traced()
 def count_users() -> int:
     """Общее количество записанных пользователей."""
+    if _use_sqlite():
+        conn = _conn()
+        with _lock():
+            return conn.execute("SELECT count(*) FROM users").fetchone()[0]
     data = _load()
     return len(data.get("users", {}))
+
+
+# users.db открывается (и при первом запуске переносится users.json) при старте, а не на первом /start
+if _use_sqlite():
+    register_warmup("users_db", _conn)
@@ -1,29 +1,72 @@
 # -*- coding: utf-8 -*-
-"""Регистрация всех обработчиков бота."""
+"""
+Регистрация всех обработчиков бота.
+Маршрутизатор и хендлеры общие для всех арендаторов (services/tenants.py):
+данные выбираются по текущему арендатору, а не по приложению.
+"""
+
+from typing import Optional
 
 from telegram import Update
 from telegram.ext import ContextTypes
 
-from handlers.education import education_handlers
-from handlers.complexes import complexes_handlers
-from handlers.exercises import exercises_handlers
+from handlers.admin import admin_handlers
+from handlers.content import content_handlers
+from handlers.education import education_callbacks, education_handlers
+from handlers.complexes import complexes_callbacks, complexes_handlers
+from handlers.exercises import exercises_callbacks, exercises_handlers
+from handlers.inline import inline_handlers
 from handlers.terminology import terminology_handlers
-from handlers.search import search_handlers
-from handlers.menu import menu_handlers
+from handlers.search import search_handlers, text_message_router
+from handlers.menu import menu_buttons, menu_handlers
+from handlers.routing import Router
+from services import metrics
+from services.tracing import trace_handler
+
+
+def build_router() -> Router:
+    """Таблицы кнопок меню и префиксов callback_data; остальной текст — в поиск."""
+    router = Router(text_fallback=text_message_router)
+    router.add_buttons(menu_buttons)
+    router.add_callbacks(exercises_callbacks)
+    router.add_callbacks(education_callbacks)
+    router.add_callbacks(complexes_callbacks)
+    return router
+
+
+_router: Optional[Router] = None
+
+
+def shared_router() -> Router:
+    """Один маршрутизатор на процесс (таблицы неизменяемы после сборки)."""
+    global _router
+    if _router is None:
+        _router = build_router()
+        metrics.register("routes", _router.stats)
+    return _router
 
 
 def register_handlers(application) -> None:
-    """Подключает все хендлеры к приложению."""
-    # Сначала меню (команды и кнопки), затем callback, в конце — текст (поиск)
+    """Подключает все хендлеры к приложению (каждый callback — отдельный спан трассировки)."""
+    router = shared_router()
+    # Сначала команды, затем кнопки меню, callback и текст (поиск) через общий маршрутизатор
     for h in menu_handlers:
-        application.add_handler(h)
+        application.add_handler(trace_handler(h))
+    for h in admin_handlers:
+        application.add_handler(trace_handler(h))
+    for h in content_handlers:
+        application.add_handler(trace_handler(h))
     for h in exercises_handlers:
-        application.add_handler(h)
+        application.add_handler(trace_handler(h))
     for h in education_handlers:
-        application.add_handler(h)
+        application.add_handler(trace_handler(h))
     for h in complexes_handlers:
-        application.add_handler(h)
+        application.add_handler(trace_handler(h))
     for h in terminology_handlers:
-        application.add_handler(h)
+        application.add_handler(trace_handler(h))
     for h in search_handlers:
+        application.add_handler(trace_handler(h))
+    for h in router.handlers():
         application.add_handler(h)
+    for h in inline_handlers:
+        application.add_handler(trace_handler(h))
@@ -0,0 +1,147 @@
+# -*- coding: utf-8 -*-
+"""Служебные команды администраторов (только для ADMIN_IDS)."""
+
+import asyncio
+import html
+import time
+from io import BytesIO
+from typing import Optional
+
+from telegram import Bot, Update
+from telegram.ext import ContextTypes, CommandHandler
+
+from config import PROFILE_INTERVAL_MS, PROFILE_MAX_SECONDS
+from database.users_store import count_active, count_users, daily_stats
+from services import metrics, search_stats, startup, tenants
+from services.profiler import SamplingProfiler
+
+
+def is_admin(update: Update) -> bool:
+    """Проверка, что команду вызвал администратор текущего арендатора (ADMIN_IDS или admin_ids клуба)."""
+    user = update.effective_user
+    return bool(user and user.id in tenants.current().admin_ids)
+
+
+async def cmd_metrics(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Команда /metrics — счётчики кэша и других компонентов (только для ADMIN_IDS)."""
+    if not is_admin(update):
+        await update.message.reply_text("Нет доступа к этой команде.")
+        return
+    await update.message.reply_text(metrics.format_report(), parse_mode="HTML")
+
+
+async def cmd_startup(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Команда /startup — время запуска: этапы, прогрев и импорт по модулям (только для ADMIN_IDS)."""
+    if not is_admin(update):
+        await update.message.reply_text("Нет доступа к этой команде.")
+        return
+    await update.message.reply_text(startup.report(), parse_mode="HTML")
+
+
+@startup.needs_warmup
+async def cmd_userstats(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Команда /userstats [дней] — регистрации и активные пользователи по дням (только для ADMIN_IDS)."""
+    if not is_admin(update):
+        await update.message.reply_text("Нет доступа к этой команде.")
+        return
+    args = context.args or []
+    days = int(args[0]) if args and args[0].isdigit() else 14
+    days = max(1, min(days, 90))
+    lines = [
+        "📈 <b>Подписчики</b>",
+        f"Всего: {count_users()}",
+        f"Активны за 1 / 7 / 30 дней: {count_active(1)} / {count_active(7)} / {count_active(30)}",
+        "",
+        f"<b>По дням (последние {days})</b>: новые / активные",
+    ]
+    for row in daily_stats(days):
+        lines.append(f"{row['day']}: +{row['signups']} / {row['active']}")
+    await update.message.reply_text("\n".join(lines), parse_mode="HTML")
+
+
+async def cmd_searchstats(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Команда /searchstats [дней] — частые и пустые запросы, задержки поиска (только для ADMIN_IDS)."""
+    if not is_admin(update):
+        await update.message.reply_text("Нет доступа к этой команде.")
+        return
+    args = context.args or []
+    days = int(args[0]) if args and args[0].isdigit() else 7
+    days = max(1, min(days, 90))
+    # Сначала сбросить накопленное, чтобы отчёт включал последние запросы
+    await asyncio.to_thread(search_stats.flush)
+    top, empty = await asyncio.gather(
+        asyncio.to_thread(search_stats.top_queries, days),
+        asyncio.to_thread(search_stats.top_queries, days, 10, True),
+    )
+    lines = [f"🔎 <b>Поиск за {days} дн.</b>", "", "<b>Частые запросы</b> (поисков / пустых):"]
+    lines += [f"{html.escape(q)} [{kind}]: {n} / {e}" for kind, q, n, e in top] or ["—"]
+    lines += ["", "<b>Ничего не нашлось</b>:"]
+    lines += [f"{html.escape(q)} [{kind}]: {e} из {n}" for kind, q, n, e in empty] or ["—"]
+    lines += ["", "<b>Задержка</b> (p50 / p95 / p99, мс):"]
+    for kind, p in search_stats.latency().items():
+        if p:
+            lines.append(f"{kind}: {p['p50_ms']:.1f} / {p['p95_ms']:.1f} / {p['p99_ms']:.1f}")
+    stats = search_stats.stats()
+    lines.append(f"\nЗаписано: {stats['recorded']}, потеряно при переполнении: {stats['dropped']}")
+    await update.message.reply_text("\n".join(lines), parse_mode="HTML")
+
+
+_profiler: Optional[SamplingProfiler] = None
+
+
+async def _finish_profile(bot: Bot, chat_id: int, profiler: SamplingProfiler, seconds: int) -> None:
+    """Дождаться окончания профилирования и отправить отчёт и collapsed stacks."""
+    global _profiler
+    try:
+        await asyncio.sleep(seconds)
+        await asyncio.to_thread(profiler.stop)
+        lines = [
+            f"🔥 <b>Профиль за {profiler.duration:.1f} с</b>, семплов: {profiler.samples}",
+            "",
+            "<b>Поток цикла событий</b> (своё / всего, % семплов):",
+        ]
+        samples = max(profiler.samples, 1)
+        for label, own, total in profiler.top(15, thread="MainThread"):
+            lines.append(f"{100 * own / samples:5.1f}% / {100 * total / samples:5.1f}%  {html.escape(label)}")
+        await bot.send_message(chat_id, "\n".join(lines), parse_mode="HTML")
+        document = BytesIO(profiler.collapsed().encode("utf-8"))
+        await bot.send_document(
+            chat_id,
+            document=document,
+            filename=f"profile-{int(time.time())}.folded",
+            caption="Collapsed stacks: flamegraph.pl или speedscope.app",
+        )
+    finally:
+        if profiler.running:
+            profiler.stop()
+        _profiler = None
+
+
+async def cmd_profile(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Команда /profile [сек] — семплирующий профиль процесса на заданное время (только для ADMIN_IDS)."""
+    global _profiler
+    if not is_admin(update):
+        await update.message.reply_text("Нет доступа к этой команде.")
+        return
+    if _profiler is not None:
+        await update.message.reply_text("Профилирование уже идёт — дождитесь отчёта.")
+        return
+    args = context.args or []
+    seconds = int(args[0]) if args and args[0].isdigit() else 10
+    seconds = max(1, min(seconds, PROFILE_MAX_SECONDS))
+    _profiler = SamplingProfiler(interval=PROFILE_INTERVAL_MS / 1000)
+    _profiler.start()
+    # Отчёт отправит отдельная задача: обработчик не должен ждать и задерживать другие апдейты
+    context.application.create_task(
+        _finish_profile(context.bot, update.effective_chat.id, _profiler, seconds)
+    )
+    await update.message.reply_text(f"⏱ Профилирование запущено на {seconds} с.")
+
+
+admin_handlers = [
+    CommandHandler("metrics", cmd_metrics),
+    CommandHandler("startup", cmd_startup),
+    CommandHandler("userstats", cmd_userstats),
+    CommandHandler("searchstats", cmd_searchstats),
+    CommandHandler("profile", cmd_profile),
+]
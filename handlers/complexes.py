@@ -1,13 +1,109 @@
 # -*- coding: utf-8 -*-
-"""Раздел «Комплексы»: список комплексов и структура тренировки."""
+"""
+Раздел «Комплексы»: список комплексов и структура тренировки.
+Список фильтруется по длительности и словам структуры: кнопки «до 20 мин» / «20–45 мин» /
+«45+ мин» или /complex с условием, например «/complex до 45 интервал», «/complex 20-40».
+Результат фильтра кэшируется (get_db().filter_complexes), список листается страницами
+по COMPLEXES_PAGE_SIZE; фильтр и страница — в user_data["cursor"]. Кнопки листания несут
+свой фильтр (cxp:страница:от:до:слова), поэтому старое сообщение листается со своим фильтром.
+"""
 
-from telegram import Update
-from telegram.ext import ContextTypes, CallbackQueryHandler
+import hashlib
+import re
+from typing import Any, Dict, List, Optional, Tuple
 
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup, Update
+from telegram.error import BadRequest
+from telegram.ext import ContextTypes
+
+from config import COMPLEXES_PAGE_SIZE
 from database import get_db
+from database.cache import normalize_query
+from database.search_index import tokenize
 from handlers.keyboards import inline_list_keyboard
+from services.startup import needs_warmup
+from services.tracing import traced
+
+Filter = Tuple[Optional[int], Optional[int], str]
+
+# Кнопки быстрых фильтров: (текст, от, до) — границы включительно в целых минутах, поэтому
+# диапазоны полуоткрытые: 20 мин — только в «20–45», 45 — только в «45+»
+DURATION_PRESETS = (("⏱ до 20 мин", None, 19), ("20–45 мин", 20, 44), ("45+ мин", 45, None))
+
+# Предел callback_data в Telegram, байт
+_CALLBACK_DATA_MAX = 64
+
+_RANGE_RE = re.compile(r"(\d+)\s*[-–—]\s*(\d+)")
+_MAX_RE = re.compile(r"(?:до|<=?|≤)\s*(\d+)")
+_MIN_RE = re.compile(r"(?:от|>=?|≥)\s*(\d+)|(\d+)\s*\+")
+_UNITS_RE = re.compile(r"\b(?:мин|минут|минуты|минута)\b\.?")
+
+
+def parse_filter(text: str) -> Filter:
+    """Условие из текста: «до 45», «от 30», «20-40», «45+» (минуты) и слова структуры."""
+    text = normalize_query(text)
+    lo = hi = None
+    m = _RANGE_RE.search(text)
+    if m:
+        lo, hi = sorted((int(m[1]), int(m[2])))
+        text = text[: m.start()] + text[m.end():]
+    else:
+        m = _MAX_RE.search(text)
+        if m:
+            hi = int(m[1])
+            text = text[: m.start()] + text[m.end():]
+        m = _MIN_RE.search(text)
+        if m:
+            lo = int(m[1] or m[2])
+            text = text[: m.start()] + text[m.end():]
+    return lo, hi, " ".join(tokenize(_UNITS_RE.sub(" ", text)))
+
+
+def _describe(lo: Optional[int], hi: Optional[int], words: str) -> str:
+    parts = []
+    if lo is not None and hi is not None:
+        parts.append(f"{lo}–{hi} мин")
+    elif hi is not None:
+        parts.append(f"до {hi} мин")
+    elif lo is not None:
+        parts.append(f"от {lo} мин")
+    if words:
+        parts.append(f"в структуре: {words}")
+    return ", ".join(parts)
+
+
+def _words_token(words: str) -> str:
+    return hashlib.blake2b(words.encode("utf-8"), digest_size=4).hexdigest()
+
 
+def _page_data(page: int, lo: Optional[int], hi: Optional[int], words: str) -> str:
+    """
+    callback_data страницы с фильтром: cxp:страница:от:до:слова. Слова, не влезающие
+    в 64 байта, заменяются токеном #хэш — их берём из курсора (совпадает, если это последний список).
+    """
+    prefix = f"cxp:{page}:{'' if lo is None else lo}:{'' if hi is None else hi}:"
+    if len((prefix + words).encode("utf-8")) > _CALLBACK_DATA_MAX:
+        return f"{prefix}#{_words_token(words)}"
+    return prefix + words
 
+
+def _parse_page_data(rest: str, cursor: Any) -> Optional[Tuple[int, Filter]]:
+    """(страница, фильтр) из callback_data; None — фильтр не восстановить (кнопка старого формата или курсор истёк)."""
+    parts = rest.split(":", 3)
+    if len(parts) != 4 or not parts[0].isdigit():
+        return None
+    page, lo_text, hi_text, words = parts
+    lo = int(lo_text) if lo_text.isdigit() else None
+    hi = int(hi_text) if hi_text.isdigit() else None
+    if words.startswith("#"):
+        saved = cursor.get("filter") if isinstance(cursor, dict) else None
+        if not saved or [saved[0], saved[1]] != [lo, hi] or _words_token(saved[2]) != words[1:]:
+            return None
+        words = saved[2]
+    return int(page), (lo, hi, words)
+
+
+@traced("render.complex")
 def _format_complex(c: dict) -> str:
     name = c.get("name", "Без названия")
     desc = c.get("description", "")
@@ -23,19 +119,83 @@ def _format_complex(c: dict) -> str:
     return "\n".join(lines)
 
 
-async def show_complexes_list(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
-    """Показать список комплексов."""
-    db = get_db()
-    complexes = db.get_all_complexes()
+def _page(cursor: Dict[str, Any]) -> Tuple[str, InlineKeyboardMarkup]:
+    """Текст и клавиатура страницы: комплексы, листание и быстрые фильтры."""
+    lo, hi, words = cursor["filter"]
+    complexes = get_db().filter_complexes(lo, hi, words)
+    pages = max(1, -(-len(complexes) // COMPLEXES_PAGE_SIZE))
+    page = cursor["page"] = min(max(cursor["page"], 0), pages - 1)
+    start = page * COMPLEXES_PAGE_SIZE
+    rows: List[List[InlineKeyboardButton]] = [
+        list(row)
+        for row in inline_list_keyboard(
+            complexes[start:start + COMPLEXES_PAGE_SIZE], "complex", id_key="id", title_key="name"
+        ).inline_keyboard
+    ]
+    if pages > 1:
+        nav = [InlineKeyboardButton(f"{page + 1}/{pages}", callback_data="cxp:")]
+        if page > 0:
+            nav.insert(0, InlineKeyboardButton("◀️", callback_data=_page_data(page - 1, lo, hi, words)))
+        if page < pages - 1:
+            nav.append(InlineKeyboardButton("▶️", callback_data=_page_data(page + 1, lo, hi, words)))
+        rows.append(nav)
+    presets = [
+        InlineKeyboardButton(title, callback_data=f"cxf:{p_lo or ''}:{p_hi or ''}")
+        for title, p_lo, p_hi in DURATION_PRESETS
+        if (p_lo, p_hi, "") != (lo, hi, words)
+    ]
+    if lo is not None or hi is not None or words:
+        presets.append(InlineKeyboardButton("Все", callback_data="cxf::"))
+    rows.append(presets)
+    description = _describe(lo, hi, words)
     if not complexes:
-        await update.message.reply_text("Пока нет доступных комплексов.")
-        return
-    await update.message.reply_text(
-        "Выберите комплекс:",
-        reply_markup=inline_list_keyboard(complexes, "complex", id_key="id", title_key="name"),
-    )
+        text = f"Комплексы ({description}) не найдены." if description else "Пока нет доступных комплексов."
+    elif description:
+        text = f"Комплексы ({description}): {len(complexes)}. Выберите комплекс:"
+    else:
+        text = "Выберите комплекс:"
+    return text, InlineKeyboardMarkup(rows)
+
+
+@needs_warmup
+async def show_complexes_list(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Показать список комплексов (с условием после /complex — отфильтрованный)."""
+    cursor = {"filter": list(parse_filter(" ".join(context.args or []))), "page": 0}
+    context.user_data["cursor"] = cursor
+    text, markup = _page(cursor)
+    await update.message.reply_text(text, reply_markup=markup)
+
+
+@needs_warmup
+async def complexes_page_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Callback: страница списка (cxp:страница:от:до:слова) или быстрый фильтр по длительности (cxf:от:до)."""
+    query = update.callback_query
+    await query.answer()
+    prefix, _, rest = (query.data or "").partition(":")
+    if prefix == "cxf":
+        lo, _, hi = rest.partition(":")
+        cursor = {"filter": [int(lo) if lo else None, int(hi) if hi else None, ""], "page": 0}
+    else:
+        if not rest:
+            return  # кнопка с номером страницы
+        parsed = _parse_page_data(rest, context.user_data.get("cursor"))
+        if parsed is None:
+            # Фильтр сообщения неизвестен: не подменять его чужим или полным списком
+            await query.edit_message_text("Список устарел. Откройте /complex заново.")
+            return
+        page, (lo, hi, words) = parsed
+        cursor = {"filter": [lo, hi, words], "page": page}
+    context.user_data["cursor"] = cursor
+    text, markup = _page(cursor)
+    try:
+        await query.edit_message_text(text, reply_markup=markup)
+    except BadRequest as e:
+        # Сообщение уже показывает эту страницу (повторное нажатие той же кнопки)
+        if "not modified" not in str(e).lower():
+            raise
 
 
+@needs_warmup
 async def complex_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Callback: выбор комплекса."""
     await update.callback_query.answer()
@@ -57,6 +217,7 @@ async def complex_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) -
     )
 
 
-complexes_handlers = [
-    CallbackQueryHandler(complex_callback, pattern="^(complex:|back:)"),
-]
+# Inline-кнопки: префикс callback_data -> обработчик, см. handlers/routing.py
+# («back:» обрабатывает education_callback: ответ у обоих одинаковый)
+complexes_callbacks = {"complex": complex_callback, "cxp": complexes_page_callback, "cxf": complexes_page_callback}
+complexes_handlers = []
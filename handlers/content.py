@@ -0,0 +1,124 @@
+# -*- coding: utf-8 -*-
+"""
+Правка контента администраторами (только для ADMIN_IDS):
+- /show <вид> <ключ> — запись текстом «поле: значение»;
+- /edit <вид> и со следующей строки поля «поле: значение» — добавить запись или изменить
+  перечисленные поля существующей (ключ — id, у термина — term);
+- /delete <вид> <ключ> — удалить запись.
+Вид — упражнение, комплекс, материал или термин (или exercise, complex, material, term).
+Правка применяется сразу, без перезагрузки данных (database/content.py). Если хранилище
+её не приняло (БД заблокирована перезаливкой, нет доступа к файлу), админ получает ошибку.
+"""
+
+import html
+import logging
+import sqlite3
+import time
+
+from telegram import Update
+from telegram.ext import CommandHandler, ContextTypes
+
+from database import content, get_db
+from database.base import ContentUnavailable
+from database.records import KINDS
+from handlers.admin import is_admin
+from services.startup import needs_warmup
+
+logger = logging.getLogger(__name__)
+
+# Ошибки хранилища при правке: запись не сохранена, данные не изменились
+_STORAGE_ERRORS = (sqlite3.Error, OSError, ContentUnavailable)
+
+# Куда попадает правка (во всех режимах хранения): журнал правок накладывается и при заливке SQLite
+_SAVED_NOTE = "Сохранено в журнал правок; в data/*.json перенесётся при остановке бота."
+
+_EDIT_HELP = (
+    "Формат: первая строка — /edit вид, далее поля по строке «поле: значение».\n"
+    "Вид: упражнение, комплекс, материал, термин. Поля: {fields}"
+)
+
+
+@needs_warmup
+async def cmd_show(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Команда /show <вид> <ключ> — поля записи (для копирования в /edit)."""
+    if not is_admin(update):
+        await update.message.reply_text("Нет доступа к этой команде.")
+        return
+    args = context.args or []
+    try:
+        kind = content.resolve_kind(args[0] if args else "")
+    except ValueError as e:
+        await update.message.reply_text(f"{e}\nФормат: /show вид ключ")
+        return
+    key = " ".join(args[1:])
+    record = get_db().get_record(kind, key)
+    if record is None:
+        await update.message.reply_text(f"Запись {key!r} не найдена.")
+        return
+    await update.message.reply_text(
+        f"<pre>/edit {kind}\n{html.escape(content.format_fields(record))}</pre>", parse_mode="HTML"
+    )
+
+
+@needs_warmup
+async def cmd_edit(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Команда /edit <вид> + строки «поле: значение» — добавить или изменить запись."""
+    if not is_admin(update):
+        await update.message.reply_text("Нет доступа к этой команде.")
+        return
+    first, _, body = (update.message.text or "").partition("\n")
+    args = first.split()[1:]
+    try:
+        kind = content.resolve_kind(args[0] if args else "")
+    except ValueError as e:
+        await update.message.reply_text(f"{e}\n{_EDIT_HELP.format(fields='…')}")
+        return
+    started = time.perf_counter()
+    try:
+        old, new = content.upsert(kind, body)
+    except ValueError as e:
+        fields = ", ".join(KINDS[kind].record._fields)
+        await update.message.reply_text(f"⚠️ {e}\n{_EDIT_HELP.format(fields=fields)}")
+        return
+    except _STORAGE_ERRORS as e:
+        logger.warning("Правка %s не сохранена: %s", kind, e)
+        await update.message.reply_text(f"⚠️ Правка не сохранена, хранилище недоступно: {e}. Повторите позже.")
+        return
+    ms = (time.perf_counter() - started) * 1000
+    key = new.get(KINDS[kind].key)
+    action = "Изменено" if old is not None else "Добавлено"
+    await update.message.reply_text(f"✅ {action}: {kind} {key!r} ({ms:.1f} мс)\n{_SAVED_NOTE}")
+
+
+@needs_warmup
+async def cmd_delete(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Команда /delete <вид> <ключ> — удалить запись."""
+    if not is_admin(update):
+        await update.message.reply_text("Нет доступа к этой команде.")
+        return
+    args = context.args or []
+    try:
+        kind = content.resolve_kind(args[0] if args else "")
+    except ValueError as e:
+        await update.message.reply_text(f"{e}\nФормат: /delete вид ключ")
+        return
+    key = " ".join(args[1:])
+    started = time.perf_counter()
+    try:
+        old = content.delete(kind, key)
+    except _STORAGE_ERRORS as e:
+        logger.warning("Удаление %s %r не выполнено: %s", kind, key, e)
+        await update.message.reply_text(f"⚠️ Запись не удалена, хранилище недоступно: {e}. Повторите позже.")
+        return
+    if old is None:
+        await update.message.reply_text(f"Запись {key!r} не найдена.")
+        return
+    ms = (time.perf_counter() - started) * 1000
+    await update.message.reply_text(f"🗑 Удалено: {kind} {key!r} ({ms:.1f} мс)\n{_SAVED_NOTE}")
+
+
+content_handlers = [
+    CommandHandler("show", cmd_show),
+    CommandHandler("edit", cmd_edit),
+    CommandHandler("delete", cmd_delete),
+]
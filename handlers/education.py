@@ -1,13 +1,35 @@
 # -*- coding: utf-8 -*-
-"""Раздел «Образование»: список методичек и материалов."""
+"""
+Раздел «Образование»: категории → материалы категории → карточка материала.
+Фасетный индекс (категории с числом материалов и готовые клавиатуры страниц каждой
+категории) строится один раз на версию контента, при старте — в фоне; открыть
+категорию или страницу — один поиск в словаре. Правка материала из бота
+(database/content.py) перестраивает только его категории и список категорий.
+Кнопки: «edc:» — список категорий, «edc:<категория>:<страница>» — страница категории
+(категория — короткий хэш названия: callback_data не длиннее 64 байт).
+"""
 
-from telegram import Update
-from telegram.ext import ContextTypes, CallbackQueryHandler
+import hashlib
+import threading
+from typing import Dict, List, NamedTuple, Optional, Tuple
 
-from database import get_db
-from handlers.keyboards import inline_list_keyboard
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup, Update
+from telegram.ext import ContextTypes
 
+from config import EDUCATION_PAGE_SIZE
+from database import content, get_db
+from database.base import fallback_count
+from database.records import Record
+from database.search_rules import education_category
+from services import metrics
+from services.startup import needs_warmup, register_warmup
+from services.tenants import TenantLocal
+from services.tracing import traced
 
+NO_CATEGORY = "Без категории"
+
+
+@traced("render.education")
 def _format_education(m: dict) -> str:
     title = m.get("title", "Без названия")
     desc = m.get("description", "")
@@ -23,24 +45,179 @@ def _format_education(m: dict) -> str:
     return "\n".join(lines)
 
 
-async def show_education_list(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
-    """Показать список всех материалов образования."""
+def category_token(category: str) -> str:
+    """Короткий ключ категории для callback_data (не меняется при правке других категорий)."""
+    return hashlib.blake2b(category.encode("utf-8"), digest_size=4).hexdigest()
+
+
+def _short(title: str) -> str:
+    return title if len(title) <= 35 else title[:32] + "..."
+
+
+class CategoryFacet(NamedTuple):
+    name: str
+    count: int
+    # Готовые страницы: (текст сообщения, клавиатура)
+    pages: Tuple[Tuple[str, InlineKeyboardMarkup], ...]
+
+
+def _render_category(category: str, materials: List[Record]) -> CategoryFacet:
+    token = category_token(category)
+    label = category or NO_CATEGORY
+    chunks = [materials[i:i + EDUCATION_PAGE_SIZE] for i in range(0, len(materials), EDUCATION_PAGE_SIZE)]
+    pages = []
+    for page, chunk in enumerate(chunks):
+        rows = [
+            [InlineKeyboardButton(_short(m.get("title") or str(m.get("id"))), callback_data=f"edu:{m.get('id')}")]
+            for m in chunk
+        ]
+        if len(chunks) > 1:
+            nav = []
+            if page > 0:
+                nav.append(InlineKeyboardButton("◀️", callback_data=f"edc:{token}:{page - 1}"))
+            nav.append(InlineKeyboardButton(f"{page + 1}/{len(chunks)}", callback_data="edc:-"))
+            if page < len(chunks) - 1:
+                nav.append(InlineKeyboardButton("▶️", callback_data=f"edc:{token}:{page + 1}"))
+            rows.append(nav)
+        rows.append([InlineKeyboardButton("◀️ Категории", callback_data="edc:")])
+        pages.append((f"📁 {label} ({len(materials)}). Выберите материал:", InlineKeyboardMarkup(rows)))
+    return CategoryFacet(category, len(materials), tuple(pages))
+
+
+class EducationFacets:
+    """Категории материалов: по токену — готовые страницы, плюс готовый список категорий."""
+
+    def __init__(self, db) -> None:
+        self.categories: Dict[str, CategoryFacet] = {}
+        self._order: List[str] = []
+        for category, _ in db.get_education_categories():
+            self._render(db, category)
+        self._render_root(db)
+
+    def _render(self, db, category: str) -> None:
+        materials = db.get_education_by_category(category)
+        token = category_token(category)
+        if materials:
+            self.categories[token] = _render_category(category, materials)
+        else:
+            self.categories.pop(token, None)
+
+    def _render_root(self, db) -> None:
+        self._order = [category_token(c) for c, _ in db.get_education_categories()]
+        rows = []
+        for token in self._order:
+            facet = self.categories[token]
+            label = facet.name or NO_CATEGORY
+            rows.append([InlineKeyboardButton(f"📁 {label} ({facet.count})", callback_data=f"edc:{token}:0")])
+        self.root = InlineKeyboardMarkup(rows)
+
+    def update(self, db, categories: List[str]) -> None:
+        """Перестроить категории categories (правка материала) и список категорий."""
+        for category in categories:
+            self._render(db, category)
+        self._render_root(db)
+
+    def page(self, token: str, page: int) -> Optional[Tuple[str, InlineKeyboardMarkup]]:
+        facet = self.categories.get(token)
+        if facet is None:
+            return None
+        return facet.pages[min(max(page, 0), len(facet.pages) - 1)]
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "categories": len(self.categories),
+            "materials": sum(f.count for f in self.categories.values()),
+            "pages": sum(len(f.pages) for f in self.categories.values()),
+        }
+
+
+class _FacetsState:
+    """Фасеты одного арендатора: (версия контента, фасеты) — пересобираются при изменении данных."""
+
+    def __init__(self) -> None:
+        self.facets: Optional[Tuple[str, EducationFacets]] = None
+        self.lock = threading.Lock()
+        self.stats = {"builds": 0, "updates": 0}
+
+
+_states: TenantLocal[_FacetsState] = TenantLocal(lambda tenant: _FacetsState())
+
+
+def get_facets() -> EducationFacets:
+    """
+    Фасеты для текущей версии контента (при смене версии — пересборка).
+    Фасеты из запасных данных бэкенда не сохраняются.
+    """
+    state = _states.get()
+    version = get_db().content_version()
+    if state.facets is None or state.facets[0] != version:
+        with state.lock:
+            if state.facets is None or state.facets[0] != version:
+                fallbacks = fallback_count()
+                facets = EducationFacets(get_db())
+                state.stats["builds"] += 1
+                if fallback_count() != fallbacks:
+                    return facets
+                state.facets = (version, facets)
+    return state.facets[1]
+
+
+def _on_content_change(kind: str, old: Optional[Record], new: Optional[Record]) -> None:
+    """Правка материала: перестроить его старую и новую категории."""
+    if kind != "education":
+        return
     db = get_db()
-    materials = db.get_all_education()
-    if not materials:
+    state = _states.get()
+    with state.lock:
+        # Фасеты ещё не построены (или устарели) — при сборке прочитают уже изменённые данные
+        if state.facets is None or state.facets[0] != db.content_version():
+            return
+        categories = {education_category(r) for r in (old, new) if r is not None}
+        state.facets[1].update(db, sorted(categories))
+        state.stats["updates"] += 1
+
+
+def _facets_stats() -> Dict[str, int]:
+    state = _states.get()
+    facets = state.facets[1].stats() if state.facets is not None else {}
+    return {**state.stats, **facets}
+
+
+content.on_change(_on_content_change)
+metrics.register("education_facets", _facets_stats)
+register_warmup("education_facets", get_facets)
+
+
+@needs_warmup
+async def show_education_list(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Показать категории материалов образования."""
+    facets = get_facets()
+    if not facets.categories:
         await update.message.reply_text("Пока нет доступных материалов.")
         return
-    await update.message.reply_text(
-        "Выберите материал:",
-        reply_markup=inline_list_keyboard(
-            materials,
-            "edu",
-            id_key="id",
-            title_key="title",
-        ),
-    )
+    await update.message.reply_text("Выберите категорию:", reply_markup=facets.root)
 
 
+@needs_warmup
+async def education_category_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Callback: список категорий (edc:) или страница категории (edc:<категория>:<страница>)."""
+    query = update.callback_query
+    await query.answer()
+    rest = (query.data or "").partition(":")[2]
+    if rest == "-":
+        return  # кнопка с номером страницы
+    facets = get_facets()
+    token, _, page = rest.partition(":")
+    found = facets.page(token, int(page) if page.isdigit() else 0) if token else None
+    if found is None:
+        text = "Выберите категорию:" if not token else "Категория больше не существует. Выберите категорию:"
+        await query.edit_message_text(text, reply_markup=facets.root)
+        return
+    text, markup = found
+    await query.edit_message_text(text, reply_markup=markup)
+
+
+@needs_warmup
 async def education_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Callback: выбор материала из списка."""
     await update.callback_query.answer()
@@ -56,12 +233,20 @@ async def education_callback(update: Update, context: ContextTypes.DEFAULT_TYPE)
     if not m:
         await update.callback_query.edit_message_text("Материал не найден.")
         return
+    back = InlineKeyboardButton(
+        "◀️ Назад", callback_data=f"edc:{category_token(education_category(m))}:0"
+    )
     await update.callback_query.edit_message_text(
         _format_education(m),
         parse_mode="HTML",
+        reply_markup=InlineKeyboardMarkup([[back]]),
     )
 
 
-education_handlers = [
-    CallbackQueryHandler(education_callback, pattern="^(edu:|back:)"),
-]
+# Inline-кнопки: префикс callback_data -> обработчик, см. handlers/routing.py
+education_callbacks = {
+    "edu": education_callback,
+    "edc": education_category_callback,
+    "back": education_callback,
+}
+education_handlers = []
@@ -2,19 +2,22 @@
 """Раздел «Упражнения»: поиск по названию и вывод карточки."""
 
 from telegram import Update
-from telegram.ext import ContextTypes, MessageHandler, CallbackQueryHandler, filters
+from telegram.ext import ContextTypes
 
 from database import get_db
 from handlers.keyboards import inline_list_keyboard
+from services.startup import needs_warmup
+from services.tracing import traced
 
 
+@traced("render.exercise")
 def _format_exercise(ex: dict) -> str:
     """Форматирование карточки упражнения."""
     name = ex.get("name", "Без названия")
     desc = ex.get("description", "")
     link = ex.get("link", "")
     keywords = ex.get("keywords")
-    if isinstance(keywords, list):
+    if isinstance(keywords, (list, tuple)):
         kw = ", ".join(keywords) if keywords else ""
     else:
         kw = str(keywords or "")
@@ -36,6 +39,7 @@ async def show_exercises_search_prompt(update: Update, context: ContextTypes.DEF
     )
 
 
+@needs_warmup
 async def exercise_search_message(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """
     Обработка текстового сообщения: поиск упражнений.
@@ -69,6 +73,7 @@ async def exercise_search_message(update: Update, context: ContextTypes.DEFAULT_
     )
 
 
+@needs_warmup
 async def exercise_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Callback: выбор упражнения из списка."""
     await update.callback_query.answer()
@@ -95,6 +100,6 @@ async def exercise_callback(update: Update, context: ContextTypes.DEFAULT_TYPE)
 # Проще: после нажатия «Упражнения» пользователь вводит текст — мы обрабатываем его в exercise_search_message. Для этого нужно запоминать состояние: «ждём запрос упражнения». Либо без состояния: любой текст (кроме кнопок) считаем запросом и ищем в упражнениях + терминах + комплексах в search. Один универсальный поиск.
 # По ТЗ: «Искать упражнения по названию» в разделе Упражнения, и отдельно «Поиск» 🔍. Значит: в Упражнения — только поиск по упражнениям; в Поиск — по всей базе. Тогда нужен state: после нажатия Упражнения ставим state=EXERCISE_SEARCH, следующий message идёт в exercise_search_message. Без ConversationHandler можно через context.user_data["expect"] = "exercise".
 # Делаю через user_data: при нажатии «Упражнения» ставим expect = "exercise", в message handler проверяем: если expect == "exercise" и это не кнопка меню — ищем упражнения и сбрасываем expect.
-exercises_handlers = [
-    CallbackQueryHandler(exercise_callback, pattern="^ex:"),
-]
+# Inline-кнопки: префикс callback_data -> обработчик, см. handlers/routing.py
+exercises_callbacks = {"ex": exercise_callback}
+exercises_handlers = []
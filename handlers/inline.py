@@ -0,0 +1,212 @@
+# -*- coding: utf-8 -*-
+"""
+Inline-режим: «@бот запрос» в любом чате — карточки упражнений, терминов и комплексов.
+Префиксный индекс и готовые InlineQueryResultArticle строятся один раз на версию контента,
+ответы на повторяющиеся запросы (каждое нажатие клавиши) берутся из кэша.
+Правка записи из бота (database/content.py) заменяет в индексе только её карточку
+и удаляет из кэша ответы на запросы, которые находят старую или новую версию записи.
+"""
+
+import hashlib
+import sys
+import threading
+from typing import Any, Dict, Hashable, List, Optional, Tuple
+
+from telegram import InlineQueryResultArticle, InputTextMessageContent, Update
+from telegram.ext import ContextTypes, InlineQueryHandler
+
+from config import (
+    INLINE_CACHE_TIME,
+    INLINE_RESULTS_LIMIT,
+    QUERY_CACHE_MAX_BYTES,
+    QUERY_CACHE_MAX_ENTRIES,
+    QUERY_CACHE_TTL_SECONDS,
+)
+from database import get_db
+from database import content
+from database.base import fallback_count
+from database.cache import QueryCache, estimate_size, normalize_query
+from database.records import KINDS, Record
+from database.search_index import PrefixIndex, keywords_text, tokenize
+from database.search_rules import sort_key
+from handlers.complexes import _format_complex
+from handlers.exercises import _format_exercise
+from handlers.terminology import _format_term
+from services import metrics, tenants, warm_restart
+from services.startup import needs_warmup, register_warmup
+from services.tenants import Tenant, TenantLocal
+from services.tracing import traced
+
+
+class _InlineState:
+    """Индекс и кэш ответов одного арендатора."""
+
+    def __init__(self) -> None:
+        # (версия контента, индекс) — пересобирается при изменении данных
+        self.index: Optional[Tuple[str, PrefixIndex]] = None
+        # Сборка под блокировкой: фоновый прогрев и первый inline-запрос не строят индекс дважды
+        self.lock = threading.Lock()
+        # id карточки -> её размер для лимита кэша (сериализация дорогая, а карточки общие у ответов)
+        self.sizes: Dict[str, int] = {}
+        # Кэш готовых ответов: ключ — (нормализованный запрос, версия контента)
+        self.cache = QueryCache(
+            max_entries=QUERY_CACHE_MAX_ENTRIES,
+            max_bytes=QUERY_CACHE_MAX_BYTES,
+            ttl=QUERY_CACHE_TTL_SECONDS,
+        )
+
+
+def _cache_bytes(tenant: Tenant) -> int:
+    state = _states.peek(tenant)
+    return state.cache.stats()["bytes"] if state is not None else 0
+
+
+_states: TenantLocal[_InlineState] = TenantLocal(lambda tenant: _InlineState())
+metrics.register("inline_cache", lambda: _states.get().cache.stats())
+tenants.register_cache_size("inline_cache", _cache_bytes)
+warm_restart.register_cache("inline_cache", lambda: _states.get().cache)
+
+
+def _short(text: str, limit: int = 100) -> str:
+    text = " ".join((text or "").split())
+    return text if len(text) <= limit else text[: limit - 1] + "…"
+
+
+def _article(result_id: str, title: str, description: str, card: str) -> InlineQueryResultArticle:
+    return InlineQueryResultArticle(
+        id=result_id[:64],
+        title=title,
+        description=_short(description),
+        input_message_content=InputTextMessageContent(card, parse_mode="HTML"),
+    )
+
+
+def _entry(kind: str, r: Record) -> Optional[Tuple[Hashable, Any, str, str, InlineQueryResultArticle]]:
+    """Документ индекса: (ключ, ранг, название, доп. текст, карточка); ранг — упражнения, термины, комплексы."""
+    if kind == "exercises":
+        name = r.get("name") or ""
+        article = _article(f"ex:{r.get('id')}", f"📚 {name}", r.get("description", ""), _format_exercise(r))
+        return (kind, str(r.get("id"))), (0, *sort_key(r)), name, keywords_text(r.get("keywords")), article
+    if kind == "terminology":
+        term = r.get("term") or ""
+        if not term:
+            return None
+        # id результата — от самого термина: не меняется при добавлении и удалении других
+        digest = hashlib.blake2b(term.encode("utf-8"), digest_size=8).hexdigest()
+        article = _article(f"term:{digest}", f"📖 {term}", r.get("definition", ""), _format_term(r))
+        return (kind, term), (1, term, ""), term, "", article
+    if kind == "complexes":
+        name = r.get("name") or ""
+        article = _article(f"complex:{r.get('id')}", f"🏃 {name}", r.get("description", ""), _format_complex(r))
+        return (kind, str(r.get("id"))), (2, *sort_key(r)), name, "", article
+    return None
+
+
+def _build_index(db) -> PrefixIndex:
+    """Индекс по названиям и ключевым словам; порядок: упражнения, термины, комплексы."""
+    entries = []
+    for kind, records in (
+        ("exercises", db.get_all_exercises()),
+        ("terminology", db.get_all_terminology()),
+        ("complexes", db.get_all_complexes()),
+    ):
+        for r in records:
+            entry = _entry(kind, r)
+            if entry is not None:
+                entries.append(entry)
+    return PrefixIndex(entries)
+
+
+def get_inline_index(version: str) -> PrefixIndex:
+    """
+    Индекс для текущей версии контента (при смене версии — пересборка и сброс кэша).
+    Индекс из запасных данных бэкенда не сохраняется: следующий запрос соберёт его заново.
+    """
+    state = _states.get()
+    if state.index is None or state.index[0] != version:
+        with state.lock:
+            if state.index is None or state.index[0] != version:
+                fallbacks = fallback_count()
+                with tenants.measure_load("inline_index"):
+                    index = _build_index(get_db())
+                if fallback_count() != fallbacks:
+                    return index
+                stale = state.index is not None
+                state.index = (version, index)
+                # Первая сборка не трогает кэш: в нём могут быть ответы, восстановленные при запуске
+                if stale:
+                    state.cache.clear()
+                    state.sizes.clear()
+    return state.index[1]
+
+
+def _finds(q: str, words: Tuple[str, ...]) -> bool:
+    """Найдёт ли индекс по запросу q документ со словами words (пустой запрос — все документы)."""
+    return all(any(w.startswith(p) for w in words) for p in tokenize(q))
+
+
+def _on_content_change(kind: str, old: Optional[Record], new: Optional[Record]) -> None:
+    """Правка записи: заменить её документ в индексе и сбросить ответы, где она была или появится."""
+    record = new if new is not None else old
+    if kind not in ("exercises", "terminology", "complexes") or record is None:
+        return
+    key = (kind, str(record.get(KINDS[kind].key)))
+    state = _states.get()
+    with state.lock:
+        # Индекс ещё не построен (или устарел) — при сборке он прочитает уже изменённые данные
+        if state.index is None or state.index[0] != get_db().content_version():
+            return
+        index = state.index[1]
+        old_words = index.words(key)
+        entry = _entry(kind, new) if new is not None else None
+        if entry is None:
+            index.remove(key)
+        else:
+            index.add(*entry)
+        new_words = index.words(key)
+        state.sizes.clear()
+    state.cache.invalidate(lambda k: _finds(k[0], old_words) or _finds(k[0], new_words))
+
+
+content.on_change(_on_content_change)
+
+# Индекс строится при старте в фоне, чтобы первый inline-запрос не ждал его сборки
+register_warmup("inline_index", lambda: get_inline_index(get_db().content_version()))
+
+
+def _results_size(state: _InlineState, results: List[InlineQueryResultArticle]) -> int:
+    """Размер ответа для лимита кэша: карточки — по сериализованному виду, один раз на карточку."""
+    size = sys.getsizeof(results)
+    for article in results:
+        article_size = state.sizes.get(article.id)
+        if article_size is None:
+            article_size = state.sizes[article.id] = estimate_size(article)
+        size += article_size
+    return size
+
+
+@traced("search.inline")
+def inline_search(query: str) -> List[InlineQueryResultArticle]:
+    """Готовые результаты для inline-запроса (из кэша — не дожидаясь сборки индекса)."""
+    version = get_db().content_version()
+    q = normalize_query(query)
+    state = _states.get()
+    results = state.cache.get((q, version))
+    if results is None:
+        fallbacks = fallback_count()
+        results = get_inline_index(version).search(q, INLINE_RESULTS_LIMIT)
+        if fallback_count() == fallbacks:
+            state.cache.put((q, version), results, _results_size(state, results))
+    return results
+
+
+@needs_warmup
+async def inline_query_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Ответ на inline-запрос «@бот ...»."""
+    results = inline_search(update.inline_query.query or "")
+    await update.inline_query.answer(results, cache_time=INLINE_CACHE_TIME)
+
+
+inline_handlers = [
+    InlineQueryHandler(inline_query_handler),
+]
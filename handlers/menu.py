@@ -1,11 +1,17 @@
 # -*- coding: utf-8 -*-
 """Обработка /start, команд и главного меню."""
 
-from telegram import Update
-from telegram.ext import ContextTypes, CommandHandler, MessageHandler, filters
+import asyncio
+import re
 
-from config import ADMIN_IDS, WELCOME_MESSAGE
-from database.users_store import add_user, get_all_users
+from telegram import InputFile, Update
+from telegram.ext import ContextTypes, CommandHandler
+
+from config import WELCOME_MESSAGE
+from database.users_store import add_user, iter_users
+from handlers.complexes import show_complexes_list
+from handlers.education import show_education_list
+from handlers.exercises import show_exercises_search_prompt
 from handlers.keyboards import (
     BTN_BACK,
     BTN_COMPLEXES,
@@ -16,6 +22,28 @@ from handlers.keyboards import (
     BTN_TERMINOLOGY,
     main_menu_keyboard,
 )
+from handlers.pace_calculator import show_pace_prompt
+from handlers.search import show_search_prompt
+from handlers.terminology import show_terminology_list
+from services import tenants
+from services.export import export_users_csv_gz
+from services.outbound import BACKGROUND
+from services.startup import needs_warmup
+from services.tracing import traced
+
+
+@traced("notify_admins")
+async def _notify_admins(context: ContextTypes.DEFAULT_TYPE, text: str) -> None:
+    """Фоновая рассылка админам (низкий приоритет в очереди исходящих)."""
+    for admin_id in tenants.current().admin_ids:
+        try:
+            await context.bot.send_message(
+                chat_id=admin_id,
+                text=text,
+                rate_limit_args={"priority": BACKGROUND},
+            )
+        except Exception:
+            pass
 
 
 async def cmd_start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
@@ -23,14 +51,17 @@ async def cmd_start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     user = update.effective_user
     is_new = False
     if user:
-        is_new = add_user(
+        # users.db в рабочем потоке: пока фоновый прогрев открывает её (режим fast), ждёт поток,
+        # а не цикл событий, и приветствие не ждёт загрузки контента
+        is_new = await asyncio.to_thread(
+            add_user,
             user_id=user.id,
             username=user.username or "",
             first_name=user.first_name or "",
             last_name=user.last_name or "",
         )
-    # Уведомление админам о новом пользователе
-    if is_new and user and ADMIN_IDS:
+    # Уведомление админам о новом пользователе — в фоне, чтобы не задерживать ответ
+    if is_new and user and tenants.current().admin_ids:
         name = (user.first_name or "") + (" " + (user.last_name or "")).strip() or "—"
         username_part = f" @{user.username}" if user.username else ""
         text = (
@@ -39,11 +70,7 @@ async def cmd_start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
             f"• Username: {username_part or '—'}\n"
             f"• ID: {user.id}"
         )
-        for admin_id in ADMIN_IDS:
-            try:
-                await context.bot.send_message(chat_id=admin_id, text=text)
-            except Exception:
-                pass
+        context.application.create_task(_notify_admins(context, text))
     await update.message.reply_text(
         WELCOME_MESSAGE.strip(),
         reply_markup=main_menu_keyboard(),
@@ -69,68 +96,72 @@ async def cmd_subscription(update: Update, context: ContextTypes.DEFAULT_TYPE) -
 
 async def cmd_exercise(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Команда /exercise — поиск упражнений."""
-    from handlers.exercises import show_exercises_search_prompt
     await show_exercises_search_prompt(update, context)
 
 
 async def cmd_education(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Команда /education — раздел обучение."""
-    from handlers.education import show_education_list
     await show_education_list(update, context)
 
 
 async def cmd_complex(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Команда /complex — комплексы."""
-    from handlers.complexes import show_complexes_list
     await show_complexes_list(update, context)
 
 
 async def cmd_terms(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Команда /terms — терминология."""
-    from handlers.terminology import show_terminology_list
     await show_terminology_list(update, context)
 
 
 async def cmd_search_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Команда /search — поиск."""
-    from handlers.search import show_search_prompt
     await show_search_prompt(update, context)
 
 
 async def cmd_pace(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Команда /pace — калькулятор темпа."""
-    from handlers.pace_calculator import show_pace_prompt
     await show_pace_prompt(update, context)
 
 
+@needs_warmup
 async def cmd_users(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Команда /users — список подписчиков (только для ADMIN_IDS)."""
     user = update.effective_user
-    if not user or user.id not in ADMIN_IDS:
+    if not user or user.id not in tenants.current().admin_ids:
         await update.message.reply_text("Нет доступа к этой команде.")
         return
-    users = get_all_users()
-    if not users:
-        await update.message.reply_text("Пока ни один пользователь не нажал /start.")
-        return
-    lines = [f"👥 Всего: {len(users)} чел.\n"]
-    for i, u in enumerate(users, 1):
-        name = (u.get("first_name") or "") + (" " + (u.get("last_name") or "")).strip()
-        username = u.get("username") or ""
-        uid = u.get("user_id", "")
-        line = f"{i}. {name or '—'}"
-        if username:
-            line += f" @{username}"
-        line += f" (id: {uid})"
-        lines.append(line)
-    text = "\n".join(lines)
-    if len(text) > 4000:
-        from io import BytesIO
-        bio = BytesIO(text.encode("utf-8"))
-        bio.name = "users.txt"
-        await update.message.reply_document(document=bio, caption=f"👥 Подписчики: {len(users)} чел.")
-    else:
-        await update.message.reply_text(text)
+    # Фильтры: /users [с YYYY-MM-DD [по YYYY-MM-DD]] [@префикс_username]
+    dates = [a for a in context.args or [] if re.fullmatch(r"\d{4}-\d{2}-\d{2}", a)]
+    prefix = next((a for a in context.args or [] if a.startswith("@")), None)
+    # Генератор читается в рабочем потоке: выгрузка не держит цикл событий
+    users = iter_users(
+        date_from=dates[0] if dates else None,
+        date_to=dates[1] if len(dates) > 1 else None,
+        username_prefix=prefix,
+    )
+    out, count, preview, complete = await asyncio.to_thread(export_users_csv_gz, users)
+    try:
+        if not count:
+            await update.message.reply_text(
+                "По заданным фильтрам пользователей нет." if dates or prefix
+                else "Пока ни один пользователь не нажал /start."
+            )
+            return
+        text = f"👥 Всего: {count} чел.\n\n" + "\n".join(preview)
+        if complete:
+            await update.message.reply_text(text)
+            return
+        await update.message.reply_text(text + f"\n… и ещё {count - len(preview)} — полный список в файле.")
+        # Файл уходит потоком (httpx читает его кусками), а не байтами в памяти: на диск его
+        # переносит rollover(), имя задаётся явно — у файла в памяти name None
+        await asyncio.to_thread(out.rollover)
+        await update.message.reply_document(
+            document=InputFile(out, filename="users.csv.gz", read_file_handle=False),
+            caption=f"👥 Подписчики: {count} чел. (CSV, gzip)",
+        )
+    finally:
+        out.close()
 
 
 async def cmd_help(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
@@ -142,7 +173,8 @@ async def cmd_help(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
         "• <b>Комплексы</b> — комплексы тренировок\n"
         "• <b>Терминология</b> — поиск терминов\n"
         "• <b>Поиск</b> — поиск по всей базе\n"
-        "• <b>Калькулятор темпа</b> — темп, дистанция, время, скорость\n\n"
+        "• <b>Калькулятор темпа</b> — темп, дистанция, время, скорость\n"
+        "• В любом чате наберите <b>@имя_бота запрос</b> — карточки из базы\n\n"
         "Команды: /start /menu /pace /exercise /subscription /help",
         parse_mode="HTML",
         reply_markup=main_menu_keyboard(),
@@ -157,40 +189,6 @@ async def back_to_menu(update: Update, context: ContextTypes.DEFAULT_TYPE) -> No
     )
 
 
-# Обработка нажатий кнопок главного меню
-async def menu_button_router(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
-    """Роутер: при нажатии кнопки меню вызываем нужный обработчик."""
-    text = (update.message.text or "").strip()
-    if text == BTN_BACK:
-        await back_to_menu(update, context)
-        return
-    if text == BTN_EXERCISES:
-        from handlers.exercises import show_exercises_search_prompt
-        await show_exercises_search_prompt(update, context)
-        return
-    if text == BTN_EDUCATION:
-        from handlers.education import show_education_list
-        await show_education_list(update, context)
-        return
-    if text == BTN_COMPLEXES:
-        from handlers.complexes import show_complexes_list
-        await show_complexes_list(update, context)
-        return
-    if text == BTN_TERMINOLOGY:
-        from handlers.terminology import show_terminology_list
-        await show_terminology_list(update, context)
-        return
-    if text == BTN_SEARCH:
-        from handlers.search import show_search_prompt
-        await show_search_prompt(update, context)
-        return
-    if text == BTN_PACE:
-        from handlers.pace_calculator import show_pace_prompt
-        await show_pace_prompt(update, context)
-        return
-
-
-_MENU_PATTERN = f"^({BTN_EXERCISES}|{BTN_EDUCATION}|{BTN_COMPLEXES}|{BTN_TERMINOLOGY}|{BTN_SEARCH}|{BTN_PACE}|{BTN_BACK})$"
 
 # Список обработчиков для регистрации
 menu_handlers = [
@@ -205,8 +203,15 @@ menu_handlers = [
     CommandHandler("search", cmd_search_cmd),
     CommandHandler("pace", cmd_pace),
     CommandHandler("help", cmd_help),
-    MessageHandler(
-        filters.TEXT & ~filters.COMMAND & filters.Regex(_MENU_PATTERN),
-        menu_button_router,
-    ),
 ]
+
+# Кнопки главного меню (Reply-клавиатура): текст кнопки -> обработчик, см. handlers/routing.py
+menu_buttons = {
+    BTN_EXERCISES: show_exercises_search_prompt,
+    BTN_EDUCATION: show_education_list,
+    BTN_COMPLEXES: show_complexes_list,
+    BTN_TERMINOLOGY: show_terminology_list,
+    BTN_SEARCH: show_search_prompt,
+    BTN_PACE: show_pace_prompt,
+    BTN_BACK: back_to_menu,
+}
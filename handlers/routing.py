@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+"""
+Маршрутизация кнопок меню и inline-кнопок: таблицы собираются один раз при регистрации.
+Текст сообщения ищется в словаре кнопок (точное совпадение), callback_data — по префиксу
+до первого «:» (ex:…, edu:…, complex:…, back:…); всё остальное — обычный текстовый ввод.
+Вместо регулярных выражений на каждый апдейт — один поиск в dict.
+Счётчики попаданий по маршрутам (Router.stats) показываются в /metrics (группа routes).
+"""
+
+from collections import Counter
+from typing import Any, Callable, Coroutine, Dict, List, Optional
+
+from telegram import Update
+from telegram.ext import BaseHandler, CallbackQueryHandler, ContextTypes, MessageHandler, filters
+
+from services.tracing import traced
+
+Callback = Callable[[Update, ContextTypes.DEFAULT_TYPE], Coroutine[Any, Any, None]]
+
+
+class Router:
+    """Таблицы «текст кнопки → обработчик» и «префикс callback_data → обработчик»."""
+
+    def __init__(self, text_fallback: Optional[Callback] = None) -> None:
+        self._buttons: Dict[str, Callback] = {}
+        self._callbacks: Dict[str, Callback] = {}
+        self._text_fallback = self._wrap(text_fallback) if text_fallback is not None else None
+        self.hits: Counter = Counter()
+
+    @staticmethod
+    def _wrap(callback: Callback) -> Callback:
+        # Спан трассировки с именем самого обработчика, а не маршрутизатора
+        return traced(f"handler.{callback.__name__}")(callback)
+
+    def add_buttons(self, routes: Dict[str, Callback]) -> None:
+        for text, callback in routes.items():
+            if text in self._buttons:
+                raise ValueError(f"Кнопка {text!r} уже привязана к {self._buttons[text].__name__}")
+            self._buttons[text] = self._wrap(callback)
+
+    def add_callbacks(self, routes: Dict[str, Callback]) -> None:
+        for prefix, callback in routes.items():
+            if prefix in self._callbacks:
+                raise ValueError(f"Префикс {prefix!r} уже привязан к {self._callbacks[prefix].__name__}")
+            self._callbacks[prefix] = self._wrap(callback)
+
+    async def route_text(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+        text = (update.effective_message.text or "").strip()
+        callback = self._buttons.get(text)
+        if callback is not None:
+            self.hits[f"button:{text}"] += 1
+            await callback(update, context)
+        elif self._text_fallback is not None:
+            self.hits["text"] += 1
+            await self._text_fallback(update, context)
+
+    async def route_callback(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+        prefix = (update.callback_query.data or "").partition(":")[0]
+        callback = self._callbacks.get(prefix)
+        if callback is None:
+            self.hits["callback:unknown"] += 1
+            return
+        self.hits[f"callback:{prefix}"] += 1
+        await callback(update, context)
+
+    def handlers(self) -> List[BaseHandler]:
+        """Два хендлера PTB вместо отдельного на каждый шаблон."""
+        return [
+            MessageHandler(filters.TEXT & ~filters.COMMAND, self.route_text),
+            CallbackQueryHandler(self.route_callback),
+        ]
+
+    def stats(self) -> Dict[str, Any]:
+        return dict(self.hits.most_common())
@@ -4,26 +4,49 @@
 Обрабатывает ввод после «Упражнения», «Терминология» и кнопки «Поиск».
 """
 
+import time
+from typing import Optional
+
 from telegram import Update
-from telegram.ext import ContextTypes, MessageHandler, filters
+from telegram.ext import ContextTypes
 
+from config import WARM_TOP_DAYS, WARM_TOP_QUERIES
 from database import get_db
-from handlers.keyboards import (
-    BTN_BACK,
-    BTN_COMPLEXES,
-    BTN_EDUCATION,
-    BTN_EXERCISES,
-    BTN_PACE,
-    BTN_SEARCH,
-    BTN_TERMINOLOGY,
-    main_menu_keyboard,
-)
 from handlers.exercises import _format_exercise
+from handlers.keyboards import inline_list_keyboard, main_menu_keyboard
+from handlers.pace_calculator import handle_pace_message
 from handlers.terminology import _format_term
+from services import search_stats, warm_restart
+from services.startup import register_warmup, wait_warm
+from services.tracing import traced
+
 
+@traced("search.universal")
+def _universal_search(db, q: str) -> Optional[str]:
+    """Поиск по упражнениям, терминам и комплексам. Возвращает HTML-ответ или None."""
+    exercises = db.search_exercises(q)
+    term = db.search_terminology(q)
+    # Комплексы по имени не ищем в JSON (можно добавить)
+    complexes = [c for c in db.get_all_complexes() if q in (c.get("name") or "").lower()]
+    parts = []
+    if exercises:
+        parts.append(f"<b>📚 Упражнения ({len(exercises)})</b>")
+        for ex in exercises[:3]:
+            parts.append(_format_exercise(ex))
+        if len(exercises) > 3:
+            parts.append(f"... и ещё {len(exercises) - 3}")
+    if term:
+        parts.append(_format_term(term))
+    if complexes:
+        parts.append(f"<b>🏃 Комплексы</b>: {', '.join(c.get('name','') for c in complexes[:5])}")
+    if not parts:
+        return None
+    return "\n\n".join(parts)
 
-def _is_menu_button(text: str) -> bool:
-    return text in (BTN_EXERCISES, BTN_EDUCATION, BTN_COMPLEXES, BTN_TERMINOLOGY, BTN_SEARCH, BTN_PACE, BTN_BACK)
+
+def universal_reply(db, text: str) -> Optional[str]:
+    """Ответ универсального поиска (готовый HTML кэшируется по нормализованному запросу)."""
+    return db.cached("universal", text, lambda q: _universal_search(db, q))
 
 
 async def show_search_prompt(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
@@ -36,31 +59,31 @@ async def show_search_prompt(update: Update, context: ContextTypes.DEFAULT_TYPE)
 
 async def text_message_router(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """
-    Роутер текстовых сообщений:
-    - Если нажата кнопка меню — уже обработано в menu.py
+    Роутер текстового ввода (кнопки меню сюда не попадают — их разбирает handlers/routing.py):
     - Если expect == "exercise" — ищем только упражнения
     - Если expect == "terminology" — ищем только термины
     - Если expect == "search" или нет expect — универсальный поиск
     """
     text = (update.message.text or "").strip()
-    if _is_menu_button(text):
-        return  # обработает menu
     user_data = context.user_data
     expect = user_data.get("expect")
 
     if expect == "pace":
-        from handlers.pace_calculator import handle_pace_message
         user_data.pop("expect", None)
         reply = handle_pace_message(update, context)
         if reply:
             await update.message.reply_text(reply, parse_mode="HTML")
         return
 
+    # Поиск читает контент: в режиме fast — после фонового прогрева, не блокируя цикл событий
+    await wait_warm()
     db = get_db()
 
     if expect == "exercise":
         user_data.pop("expect", None)
+        started = time.perf_counter()
         results = db.search_exercises(text)
+        search_stats.record("exercise", text, len(results), time.perf_counter() - started)
         if not results:
             await update.message.reply_text(
                 "😕 Упражнение не найдено. Попробуйте другие слова или раздел 🔍 Поиск."
@@ -69,7 +92,6 @@ async def text_message_router(update: Update, context: ContextTypes.DEFAULT_TYPE
         if len(results) == 1:
             await update.message.reply_text(_format_exercise(results[0]), parse_mode="HTML")
             return
-        from handlers.keyboards import inline_list_keyboard
         await update.message.reply_text(
             f"Найдено упражнений: {len(results)}. Выберите:",
             reply_markup=inline_list_keyboard(results, "ex", id_key="id", title_key="name"),
@@ -78,7 +100,9 @@ async def text_message_router(update: Update, context: ContextTypes.DEFAULT_TYPE
 
     if expect == "terminology":
         user_data.pop("expect", None)
+        started = time.perf_counter()
         result = db.search_terminology(text)
+        search_stats.record("terminology", text, 1 if result else 0, time.perf_counter() - started)
         if not result:
             await update.message.reply_text(
                 "😕 Термин не найден. Попробуйте другое написание или раздел 🔍 Поиск."
@@ -90,33 +114,28 @@ async def text_message_router(update: Update, context: ContextTypes.DEFAULT_TYPE
     if expect == "search" or expect is None:
         if expect == "search":
             user_data.pop("expect", None)
-        # Универсальный поиск
+        # Универсальный поиск (готовый ответ кэшируется по нормализованному запросу)
         if not text:
             return
-        exercises = db.search_exercises(text)
-        term = db.search_terminology(text)
-        # Комплексы по имени не ищем в JSON (можно добавить)
-        complexes = [c for c in db.get_all_complexes() if text.lower() in (c.get("name") or "").lower()]
-        parts = []
-        if exercises:
-            parts.append(f"<b>📚 Упражнения ({len(exercises)})</b>")
-            for ex in exercises[:3]:
-                parts.append(_format_exercise(ex))
-            if len(exercises) > 3:
-                parts.append(f"... и ещё {len(exercises) - 3}")
-        if term:
-            parts.append(_format_term(term))
-        if complexes:
-            parts.append(f"<b>🏃 Комплексы</b>: {', '.join(c.get('name','') for c in complexes[:5])}")
-        if not parts:
+        started = time.perf_counter()
+        reply = universal_reply(db, text)
+        search_stats.record("universal", text, 1 if reply else 0, time.perf_counter() - started)
+        if not reply:
             await update.message.reply_text(
                 "😕 По запросу ничего не найдено. Проверьте написание или попробуйте другие слова."
             )
             return
-        await update.message.reply_text("\n\n".join(parts), parse_mode="HTML")
+        await update.message.reply_text(reply, parse_mode="HTML")
         return
 
 
-search_handlers = [
-    MessageHandler(filters.TEXT & ~filters.COMMAND, text_message_router),
-]
+# Тёплый перезапуск: частые запросы из статистики повторяются при прогреве (после индексов)
+warm_restart.register_replay("exercise", lambda q: get_db().search_exercises(q))
+warm_restart.register_replay("terminology", lambda q: get_db().search_terminology(q))
+warm_restart.register_replay("universal", lambda q: universal_reply(get_db(), q))
+register_warmup(
+    "top_queries", lambda: warm_restart.replay(search_stats.top_queries(WARM_TOP_DAYS, WARM_TOP_QUERIES))
+)
+
+# Текстовый ввод подключается в handlers/routing.py как обработчик по умолчанию
+search_handlers = []
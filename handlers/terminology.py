@@ -5,8 +5,11 @@ from telegram import Update
 from telegram.ext import ContextTypes
 
 from database import get_db
+from services.startup import needs_warmup
+from services.tracing import traced
 
 
+@traced("render.term")
 def _format_term(t: dict) -> str:
     """Форматирование термина для поиска."""
     term = t.get("term", "")
@@ -14,6 +17,7 @@ def _format_term(t: dict) -> str:
     return f"<b>📖 {term}</b>\n\n{definition}"
 
 
+@traced("render.terminology_list")
 def _format_terminology_list(terms: list) -> str:
     """Формат: ТЕРМИНОЛОГИЯ: 📌 термин - определение."""
     lines = ["<b>ТЕРМИНОЛОГИЯ:</b>", ""]
@@ -25,6 +29,7 @@ def _format_terminology_list(terms: list) -> str:
     return "\n".join(lines)
 
 
+@needs_warmup
 async def show_terminology_list(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Показать все термины в формате: термин — определение."""
     db = get_db()
@@ -44,6 +49,7 @@ async def show_terminology_prompt(update: Update, context: ContextTypes.DEFAULT_
     )
 
 
+@needs_warmup
 async def terminology_search_message(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Обработка ввода термина (вызывается при expect == terminology)."""
     query = (update.message.text or "").strip()
@@ -2,26 +2,54 @@
 """
 Точка входа бота бегового клуба.
 Запуск: python main.py
-Используется long polling (не webhook).
+Используется long polling (не webhook). С RUNNING_BOT_TENANTS — несколько ботов
+(клубов) в одном процессе и одном цикле событий, см. services/tenants.py.
 """
 
+# Замер времени импорта — до всех остальных импортов (отчёт: команда /startup)
+from services import startup
+
+startup.install_import_timer()
+
+import asyncio
 import logging
+import signal
 import sys
+from pathlib import Path
+from typing import List
 
 from telegram import BotCommand
 from telegram.ext import Application
 
-from config import BOT_TOKEN, STORAGE_MODE
+from config import (
+    BOT_API_BASE_URL,
+    BOT_API_FILE_URL,
+    BOT_TOKEN,
+    STARTUP_MODE,
+    STATE_DB_PATH,
+    STATE_PERSISTENCE,
+    STORAGE_MODE,
+    TENANTS_FILE,
+)
+from database import get_db
+from database.state_store import CompactStatePersistence
 from handlers import register_handlers
+from services import search_stats, tenants, tracing, warm_restart
+from services.admission import AdmissionProcessor
+from services.logs import setup_logging
+from services.outbound import OutboundLimiter
+from services.tenants import Tenant
+from services.transport import make_request
 
-# Логирование в консоль
-logging.basicConfig(
-    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
-    level=logging.INFO,
-    stream=sys.stdout,
-)
+# Логирование в консоль через очередь: запись в stdout — в фоновом потоке
+setup_logging()
 logger = logging.getLogger(__name__)
 
+ALLOWED_UPDATES = ["message", "callback_query", "inline_query"]
+
+# Фоновая установка команд (режим fast): ссылки, чтобы задачи не собрал сборщик мусора
+_commands_tasks: List[asyncio.Task] = []
+
 
 async def post_init_set_commands(application: Application) -> None:
     """Устанавливает список команд, который виден слева при нажатии «/» в чате."""
@@ -39,22 +67,146 @@ async def post_init_set_commands(application: Application) -> None:
     ])
 
 
+async def _set_commands_in_background(application: Application) -> None:
+    try:
+        await post_init_set_commands(application)
+    except Exception:
+        logger.exception("Не удалось установить список команд")
+
+
+async def post_init(application: Application) -> None:
+    """
+    Действия после инициализации: команды меню, прогрев (по STARTUP_MODE)
+    и фоновые задачи. После post_init начинается long polling.
+    """
+    startup.mark("initialized")
+    scope = _scope(tenants.current())
+    # Кэши с прошлого запуска — до приёма апдейтов (если версия контента та же)
+    with startup.phase(f"warm_restore.{scope}" if scope else "warm_restore"):
+        await asyncio.to_thread(warm_restart.restore, application)
+    if STARTUP_MODE == "fast":
+        # Не ждать ответа Bot API и загрузки данных: апдейты принимаются сразу
+        _commands_tasks.append(asyncio.create_task(_set_commands_in_background(application)))
+        startup.warmup_thread(scope)
+    else:
+        await post_init_set_commands(application)
+        if STARTUP_MODE == "eager":
+            await asyncio.to_thread(startup.warm_up, scope)
+    if isinstance(application.persistence, CompactStatePersistence):
+        application.persistence.start_eviction(application)
+    search_stats.start()
+    startup.mark("ready")
+    if STARTUP_MODE != "fast":
+        logger.info("Запуск: %s", startup.summary())
+
+
+async def _flush_tenant(application: Application) -> None:
+    """Сбросить на диск буферы текущего арендатора и горячие кэши для тёплого перезапуска."""
+    await search_stats.stop()
+    await asyncio.to_thread(warm_restart.save, application)
+    # Журнал правок контента (режим json) — в основные файлы
+    await asyncio.to_thread(get_db().compact)
+
+
+async def post_shutdown(application: Application) -> None:
+    """Сбросить на диск то, что осталось в буферах."""
+    await _flush_tenant(application)
+    await asyncio.to_thread(tracing.shutdown)
+
+
+def _scope(tenant: Tenant) -> str:
+    """Имя арендатора в метриках и этапах запуска («» — единственный бот из config.py)."""
+    return "" if tenant is tenants.DEFAULT else tenant.name
+
+
+def build_application(tenant: Tenant) -> Application:
+    """Application арендатора: свой токен, пулы соединений и файл состояния диалогов."""
+    scope = _scope(tenant)
+    with startup.phase(f"build_application.{scope}" if scope else "build_application"):
+        builder = (
+            Application.builder()
+            .token(tenant.token)
+            .base_url(BOT_API_BASE_URL)
+            .base_file_url(BOT_API_FILE_URL)
+            # Раздельные пулы: долгий getUpdates не занимает соединения для ответов
+            .request(make_request("sends", scope))
+            .get_updates_request(make_request("updates", scope))
+            .application_class(tracing.TracedApplication)
+            .post_init(post_init)
+            .post_shutdown(post_shutdown)
+            .rate_limiter(OutboundLimiter(scope))
+            # Допуск апдейтов: защита от флуда до обработчиков, общий лимит одновременной обработки
+            .concurrent_updates(AdmissionProcessor(scope))
+        )
+        if STATE_PERSISTENCE:
+            builder = builder.persistence(CompactStatePersistence(tenant.path(STATE_DB_PATH)))
+        application = builder.build()
+    with startup.phase(f"register_handlers.{scope}" if scope else "register_handlers"):
+        register_handlers(application)
+    return application
+
+
+async def _run_tenant(tenant: Tenant, stop: asyncio.Event) -> None:
+    """
+    Жизненный цикл одного бота в общем цикле событий (как run_polling, но без своего
+    цикла и обработки сигналов). Задачи, созданные отсюда, наследуют арендатора.
+    """
+    tenants.activate(tenant)
+    tenant.data_dir.mkdir(parents=True, exist_ok=True)
+    application = build_application(tenant)
+    initialized = False
+    try:
+        await application.initialize()
+        initialized = True
+        await post_init(application)
+        await application.updater.start_polling(allowed_updates=ALLOWED_UPDATES)
+        await application.start()
+        logger.info("Арендатор %s: запуск long polling", tenant.name)
+        await stop.wait()
+    except Exception:
+        logger.exception("Арендатор %s остановлен из-за ошибки", tenant.name)
+    finally:
+        if application.updater.running:
+            await application.updater.stop()
+        if application.running:
+            await application.stop()
+        if initialized:
+            await application.shutdown()
+            # Трассировка общая — закрывается один раз в run_tenants
+            await _flush_tenant(application)
+
+
+async def run_tenants(items: List[Tenant]) -> None:
+    """Все арендаторы в одном цикле событий до SIGINT/SIGTERM."""
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop.set)
+        except NotImplementedError:  # Windows
+            pass
+    try:
+        await asyncio.gather(*(_run_tenant(t, stop) for t in items))
+    finally:
+        await asyncio.to_thread(tracing.shutdown)
+
+
 def main() -> None:
+    startup.mark("imported")
+    if TENANTS_FILE:
+        items = tenants.load_tenants(Path(TENANTS_FILE))
+        tenants.register(items)
+        logger.info("Режим хранения: %s. Арендаторы: %s", STORAGE_MODE, ", ".join(t.name for t in items))
+        asyncio.run(run_tenants(items))
+        return
+
     if not BOT_TOKEN or BOT_TOKEN == "YOUR_BOT_TOKEN_HERE":
         logger.error("Задайте BOT_TOKEN в config.py или переменной окружения RUNNING_BOT_TOKEN")
         sys.exit(1)
 
-    # Создание приложения (long polling по умолчанию)
-    application = (
-        Application.builder()
-        .token(BOT_TOKEN)
-        .post_init(post_init_set_commands)
-        .build()
-    )
-    register_handlers(application)
-
+    application = build_application(tenants.DEFAULT)
     logger.info("Режим хранения: %s. Запуск long polling...", STORAGE_MODE)
-    application.run_polling(allowed_updates=["message", "callback_query"])
+    application.run_polling(allowed_updates=ALLOWED_UPDATES)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,285 @@
+# -*- coding: utf-8 -*-
+"""
+Проверка и сравнение бэкендов хранилища (json, sqlite, memory) на одном наборе данных.
+Запуск из корня проекта:
+    python scripts/bench_backends.py --generate 100000
+    python scripts/bench_backends.py --data /tmp/club_data
+
+JSON-файлы (из --data или сгенерированные scripts/gen_dataset.py) заливаются во временную
+SQLite-базу (seed_sqlite_from_json), затем каждый бэкенд запускается в отдельном процессе
+и выполняет одинаковый набор вызовов всех методов BaseDB.
+Совместимость: ответы приводятся к общему виду и сравниваются; при расхождении
+печатаются отличия, код выхода 1.
+Производительность: время загрузки, прирост RSS, задержки p50/p95 и пик Python-аллокаций
+(tracemalloc) каждого метода — таблицей по бэкендам.
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from collections.abc import Mapping
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Tuple
+
+BASE = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BASE))
+sys.path.insert(0, str(BASE / "scripts"))
+# config требует токен при импорте; боту он здесь не нужен
+os.environ.setdefault("RUNNING_BOT_TOKEN", "bench")
+
+BACKENDS = ("json", "sqlite", "memory")
+QUERIES = (
+    "бег", "Разминка", "лёгкий бег", "ТЕМП", "офп", "зона пульс", "зо", "чсс кор",
+    "  бег   темп ", "бег!", "несуществующее", "!!!",
+)
+
+
+def _rss_mb() -> float:
+    """Текущий RSS процесса в МБ (Linux: /proc; иначе — пиковый RSS)."""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    import resource
+
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def make_backend(name: str, data_dir: Path, db_path: Path):
+    """Экземпляр бэкенда name поверх набора данных (без кэша запросов)."""
+    if name == "json":
+        from database.json_db import JsonDB
+
+        return JsonDB(data_dir)
+    if name == "sqlite":
+        from database.sqlite_db import RunningClubDB
+
+        return RunningClubDB(db_path)
+    if name == "memory":
+        from database.memory_db import MemoryDB
+
+        return MemoryDB(db_path)
+    raise ValueError(f"Неизвестный бэкенд: {name}")
+
+
+def method_calls(db) -> List[Tuple[str, str, Callable[[], Any]]]:
+    """Вызовы всех методов BaseDB: (имя метода, аргумент, вызов без аргументов)."""
+    from database.search_index import tokenize
+
+    exercises = db.get_all_exercises()
+    complexes = db.get_all_complexes()
+    education = db.get_all_education()
+    terms = db.get_all_terms()
+
+    # Несколько id с начала, середины и конца списка плюс отсутствующий
+    def sample_ids(items: List[Any]) -> List[str]:
+        picked = [items[i].get("id") for i in (0, len(items) // 2, -1)] if items else []
+        return [str(i) for i in picked] + ["missing-id"]
+
+    calls: List[Tuple[str, str, Callable[[], Any]]] = [
+        ("get_all_exercises", "", db.get_all_exercises),
+        ("get_all_complexes", "", db.get_all_complexes),
+        ("get_all_education", "", db.get_all_education),
+        ("get_all_terms", "", db.get_all_terms),
+        ("get_all_terminology", "", db.get_all_terminology),
+        ("get_education_categories", "", db.get_education_categories),
+    ]
+    for q in QUERIES:
+        calls.append(("search_exercises", q, lambda q=q: db.search_exercises(q)))
+        calls.append(("search_terminology", q, lambda q=q: db.search_terminology(q)))
+    for t in terms[:2] + terms[-1:]:
+        calls.append(("search_terminology", t, lambda t=t: db.search_terminology(t)))
+        calls.append(("search_terminology", t.upper(), lambda t=t: db.search_terminology(t.upper())))
+    # Фильтр комплексов: диапазоны длительности и слова из структуры первых комплексов
+    words = [w for c in complexes[:2] for w in tokenize(c.get("structure") or "")[1:3]]
+    for lo, hi in ((None, None), (None, 20), (20, 45), (45, None), (30, 30)):
+        for w in ["", *words[:2], " ".join(words[:2]), "нетакогослова"]:
+            calls.append((
+                "filter_complexes", f"{lo}..{hi} {w}".strip(),
+                lambda lo=lo, hi=hi, w=w: db.filter_complexes(lo, hi, w),
+            ))
+    for category in [c for c, _ in db.get_education_categories()] + ["нет такой категории"]:
+        calls.append(("get_education_by_category", category, lambda c=category: db.get_education_by_category(c)))
+    for i in sample_ids(exercises):
+        calls.append(("get_exercise_by_id", i, lambda i=i: db.get_exercise_by_id(i)))
+    for i in sample_ids(complexes):
+        calls.append(("get_complex_by_id", i, lambda i=i: db.get_complex_by_id(i)))
+    for i in sample_ids(education):
+        calls.append(("get_education_by_id", i, lambda i=i: db.get_education_by_id(i)))
+    return calls
+
+
+def canonical(value: Any) -> Any:
+    """
+    Ответ в общем виде для сравнения: записи — dict без пустых полей
+    (в SQLite отсутствующее поле — NULL), id — строкой (в SQLite это TEXT), кортежи — списками.
+    """
+    if isinstance(value, Mapping):
+        return {
+            k: str(v) if k == "id" else canonical(v)
+            for k, v in value.items()
+            if v not in (None, "", (), [])
+        }
+    if isinstance(value, (list, tuple)):
+        return [canonical(v) for v in value]
+    return value
+
+
+def _label(value: Any) -> str:
+    """Короткое описание ответа для отчёта о расхождении."""
+    def key(v: Any) -> str:
+        return str(v.get("id") or v.get("term")) if isinstance(v, dict) else str(v)
+
+    if isinstance(value, list):
+        head = ", ".join(key(v) for v in value[:3])
+        return f"{len(value)} шт. [{head}{', …' if len(value) > 3 else ''}]"
+    return "None" if value is None else key(value)
+
+
+def run_worker(name: str, data_dir: Path, db_path: Path, repeat: int) -> Dict[str, Any]:
+    """Ответы и замеры одного бэкенда (выполняется в отдельном процессе)."""
+    from services.metrics import LatencyWindow
+
+    rss_before = _rss_mb()
+    started = time.perf_counter()
+    db = make_backend(name, data_dir, db_path)
+    load_s = time.perf_counter() - started
+    rss_loaded = _rss_mb()
+    calls = method_calls(db)
+
+    answers = []
+    for method, arg, call in calls:
+        value = canonical(call())
+        text = json.dumps(value, ensure_ascii=False, sort_keys=True)
+        answers.append({
+            "method": method,
+            "arg": arg,
+            "digest": hashlib.sha1(text.encode("utf-8")).hexdigest(),
+            "label": _label(value),
+        })
+
+    windows: Dict[str, LatencyWindow] = {}
+    for _ in range(repeat):
+        for method, _arg, call in calls:
+            t = time.perf_counter()
+            call()
+            windows.setdefault(method, LatencyWindow(size=100000)).observe(time.perf_counter() - t)
+    rss_end = _rss_mb()
+
+    # Отдельный проход под tracemalloc: он замедляет вызовы и не должен влиять на задержки
+    alloc: Dict[str, int] = {}
+    tracemalloc.start()
+    for method, _arg, call in calls:
+        tracemalloc.reset_peak()
+        before = tracemalloc.get_traced_memory()[0]
+        result = call()
+        peak = tracemalloc.get_traced_memory()[1] - before
+        del result
+        alloc[method] = max(alloc.get(method, 0), peak)
+    tracemalloc.stop()
+
+    return {
+        "backend": name,
+        "load_s": load_s,
+        "rss_mb": rss_loaded - rss_before,
+        "rss_end_mb": rss_end - rss_before,
+        "answers": answers,
+        "methods": {
+            m: {**w.percentiles(), "alloc_kb": alloc.get(m, 0) / 1024} for m, w in windows.items()
+        },
+    }
+
+
+def run_isolated(name: str, data_dir: Path, db_path: Path, repeat: int) -> Dict[str, Any]:
+    """Запустить run_worker в новом процессе, чтобы память бэкендов не смешивалась."""
+    out = subprocess.run(
+        [sys.executable, __file__, "--worker", name, "--data", str(data_dir), "--db", str(db_path),
+         "--repeat", str(repeat)],
+        check=True, capture_output=True, text=True,
+    ).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def compare(results: List[Dict[str, Any]]) -> List[str]:
+    """Расхождения ответов с первым бэкендом (эталоном)."""
+    reference = results[0]
+    problems = []
+    for other in results[1:]:
+        if len(other["answers"]) != len(reference["answers"]):
+            problems.append(
+                f"{other['backend']}: {len(other['answers'])} вызовов, "
+                f"у {reference['backend']} — {len(reference['answers'])}"
+            )
+        for ref, ans in zip(reference["answers"], other["answers"]):
+            if (ref["method"], ref["arg"], ref["digest"]) != (ans["method"], ans["arg"], ans["digest"]):
+                problems.append(
+                    f"{ref['method']}({ref['arg']!r}): {reference['backend']} = {ref['label']}; "
+                    f"{other['backend']}({ans['arg']!r}) = {ans['label']}"
+                )
+    return problems
+
+
+def print_report(results: List[Dict[str, Any]]) -> None:
+    width = 30
+    print(f"{'':26}" + "".join(f"{r['backend']:>{width}}" for r in results))
+    print(f"{'загрузка, с':26}" + "".join(f"{r['load_s']:>{width}.2f}" for r in results))
+    print(f"{'RSS после загрузки, МБ':26}" + "".join(f"{r['rss_mb']:>{width}.0f}" for r in results))
+    print(f"{'RSS в конце, МБ':26}" + "".join(f"{r['rss_end_mb']:>{width}.0f}" for r in results))
+    print("метод: p50 / p95 мс, пик аллокаций КБ")
+    for method in results[0]["methods"]:
+        cells = []
+        for r in results:
+            p = r["methods"].get(method, {})
+            cells.append(f"{p.get('p50_ms', 0):.3f} / {p.get('p95_ms', 0):.3f}, {p.get('alloc_kb', 0):.0f}")
+        print(f"  {method:24}" + "".join(f"{c:>{width}}" for c in cells))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Совместимость и скорость бэкендов хранилища")
+    parser.add_argument("--data", type=Path, default=BASE / "data", help="папка с JSON-файлами")
+    parser.add_argument("--generate", type=int, default=0, help="сгенерировать набор из N упражнений")
+    parser.add_argument("--db", type=Path, default=None, help="файл SQLite (по умолчанию — временный)")
+    parser.add_argument("--backends", default=",".join(BACKENDS), help="через запятую: json,sqlite,memory")
+    parser.add_argument("--repeat", type=int, default=5, help="повторов каждого вызова")
+    parser.add_argument("--worker", default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        print(json.dumps(run_worker(args.worker, args.data, args.db, args.repeat), ensure_ascii=False))
+        return
+
+    from gen_dataset import generate
+    from seed_sqlite_from_json import seed
+
+    with tempfile.TemporaryDirectory() as tmp:
+        data_dir = args.data
+        if args.generate:
+            data_dir = Path(tmp) / "data"
+            others = max(10, args.generate // 50)
+            generate(data_dir, args.generate, others, others, others)
+        db_path = args.db or Path(tmp) / "bench.db"
+        started = time.perf_counter()
+        seed(data_dir, db_path)
+        print(f"SQLite-база подготовлена за {time.perf_counter() - started:.1f} с: {db_path}")
+        results = [run_isolated(name, data_dir, db_path, args.repeat) for name in args.backends.split(",")]
+    print_report(results)
+    problems = compare(results)
+    if problems:
+        print(f"\nРасхождения ответов ({len(problems)}):")
+        for line in problems:
+            print("  " + line)
+        sys.exit(1)
+    print(f"\nОтветы совпадают: {len(results[0]['answers'])} вызовов × {len(results)} бэкенда.")
+
+
+if __name__ == "__main__":
+    main()
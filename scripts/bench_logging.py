@@ -0,0 +1,125 @@
+# -*- coding: utf-8 -*-
+"""
+Задержка цикла событий при логировании: прямой StreamHandler против очереди
+(services/logs.py). Запуск из корня проекта:
+    python scripts/bench_logging.py
+    python scripts/bench_logging.py --rate 2000 --sink-delay-ms 0.5 --errors 0.05
+
+Приёмник логов намеренно медленный (--sink-delay-ms на каждую запись — как переполненный
+pipe или сетевой сборщик). Нагрузка: --rate «апдейтов» в секунду, на каждый — строка INFO
+от httpx и строка своего логгера, доля --errors — ещё и logger.exception().
+Параллельно тикер раз в 1 мс меряет опоздание цикла событий. Результат по каждому
+режиму: опоздание p50/p95/p99/max, обработано апдейтов, записей дошло до приёмника.
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict
+
+BASE = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BASE))
+# config требует токен при импорте; боту он здесь не нужен
+os.environ.setdefault("RUNNING_BOT_TOKEN", "bench")
+
+
+class SlowStream:
+    """Приёмник, которому на каждую запись нужно delay секунд."""
+
+    def __init__(self, delay: float) -> None:
+        self.delay = delay
+        self.lines = 0
+        self._lock = threading.Lock()
+
+    def write(self, text: str) -> None:
+        time.sleep(self.delay)
+        with self._lock:
+            self.lines += text.count("\n")
+
+    def flush(self) -> None:
+        pass
+
+
+def configure(mode: str, sink: SlowStream, fmt: str) -> None:
+    from services import logs
+
+    logs.stop_logging()
+    root = logging.getLogger()
+    for h in root.handlers[:]:
+        root.removeHandler(h)
+    if mode == "sync":
+        handler = logging.StreamHandler(sink)
+        handler.setFormatter(logs.make_formatter(fmt))
+        root.addHandler(handler)
+        root.setLevel(logging.INFO)
+    else:
+        logs.setup_logging(stream=sink, fmt=fmt)
+
+
+async def run_load(seconds: float, rate: int, errors: float) -> Dict[str, Any]:
+    from services.metrics import LatencyWindow
+
+    lag = LatencyWindow(size=1000000)
+    httpx_log = logging.getLogger("httpx")
+    app_log = logging.getLogger("handlers.search")
+    done = 0
+    stop = time.perf_counter() + seconds
+
+    async def ticker() -> None:
+        while time.perf_counter() < stop:
+            t = time.perf_counter()
+            await asyncio.sleep(0.001)
+            lag.observe(max(0.0, time.perf_counter() - t - 0.001))
+
+    async def load() -> None:
+        nonlocal done
+        interval = 1 / rate
+        error_every = round(1 / errors) if errors > 0 else 0
+        next_at = time.perf_counter()
+        while time.perf_counter() < stop:
+            httpx_log.info('HTTP Request: POST https://api.telegram.org/bot***/sendMessage "HTTP/1.1 200 OK"')
+            app_log.info("Поиск %r: %d результатов", "бег", 3)
+            if error_every and done % error_every == 0:
+                try:
+                    raise ValueError("ошибка обработчика")
+                except ValueError:
+                    app_log.exception("Ошибка при обработке апдейта")
+            done += 1
+            next_at += interval
+            await asyncio.sleep(max(0.0, next_at - time.perf_counter()))
+
+    await asyncio.gather(ticker(), load())
+    return {"updates": done, **lag.percentiles()}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Задержка цикла событий при логировании")
+    parser.add_argument("--seconds", type=float, default=3.0)
+    parser.add_argument("--rate", type=int, default=1000, help="апдейтов в секунду")
+    parser.add_argument("--sink-delay-ms", type=float, default=0.2, help="задержка приёмника на запись")
+    parser.add_argument("--errors", type=float, default=0.02, help="доля апдейтов с исключением")
+    parser.add_argument("--format", default="text", choices=("text", "json"))
+    args = parser.parse_args()
+
+    from services import logs
+
+    print(f"{'режим':10}{'апдейтов':>10}{'p50 мс':>10}{'p95 мс':>10}{'p99 мс':>10}{'max мс':>10}{'строк':>10}")
+    for mode in ("sync", "queued"):
+        sink = SlowStream(args.sink_delay_ms / 1000)
+        configure(mode, sink, args.format)
+        result = asyncio.run(run_load(args.seconds, args.rate, args.errors))
+        logs.stop_logging()
+        print(
+            f"{mode:10}{result['updates']:>10}{result['p50_ms']:>10.3f}{result['p95_ms']:>10.3f}"
+            f"{result['p99_ms']:>10.3f}{result['max_ms']:>10.3f}{sink.lines:>10}"
+        )
+    print(f"очередь: {logs.stats()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,213 @@
+# -*- coding: utf-8 -*-
+"""
+Время запуска бота по режимам STARTUP_MODE (fast, eager, lazy). Запуск из корня проекта:
+    python scripts/bench_startup.py
+    python scripts/bench_startup.py --storage memory --generate 100000 --api-delay-ms 100
+    python scripts/bench_startup.py --modes fast,eager --generate 50000 --restart
+
+Для каждого режима бот запускается отдельным процессом `python main.py` против поддельного
+Bot API из scripts/load_test.py (--api-delay-ms — задержка ответа на всё, кроме getUpdates,
+как у настоящего api.telegram.org). Сразу после первого getUpdates отправляется поисковый
+запрос и inline-запрос (или через --first-after секунд — когда фоновый прогрев уже прошёл).
+Замеряется:
+- до опроса — от запуска процесса до первого getUpdates (бот начал принимать апдейты);
+- первый ответ — задержка ответа на первый поиск и первый inline-запрос (их апдейты
+  обрабатываются по очереди: inline ждёт поиска);
+- отчёт /startup самого бота: импорт, этапы инициализации и прогрева.
+С --workload N после первых запросов один пользователь --passes раз подряд отправляет одни и
+те же N поисковых запросов (универсальный поиск); медиана задержки каждого прохода показывает,
+как бот выходит на устойчивую скорость. «До устойчивой» — от запуска процесса до конца
+первого прохода, медиана которого не больше чем на 20% выше медианы последнего.
+--restart запускает каждый режим дважды на одной папке данных: холодный старт и тёплый
+перезапуск после штатной остановки (services/warm_restart.py: кэши из файла, повтор
+частых запросов); в отчёт попадает группа warm_restart из /metrics.
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import re
+import signal
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+BASE = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BASE / "scripts"))
+
+from load_test import (
+    ADMIN_ID,
+    FIRST_USER_ID,
+    FakeBotApi,
+    SimUser,
+    Stats,
+    _log_errors,
+    _metric_groups,
+    _prepare_data,
+    _start_bot,
+)
+
+MODES = ("fast", "eager", "lazy")
+
+
+async def _inline(api: FakeBotApi, user_id: int, query: str, timeout: float) -> Optional[float]:
+    """Задержка ответа на inline-запрос (answerInlineQuery) или None по таймауту."""
+    user = {"id": user_id, "is_bot": False, "first_name": f"User{user_id}"}
+    before = api.calls["answerInlineQuery"]
+    started = time.perf_counter()
+    api.push_inline_query(user, query)
+    while api.calls["answerInlineQuery"] == before:
+        if time.perf_counter() - started > timeout:
+            return None
+        await asyncio.sleep(0.001)
+    return time.perf_counter() - started
+
+
+def _workload(data_dir: Path, size: int, seed: int) -> List[str]:
+    """
+    size запросов — начала названий случайных упражнений, как ищут конкретное упражнение
+    (одни и те же для холодного и тёплого запуска).
+    """
+    with open(data_dir / "exercises.json", encoding="utf-8") as f:
+        names = sorted({" ".join(ex.get("name", "").lower().split()[:3]) for ex in json.load(f).get("exercises", [])})
+    names = [n for n in names if n]
+    return random.Random(seed).sample(names, min(size, len(names)))
+
+
+async def _passes(api: FakeBotApi, queries: List[str], spawned: float, args: argparse.Namespace) -> List[Any]:
+    """Проходы по запросам: [(медиана задержки, конец прохода от запуска процесса)] в секундах."""
+    stats = Stats()
+    user = SimUser(api, stats, FIRST_USER_ID + 2, args.reply_timeout)
+    result = []
+    for i in range(args.passes):
+        for query in queries:
+            await user.send(f"pass{i}", query)
+        latency = sorted(stats.latency[f"pass{i}"])
+        result.append((latency[len(latency) // 2] if latency else None, time.perf_counter() - spawned))
+    return result
+
+
+def _steady(passes: List[Any]) -> Optional[float]:
+    """От запуска до конца первого прохода с медианой не выше 1,2 × медианы последнего."""
+    if not passes or passes[-1][0] is None:
+        return None
+    limit = passes[-1][0] * 1.2
+    return next(end for p50, end in passes if p50 is not None and p50 <= limit)
+
+
+async def run_mode(mode: str, data_dir: Path, args: argparse.Namespace, label: str = "") -> Dict[str, Any]:
+    api = FakeBotApi(args.api_delay_ms / 1000)
+    port = await api.start()
+    env = {"STARTUP_MODE": mode, "LOG_LEVEL": "INFO", "LOG_SAMPLED_LOGGERS": "httpx", "LOG_INFO_SAMPLE_RATE": "0"}
+    spawned = time.perf_counter()
+    proc, log_path = _start_bot(args.storage, data_dir, port, False, env)
+    try:
+        try:
+            await asyncio.wait_for(api.ready.wait(), 120)
+        except asyncio.TimeoutError:
+            raise RuntimeError(f"бот не начал опрос getUpdates; лог: {log_path}")
+        ready = time.perf_counter() - spawned
+        await asyncio.sleep(args.first_after)
+        stats = Stats()
+        search, inline = await asyncio.gather(
+            SimUser(api, stats, FIRST_USER_ID, args.reply_timeout).send("search", args.query),
+            _inline(api, FIRST_USER_ID + 1, args.query, args.reply_timeout),
+        )
+        first = stats.latency["search"][0] if search else None
+        passes = await _passes(api, _workload(data_dir, args.workload, args.seed), spawned, args)
+        # Отчёт бота — после прогрева, иначе в нём ещё нет этапов warmup.*
+        await asyncio.sleep(args.settle)
+        reply = await SimUser(api, Stats(), ADMIN_ID, args.reply_timeout).send("startup", "/startup")
+        final = await SimUser(api, Stats(), ADMIN_ID, args.reply_timeout).send("metrics", "/metrics")
+    finally:
+        proc.send_signal(signal.SIGINT)
+        try:
+            await asyncio.wait_for(asyncio.to_thread(proc.wait), 30)
+        except asyncio.TimeoutError:
+            proc.kill()
+        await api.stop()
+    log = log_path.read_text(encoding="utf-8", errors="replace")
+    return {
+        "mode": label or mode,
+        "ready": ready,
+        "first_search": first,
+        "first_inline": inline,
+        "passes": passes,
+        "steady": _steady(passes),
+        "warm_restart": _metric_groups(final.get("text", "") if final else "", "warm_restart"),
+        "report": re.sub(r"</?b>", "", reply.get("text", "")) if reply else "",
+        "log_errors": _log_errors(log),
+    }
+
+
+def _ms(value: Optional[float]) -> str:
+    return f"{value * 1000:.0f}" if value is not None else "таймаут"
+
+
+def _ms_precise(value: Optional[float]) -> str:
+    return f"{value * 1000:.1f}" if value is not None else "—"
+
+
+def print_report(results: List[Dict[str, Any]], verbose: bool) -> None:
+    print(f"\n{'режим':12}{'до опроса мс':>14}{'1-й поиск мс':>14}{'1-й inline мс':>15}"
+          f"{'до устойчивой мс':>18}{'ошибок':>8}")
+    for r in results:
+        print(f"{r['mode']:12}{_ms(r['ready']):>14}{_ms(r['first_search']):>14}"
+              f"{_ms(r['first_inline']):>15}{_ms(r['steady']):>18}{len(r['log_errors']):>8}")
+    for r in results:
+        report = r["report"] if verbose else "\n".join(r["report"].split("\n\n")[:3])
+        print(f"\n=== {r['mode']}\n{report}")
+        if r["passes"]:
+            print("Медиана по проходам, мс: " + " / ".join(_ms_precise(p50) for p50, _ in r["passes"]))
+        for line in r["warm_restart"]:
+            print(line)
+        for line in r["log_errors"][:3]:
+            print(f"  {line[:200]}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Время запуска бота по режимам STARTUP_MODE")
+    parser.add_argument("--modes", default=",".join(MODES), help="режимы запуска через запятую")
+    parser.add_argument("--storage", default="json", help="режим хранения (STORAGE_MODE)")
+    parser.add_argument("--data", type=Path, default=BASE / "data", help="папка с JSON-файлами каталога")
+    parser.add_argument("--generate", type=int, default=0, help="сгенерировать каталог из N упражнений")
+    parser.add_argument("--api-delay-ms", type=float, default=50.0, help="задержка ответа Bot API, мс")
+    parser.add_argument("--query", default="бег", help="первый поисковый запрос")
+    parser.add_argument("--reply-timeout", type=float, default=60.0, help="ожидание ответа, сек")
+    parser.add_argument("--first-after", type=float, default=0.0,
+                        help="через сколько секунд после первого getUpdates отправить первые запросы")
+    parser.add_argument("--settle", type=float, default=1.0, help="пауза перед запросом /startup, сек")
+    parser.add_argument("--workload", type=int, default=30, help="разных поисковых запросов в проходе (0 — без)")
+    parser.add_argument("--passes", type=int, default=3, help="проходов по запросам")
+    parser.add_argument("--restart", action="store_true",
+                        help="после каждого запуска — тёплый перезапуск на тех же данных")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--verbose", action="store_true", help="полный отчёт /startup (импорт по модулям)")
+    args = parser.parse_args()
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp_name:
+        tmp = Path(tmp_name)
+        source = args.data
+        if args.generate:
+            from gen_dataset import generate
+
+            source = tmp / "source"
+            others = max(10, args.generate // 50)
+            generate(source, args.generate, others, others, others)
+        for mode in args.modes.split(","):
+            print(f"Режим {mode}...", flush=True)
+            # Свежая копия данных на каждый запуск: users.db и state.db не переходят между режимами
+            data_dir = _prepare_data(args.storage, source, tmp / mode)
+            results.append(asyncio.run(run_mode(mode, data_dir, args)))
+            if args.restart:
+                print(f"Режим {mode}, тёплый перезапуск...", flush=True)
+                results.append(asyncio.run(run_mode(mode, data_dir, args, f"{mode}+warm")))
+    print_report(results, args.verbose)
+
+
+if __name__ == "__main__":
+    main()
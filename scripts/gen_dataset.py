@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+"""
+Генерация синтетического набора данных (тот же формат, что data/*.json) для нагрузочных замеров.
+Запуск: python scripts/gen_dataset.py --out /tmp/club_data --exercises 1000000
+"""
+
+import argparse
+import json
+import random
+import sys
+from pathlib import Path
+
+WORDS = [
+    "бег", "разминка", "интервалы", "темп", "ЧСС", "восстановление", "сила", "ОФП", "кор",
+    "ноги", "баланс", "растяжка", "выносливость", "скорость", "ускорения", "холмы", "заминка",
+    "марафон", "полумарафон", "техника", "каденс", "дыхание", "пульс", "зона", "лёгкий",
+]
+CATEGORIES = ["Методичка", "Статья", "Видео", "Питание", "Восстановление", "Техника"]
+
+
+def _phrase(rnd: random.Random, n: int) -> str:
+    return " ".join(rnd.choice(WORDS) for _ in range(n))
+
+
+def generate(out: Path, exercises: int, complexes: int, materials: int, terms: int, seed: int = 42) -> None:
+    """Записать exercises/complexes/education/terminology.json в папку out."""
+    rnd = random.Random(seed)
+    out.mkdir(parents=True, exist_ok=True)
+    with open(out / "exercises.json", "w", encoding="utf-8") as f:
+        # Пишем потоково, чтобы не держать миллион объектов в памяти
+        f.write('{"exercises": [\n')
+        for i in range(exercises):
+            ex = {
+                "id": f"ex-{i + 1}",
+                "name": f"{_phrase(rnd, 2).capitalize()} {i + 1}",
+                "description": _phrase(rnd, 12),
+                "link": f"https://t.me/your_channel/{i + 1}",
+                "keywords": rnd.sample(WORDS, 4),
+            }
+            f.write(("," if i else "") + json.dumps(ex, ensure_ascii=False) + "\n")
+        f.write("]}\n")
+    data = {
+        "complexes.json": {"complexes": [
+            {
+                "id": f"comp-{i + 1}",
+                "name": f"{_phrase(rnd, 2).capitalize()} {i + 1}",
+                "description": _phrase(rnd, 8),
+                "structure": "\n".join(f"{n}. {_phrase(rnd, 3)} — {rnd.randint(2, 15)} мин" for n in range(1, 5)),
+                "duration_minutes": rnd.choice([15, 20, 25, 30, 40, 45, 60, 75, 90]),
+            }
+            for i in range(complexes)
+        ]},
+        "education.json": {"materials": [
+            {
+                "id": f"edu-{i + 1}",
+                "title": f"{_phrase(rnd, 3).capitalize()} {i + 1}",
+                "description": _phrase(rnd, 10),
+                "link": f"https://t.me/your_channel/edu{i + 1}",
+                "category": rnd.choice(CATEGORIES),
+            }
+            for i in range(materials)
+        ]},
+        "terminology.json": {"terms": [
+            {"term": f"{_phrase(rnd, 2).capitalize()} {i + 1}", "definition": _phrase(rnd, 15)}
+            for i in range(terms)
+        ]},
+    }
+    for name, payload in data.items():
+        with open(out / name, "w", encoding="utf-8") as f:
+            json.dump(payload, f, ensure_ascii=False)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Синтетический набор данных")
+    parser.add_argument("--out", type=Path, required=True)
+    parser.add_argument("--exercises", type=int, default=10000)
+    parser.add_argument("--complexes", type=int, default=500)
+    parser.add_argument("--materials", type=int, default=500)
+    parser.add_argument("--terms", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+    generate(args.out, args.exercises, args.complexes, args.materials, args.terms, args.seed)
+    print(f"Данные записаны в {args.out}")
+
+
+if __name__ == "__main__":
+    main()
+    sys.exit(0)
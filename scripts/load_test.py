@@ -0,0 +1,689 @@
+# -*- coding: utf-8 -*-
+"""
+Нагрузочный тест бота через HTTP: локальный поддельный сервер Bot API и тысячи
+имитируемых пользователей. Запуск из корня проекта:
+    python scripts/load_test.py --users 2000 --duration 60
+    python scripts/load_test.py --modes sqlite,memory --generate 100000 --users 5000
+    python scripts/load_test.py --modes sqlite --tenants 5 --users 2000
+
+Для каждого режима хранения (--modes) данные копируются во временную папку (для sqlite
+и memory — заливаются в SQLite), бот запускается отдельным процессом `python main.py`
+с BOT_API_BASE_URL на поддельный сервер и RUNNING_BOT_DATA_DIR на временную папку.
+Сервер отвечает на getMe, getUpdates (long polling), sendMessage, editMessageText,
+answerCallbackQuery, sendDocument и служебные методы, как настоящий Bot API.
+Пользователи проходят сценарии: /start, поиск упражнений с выбором из списка,
+материалы, комплексы, термины, универсальный поиск, калькулятор темпа; админ
+периодически запрашивает /users (выгрузка файлом) и /metrics.
+Задержка ответа — от появления апдейта на сервере до первого сообщения бота в этот чат.
+Отчёт по режимам: апдейтов в секунду, задержки p50/p95/p99/max по действиям,
+таймауты и ошибки в логе бота.
+Лимиты исходящих сообщений (OUTBOUND_*) по умолчанию снимаются, чтобы мерить бота,
+а не ограничитель, а лимит сообщений от пользователя (ADMISSION_USER_*) поднимается до
+10 в секунду — имитируемые пользователи проходят сценарии быстрее людей; --keep-limits
+оставляет настройки бота. --api-delay-ms — задержка ответа поддельного Bot API (как до
+api.telegram.org): тогда видно, сколько дают одновременно обрабатываемые апдейты. --env KEY=VALUE передаёт боту
+настройки (например, профиль HTTP-транспорта); в отчёт попадает статистика пулов
+соединений из /metrics.
+--tenants N запускает N ботов (клубов) в одном процессе (RUNNING_BOT_TENANTS): у каждого
+свой токен, папка данных и своя доля пользователей; отчёт — по каждому боту, плюс
+память и задержка обработки по арендаторам из /metrics (группа tenants).
+--flooders N добавляет N пользователей, которые шлют сообщения без пауз (раз в
+--flood-interval сек, часто один и тот же текст), не дожидаясь ответа: в отчёте — сколько
+они отправили и получили ответов, счётчики защиты от флуда из /metrics (группа admission)
+и задержка обычных пользователей рядом с ними.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import re
+import shutil
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter, defaultdict, deque
+from itertools import islice
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional, Tuple
+from urllib.parse import parse_qsl
+
+BASE = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BASE))
+sys.path.insert(0, str(BASE / "scripts"))
+# config требует токен при импорте; боту он здесь не нужен
+os.environ.setdefault("RUNNING_BOT_TOKEN", "bench")
+
+TOKEN = "123456:LOADTEST"
+BOT_USER = {"id": 123456, "is_bot": True, "first_name": "Load test bot", "username": "load_test_bot"}
+ADMIN_ID = 1
+FIRST_USER_ID = 1000
+FIRST_FLOODER_ID = 500
+CONTENT_FILES = ("exercises.json", "complexes.json", "education.json", "terminology.json")
+# Ответы бота, которые считаются ответом пользователю (answerCallbackQuery — нет)
+REPLY_METHODS = ("sendMessage", "editMessageText", "sendDocument")
+
+Reply = Dict[str, Any]
+
+
+class FakeBotApi:
+    """
+    Минимальный HTTP/1.1-сервер с семантикой Bot API для одного бота; delay — задержка
+    ответа на все методы, кроме long polling (сетевая задержка до настоящего Bot API).
+    """
+
+    def __init__(self, delay: float = 0.0) -> None:
+        self.delay = delay
+        self.pending: Deque[Dict[str, Any]] = deque()
+        self.calls: Counter = Counter()
+        self.ready = asyncio.Event()
+        self._new_update = asyncio.Event()
+        self._inboxes: Dict[int, "asyncio.Queue[Reply]"] = {}
+        self._callback_chats: Dict[str, int] = {}
+        self._update_id = 0
+        self._message_id = 0
+        self._server: Optional[asyncio.base_events.Server] = None
+
+    async def start(self) -> int:
+        self._server = await asyncio.start_server(self._serve, "127.0.0.1", 0)
+        return self._server.sockets[0].getsockname()[1]
+
+    async def stop(self) -> None:
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+
+    # --- HTTP ---
+
+    async def _serve(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                _verb, target, _version = line.decode("latin-1").split(" ", 2)
+                headers = {}
+                while True:
+                    raw = await reader.readline()
+                    if raw in (b"\r\n", b"\n", b""):
+                        break
+                    key, _, value = raw.decode("latin-1").partition(":")
+                    headers[key.strip().lower()] = value.strip()
+                body = await reader.readexactly(int(headers.get("content-length") or 0))
+                params = _parse_body(headers.get("content-type", ""), body)
+                payload = json.dumps(await self.handle(target, params), ensure_ascii=False).encode("utf-8")
+                writer.write(
+                    b"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n"
+                    b"Content-Length: %d\r\n\r\n" % len(payload) + payload
+                )
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError, asyncio.CancelledError):
+            # CancelledError — незавершённый long polling при остановке сервера
+            pass
+        finally:
+            writer.close()
+
+    # --- Bot API ---
+
+    async def handle(self, target: str, params: Dict[str, Any]) -> Dict[str, Any]:
+        """Запрос /bot<токен>/<метод>."""
+        return await self._call(target.split("?", 1)[0].rsplit("/", 1)[-1], params)
+
+    async def _call(self, method: str, p: Dict[str, Any]) -> Dict[str, Any]:
+        self.calls[method] += 1
+        if method != "getUpdates" and self.delay:
+            await asyncio.sleep(self.delay)
+        if method == "getMe":
+            return {"ok": True, "result": BOT_USER}
+        if method == "getUpdates":
+            self.ready.set()
+            return {"ok": True, "result": await self._get_updates(p)}
+        if method in REPLY_METHODS:
+            chat_id = int(p.get("chat_id") or 0)
+            if method == "editMessageText":
+                message_id = int(p.get("message_id") or 0)
+            else:
+                self._message_id += 1
+                message_id = self._message_id
+            message: Dict[str, Any] = {
+                "message_id": message_id,
+                "date": int(time.time()),
+                "chat": {"id": chat_id, "type": "private"},
+                "from": BOT_USER,
+                "text": p.get("text") or p.get("caption") or "",
+            }
+            if method == "sendDocument":
+                message["document"] = {"file_id": f"doc{message_id}", "file_unique_id": f"u{message_id}"}
+            self._deliver(chat_id, {"method": method, "message_id": message_id, **p})
+            return {"ok": True, "result": message}
+        if method == "answerCallbackQuery":
+            chat_id = self._callback_chats.pop(p.get("callback_query_id", ""), 0)
+            self._deliver(chat_id, {"method": method, **p})
+        # deleteWebhook, setMyCommands, sendChatAction и прочее — просто успех
+        return {"ok": True, "result": True}
+
+    async def _get_updates(self, p: Dict[str, Any]) -> List[Dict[str, Any]]:
+        offset = int(p.get("offset") or 0)
+        limit = int(p.get("limit") or 100)
+        while self.pending and self.pending[0]["update_id"] < offset:
+            self.pending.popleft()
+        if not self.pending:
+            self._new_update.clear()
+            try:
+                await asyncio.wait_for(self._new_update.wait(), float(p.get("timeout") or 0))
+            except asyncio.TimeoutError:
+                pass
+        return list(islice(self.pending, limit))
+
+    def _deliver(self, chat_id: int, reply: Reply) -> None:
+        inbox = self._inboxes.get(chat_id)
+        if inbox is not None:
+            inbox.put_nowait(reply)
+
+    def inbox(self, chat_id: int) -> "asyncio.Queue[Reply]":
+        return self._inboxes.setdefault(chat_id, asyncio.Queue())
+
+    def _push(self, update: Dict[str, Any]) -> None:
+        self._update_id += 1
+        update["update_id"] = self._update_id
+        self.pending.append(update)
+        self._new_update.set()
+
+    def push_message(self, user: Dict[str, Any], text: str) -> None:
+        self._message_id += 1
+        message: Dict[str, Any] = {
+            "message_id": self._message_id,
+            "date": int(time.time()),
+            "chat": {"id": user["id"], "type": "private"},
+            "from": user,
+            "text": text,
+        }
+        if text.startswith("/"):
+            message["entities"] = [{"type": "bot_command", "offset": 0, "length": len(text.split()[0])}]
+        self._push({"message": message})
+
+    def push_inline_query(self, user: Dict[str, Any], query: str) -> None:
+        self._push({"inline_query": {"id": f"{user['id']}-{self._update_id + 1}", "from": user,
+                                     "query": query, "offset": ""}})
+
+    def push_callback(self, user: Dict[str, Any], message_id: int, data: str) -> None:
+        query_id = f"{user['id']}-{self._update_id + 1}"
+        self._callback_chats[query_id] = user["id"]
+        self._push({"callback_query": {
+            "id": query_id,
+            "from": user,
+            "chat_instance": str(user["id"]),
+            "data": data,
+            "message": {
+                "message_id": message_id,
+                "date": int(time.time()),
+                "chat": {"id": user["id"], "type": "private"},
+                "from": BOT_USER,
+                "text": "…",
+            },
+        }})
+
+
+class BotApiRouter(FakeBotApi):
+    """Один сервер для нескольких ботов: запрос уходит в FakeBotApi по токену из пути."""
+
+    def __init__(self, bots: Dict[str, FakeBotApi]) -> None:
+        super().__init__()
+        self.bots = bots
+
+    async def handle(self, target: str, params: Dict[str, Any]) -> Dict[str, Any]:
+        token = target.split("?", 1)[0].rsplit("/", 2)[-2][len("bot"):]
+        bot = self.bots.get(token)
+        if bot is None:
+            return {"ok": False, "error_code": 401, "description": "Unauthorized"}
+        return await bot.handle(target, params)
+
+
+def _parse_body(content_type: str, body: bytes) -> Dict[str, Any]:
+    """Параметры запроса: form-urlencoded, JSON или multipart (у файлов — только размер)."""
+    if not body:
+        return {}
+    if content_type.startswith("application/json"):
+        return json.loads(body)
+    if content_type.startswith("multipart/form-data"):
+        boundary = content_type.split("boundary=", 1)[1].strip('"').encode("latin-1")
+        params: Dict[str, Any] = {}
+        for part in body.split(b"--" + boundary):
+            head, _, value = part.partition(b"\r\n\r\n")
+            name = re.search(rb'name="([^"]+)"', head)
+            if not name:
+                continue
+            value = value[:-2] if value.endswith(b"\r\n") else value
+            if b"filename=" in head:
+                params[name.group(1).decode()] = len(value)
+            else:
+                params[name.group(1).decode()] = value.decode("utf-8", "replace")
+        return params
+    return dict(parse_qsl(body.decode("utf-8")))
+
+
+def _callback_buttons(reply: Optional[Reply], prefix: str) -> List[str]:
+    """callback_data inline-кнопок ответа, начинающиеся с prefix."""
+    if not reply or not reply.get("reply_markup"):
+        return []
+    markup = reply["reply_markup"]
+    if isinstance(markup, str):
+        markup = json.loads(markup)
+    return [
+        b["callback_data"]
+        for row in markup.get("inline_keyboard", [])
+        for b in row
+        if b.get("callback_data", "").startswith(prefix)
+    ]
+
+
+class Stats:
+    """Задержки и исходы по действиям для одного прогона."""
+
+    def __init__(self) -> None:
+        self.latency: Dict[str, List[float]] = defaultdict(list)
+        self.done_at: List[float] = []
+        self.sent = 0
+        self.timeouts: Counter = Counter()
+
+    def sustained(self, start: float, end: float) -> float:
+        """Ответов в секунду в окне [start, end) — без разгона и хвоста."""
+        return sum(1 for t in self.done_at if start <= t < end) / (end - start)
+
+    def report(self) -> Dict[str, Any]:
+        everything = sorted(v for values in self.latency.values() for v in values)
+        return {
+            "sent": self.sent,
+            "replies": len(everything),
+            "timeouts": sum(self.timeouts.values()),
+            "all": _percentiles(everything),
+            "actions": {a: _percentiles(sorted(v)) for a, v in sorted(self.latency.items())},
+        }
+
+
+def _percentiles(values: List[float]) -> Dict[str, float]:
+    if not values:
+        return {}
+    n = len(values)
+    return {
+        "n": n,
+        "p50_ms": values[n // 2] * 1000,
+        "p95_ms": values[min(n - 1, int(n * 0.95))] * 1000,
+        "p99_ms": values[min(n - 1, int(n * 0.99))] * 1000,
+        "max_ms": values[-1] * 1000,
+    }
+
+
+class SimUser:
+    """Пользователь Telegram: отправляет апдейт и ждёт первого ответа бота."""
+
+    def __init__(self, api: FakeBotApi, stats: Stats, user_id: int, timeout: float) -> None:
+        self.api = api
+        self.stats = stats
+        self.user = {"id": user_id, "is_bot": False, "first_name": f"User{user_id}", "username": f"user{user_id}"}
+        self.inbox = api.inbox(user_id)
+        self.timeout = timeout
+
+    async def _wait(self, action: str, push: Callable[[], None]) -> Optional[Reply]:
+        while not self.inbox.empty():
+            self.inbox.get_nowait()
+        started = time.perf_counter()
+        push()
+        self.stats.sent += 1
+        deadline = started + self.timeout
+        while True:
+            try:
+                reply = await asyncio.wait_for(self.inbox.get(), max(0.0, deadline - time.perf_counter()))
+            except asyncio.TimeoutError:
+                self.stats.timeouts[action] += 1
+                return None
+            if reply["method"] in REPLY_METHODS:
+                now = time.perf_counter()
+                self.stats.latency[action].append(now - started)
+                self.stats.done_at.append(now)
+                return reply
+
+    async def send(self, action: str, text: str) -> Optional[Reply]:
+        return await self._wait(action, lambda: self.api.push_message(self.user, text))
+
+    async def press(self, action: str, reply: Reply, data: str) -> Optional[Reply]:
+        return await self._wait(action, lambda: self.api.push_callback(self.user, reply["message_id"], data))
+
+
+class Scenarios:
+    """Сценарии поведения пользователей поверх реальных данных каталога."""
+
+    def __init__(self, data_dir: Path, rng: random.Random) -> None:
+        from handlers.keyboards import (
+            BTN_BACK, BTN_COMPLEXES, BTN_EDUCATION, BTN_EXERCISES, BTN_PACE, BTN_SEARCH, BTN_TERMINOLOGY,
+        )
+
+        self.btn = {
+            "back": BTN_BACK, "complexes": BTN_COMPLEXES, "education": BTN_EDUCATION,
+            "exercises": BTN_EXERCISES, "pace": BTN_PACE, "search": BTN_SEARCH, "terminology": BTN_TERMINOLOGY,
+        }
+        self.rng = rng
+        self.words, self.terms = _vocabulary(data_dir)
+        self.weighted: List[Tuple[float, Callable[[SimUser], Awaitable[None]]]] = [
+            (0.35, self.exercises), (0.15, self.education), (0.1, self.complexes),
+            (0.15, self.terminology), (0.15, self.search), (0.1, self.pace),
+        ]
+
+    def pick(self) -> Callable[[SimUser], Awaitable[None]]:
+        return self.rng.choices([s for _, s in self.weighted], [w for w, _ in self.weighted])[0]
+
+    def query(self) -> str:
+        return " ".join(self.rng.sample(self.words, self.rng.choice((1, 1, 2))))
+
+    async def exercises(self, u: SimUser) -> None:
+        await u.send("menu", self.btn["exercises"])
+        reply = await u.send("exercise_search", self.query())
+        buttons = _callback_buttons(reply, "ex:")
+        if reply and buttons:
+            await u.press("exercise_card", reply, self.rng.choice(buttons))
+
+    async def education(self, u: SimUser) -> None:
+        reply = await u.send("menu", self.btn["education"])
+        categories = [d for d in _callback_buttons(reply, "edc:") if d.count(":") == 2]
+        if not (reply and categories):
+            return
+        reply = await u.press("education_category", reply, self.rng.choice(categories))
+        buttons = _callback_buttons(reply, "edu:")
+        if reply and buttons:
+            card = await u.press("education_card", reply, self.rng.choice(buttons))
+            back = _callback_buttons(card, "edc:")
+            if card and back:
+                await u.press("back", card, back[0])
+
+    async def complexes(self, u: SimUser) -> None:
+        reply = await u.send("menu", self.btn["complexes"])
+        # В половине случаев — фильтр по длительности или другая страница списка
+        filters = [d for d in _callback_buttons(reply, "cxf:") + _callback_buttons(reply, "cxp:") if d != "cxp:"]
+        if reply and filters and self.rng.random() < 0.5:
+            reply = await u.press("complex_filter", reply, self.rng.choice(filters))
+        buttons = _callback_buttons(reply, "complex:")
+        if reply and buttons:
+            await u.press("complex_card", reply, self.rng.choice(buttons))
+
+    async def terminology(self, u: SimUser) -> None:
+        await u.send("menu", self.btn["terminology"])
+        await u.send("term_search", self.rng.choice(self.terms) if self.terms else self.query())
+
+    async def search(self, u: SimUser) -> None:
+        await u.send("menu", self.btn["search"])
+        await u.send("universal_search", self.query())
+
+    async def pace(self, u: SimUser) -> None:
+        await u.send("menu", self.btn["pace"])
+        await u.send("pace", f"{self.rng.choice((5, 10, 21.1, 42.2))} км {self.rng.randint(20, 240)} мин")
+
+
+def _vocabulary(data_dir: Path) -> Tuple[List[str], List[str]]:
+    """Слова для запросов (из названий упражнений) и термины; большие файлы не читаются целиком."""
+    words: set = set()
+    path = data_dir / "exercises.json"
+    if path.stat().st_size < 20 * 1024 * 1024:
+        with open(path, encoding="utf-8") as f:
+            for ex in json.load(f).get("exercises", []):
+                words.update(w.lower() for w in re.findall(r"\w{3,}", ex.get("name", "")) if not w.isdigit())
+    if not words:
+        from gen_dataset import WORDS
+
+        words.update(WORDS)
+    with open(data_dir / "terminology.json", encoding="utf-8") as f:
+        terms = [t.get("term", "") for t in json.load(f).get("terminology", []) if t.get("term")]
+    return sorted(words), terms[:1000]
+
+
+def _prepare_data(mode: str, source: Path, tmp: Path, name: str = "") -> Path:
+    data_dir = tmp / (name or mode)
+    data_dir.mkdir(parents=True)
+    for name in CONTENT_FILES:
+        shutil.copy(source / name, data_dir / name)
+    if mode in ("sqlite", "memory"):
+        from seed_sqlite_from_json import seed
+
+        seed(data_dir, data_dir / "running_club.db")
+    return data_dir
+
+
+def _start_bot(
+    mode: str, data_dir: Path, port: int, keep_limits: bool, extra_env: Dict[str, str]
+) -> Tuple[subprocess.Popen, Path]:
+    env = {
+        **os.environ,
+        "RUNNING_BOT_TOKEN": TOKEN,
+        "BOT_API_BASE_URL": f"http://127.0.0.1:{port}/bot",
+        "BOT_API_FILE_URL": f"http://127.0.0.1:{port}/file/bot",
+        "STORAGE_MODE": mode,
+        "RUNNING_BOT_DATA_DIR": str(data_dir),
+        "RUNNING_BOT_ADMIN_IDS": str(ADMIN_ID),
+        "LOG_LEVEL": "WARNING",
+    }
+    if not keep_limits:
+        env.update({"OUTBOUND_GLOBAL_RATE": "1000000", "OUTBOUND_CHAT_RATE": "1000000",
+                    "OUTBOUND_GROUP_RATE": "1000000", "OUTBOUND_CHAT_BURST": "1000000",
+                    # Имитируемые пользователи жмут кнопки быстрее людей; флудеры — всё равно быстрее
+                    "ADMISSION_USER_RATE": "10", "ADMISSION_USER_BURST": "20"})
+    env.update(extra_env)
+    log_path = data_dir / "bot.log"
+    log = open(log_path, "w", encoding="utf-8")
+    proc = subprocess.Popen([sys.executable, str(BASE / "main.py")], env=env, stdout=log, stderr=subprocess.STDOUT)
+    log.close()
+    return proc, log_path
+
+
+async def _run_user(u: SimUser, scenarios: Scenarios, stop_at: float, ramp: float, think: Tuple[float, float]) -> None:
+    await asyncio.sleep(scenarios.rng.uniform(0, ramp))
+    await u.send("start", "/start")
+    while time.perf_counter() < stop_at:
+        await asyncio.sleep(scenarios.rng.uniform(*think))
+        if time.perf_counter() >= stop_at:
+            return
+        await scenarios.pick()(u)
+
+
+async def _run_admin(u: SimUser, stop_at: float, every: float) -> None:
+    while time.perf_counter() + every < stop_at:
+        await asyncio.sleep(every)
+        await u.send("admin_users", "/users")
+        await u.send("admin_metrics", "/metrics")
+
+
+async def _run_flooder(
+    api: FakeBotApi, user_id: int, scenarios: Scenarios, stop_at: float, interval: float
+) -> Tuple[int, int]:
+    """Сообщения без пауз и без ожидания ответа; возвращает (отправлено, получено ответов)."""
+    user = {"id": user_id, "is_bot": False, "first_name": f"Flooder{user_id}"}
+    inbox = api.inbox(user_id)
+    sent = replies = 0
+    text = scenarios.query()
+    while time.perf_counter() < stop_at:
+        # Каждое пятое сообщение — новый текст, остальные — повтор
+        if scenarios.rng.random() < 0.2:
+            text = scenarios.query()
+        api.push_message(user, text)
+        sent += 1
+        await asyncio.sleep(interval)
+        while not inbox.empty():
+            replies += inbox.get_nowait()["method"] in REPLY_METHODS
+    return sent, replies
+
+
+def _log_errors(log: str) -> List[str]:
+    """Строки ERROR/CRITICAL из лога бота; к каждой дописывается итог traceback, если он есть."""
+    errors: List[str] = []
+    in_traceback = False
+    for line in log.splitlines():
+        if re.search(r" - (?:ERROR|CRITICAL) - ", line):
+            errors.append(line)
+        elif line.startswith("Traceback"):
+            in_traceback = True
+        elif in_traceback and line and not line[0].isspace():
+            in_traceback = False
+            if errors:
+                errors[-1] += f" → {line}"
+    return errors
+
+
+def _metric_groups(report: str, prefix: str) -> List[str]:
+    """Группы метрик с именем на prefix из текста /metrics: «группа: ключ=значение, ...»."""
+    groups: List[str] = []
+    for block in report.split("\n\n"):
+        lines = block.strip().splitlines()
+        if lines and lines[0].startswith(f"<b>{prefix}"):
+            values = ", ".join(line.lstrip("• ").replace(": ", "=") for line in lines[1:])
+            groups.append(f"{lines[0][3:-4]}: {values}")
+    return groups
+
+
+def _prepare_tenants(mode: str, source: Path, tmp: Path, count: int) -> Tuple[Path, List[Tuple[str, str, Path]]]:
+    """Папки данных и файл RUNNING_BOT_TENANTS для count ботов: (корень, [(имя, токен, папка)])."""
+    root = tmp / mode
+    bots = []
+    for i in range(count):
+        name = f"club{i + 1}"
+        bots.append((name, f"{123456 + i}:LOADTEST", _prepare_data(mode, source, root, name)))
+    items = [{"name": name, "token": token, "data_dir": name} for name, token, _ in bots]
+    with open(root / "tenants.json", "w", encoding="utf-8") as f:
+        json.dump({"tenants": items}, f)
+    return root, bots
+
+
+async def run_mode(mode: str, source: Path, tmp: Path, args: argparse.Namespace) -> List[Dict[str, Any]]:
+    extra_env = dict(item.split("=", 1) for item in args.env)
+    if args.tenants:
+        data_dir, bots = _prepare_tenants(mode, source, tmp, args.tenants)
+        extra_env["RUNNING_BOT_TENANTS"] = str(data_dir / "tenants.json")
+    else:
+        data_dir = _prepare_data(mode, source, tmp)
+        bots = [(mode, TOKEN, data_dir)]
+    apis = [FakeBotApi(args.api_delay_ms / 1000) for _ in bots]
+    server = BotApiRouter({token: api for (_, token, _), api in zip(bots, apis)})
+    port = await server.start()
+    proc, log_path = _start_bot(mode, data_dir, port, args.keep_limits, extra_env)
+    try:
+        try:
+            await asyncio.wait_for(asyncio.gather(*(api.ready.wait() for api in apis)), 60)
+        except asyncio.TimeoutError:
+            raise RuntimeError(f"бот не начал опрос getUpdates; лог: {log_path}")
+        stats = [Stats() for _ in bots]
+        rng = random.Random(args.seed)
+        scenarios = Scenarios(bots[0][2], rng)
+        started = time.perf_counter()
+        stop_at = started + args.ramp + args.duration
+        # Пользователи — поровну между ботами, у каждого бота свой админ
+        tasks = [
+            _run_user(SimUser(apis[i % len(apis)], stats[i % len(apis)], FIRST_USER_ID + i, args.reply_timeout),
+                      scenarios, stop_at, args.ramp, (args.think_min, args.think_max))
+            for i in range(args.users)
+        ]
+        tasks += [
+            _run_admin(SimUser(api, st, ADMIN_ID, args.reply_timeout * 3), stop_at, args.admin_every)
+            for api, st in zip(apis, stats)
+        ]
+        flooders = [
+            _run_flooder(apis[i % len(apis)], FIRST_FLOODER_ID + i, scenarios, stop_at, args.flood_interval)
+            for i in range(args.flooders)
+        ]
+        results = await asyncio.gather(*tasks, *flooders)
+        flood = results[len(tasks):]
+        elapsed = time.perf_counter() - started
+        # Итоговые метрики бота (пулы соединений и т. п.) — тем же путём, что и админ
+        final = await SimUser(apis[0], Stats(), ADMIN_ID, args.reply_timeout * 3).send("admin_metrics", "/metrics")
+    finally:
+        proc.send_signal(signal.SIGINT)
+        try:
+            await asyncio.wait_for(asyncio.to_thread(proc.wait), 30)
+        except asyncio.TimeoutError:
+            proc.kill()
+        await server.stop()
+    log = log_path.read_text(encoding="utf-8", errors="replace")
+    text = final.get("text", "") if final else ""
+    return [
+        {
+            "mode": f"{mode}/{name}" if args.tenants else mode,
+            "elapsed": elapsed,
+            "sustained": st.sustained(started + args.ramp, stop_at),
+            "exit_code": proc.returncode,
+            "log_errors": _log_errors(log) if i == 0 else [],
+            "calls": dict(api.calls),
+            "transport": _metric_groups(text, "transport.") if i == 0 else [],
+            "tenants": _metric_groups(text, "tenants") if i == 0 else [],
+            "admission": _metric_groups(text, "admission") if i == 0 and flood else [],
+            "flood": [sum(f[0] for f in flood), sum(f[1] for f in flood)] if i == 0 and flood else [],
+            **st.report(),
+        }
+        for i, ((name, _, _), api, st) in enumerate(zip(bots, apis, stats))
+    ]
+
+
+def print_report(results: List[Dict[str, Any]]) -> None:
+    for r in results:
+        error_rate = r["timeouts"] / r["sent"] * 100 if r["sent"] else 0
+        a = r["all"]
+        print(f"\n=== {r['mode']}: {r['sustained']:.0f} апдейтов/с после разгона "
+              f"(ответов {r['replies']} из {r['sent']} за {r['elapsed']:.0f} с)")
+        print(f"  задержка ответа: p50 {a.get('p50_ms', 0):.1f} / p95 {a.get('p95_ms', 0):.1f} / "
+              f"p99 {a.get('p99_ms', 0):.1f} / max {a.get('max_ms', 0):.1f} мс")
+        print(f"  таймаутов: {r['timeouts']} ({error_rate:.2f}%), ошибок в логе бота: {len(r['log_errors'])}, "
+              f"код выхода: {r['exit_code']}")
+        for line in r["log_errors"][:3]:
+            print(f"    {line[:200]}")
+        print(f"  {'действие':18}{'n':>8}{'p50 мс':>10}{'p95 мс':>10}{'p99 мс':>10}{'max мс':>10}")
+        for action, p in r["actions"].items():
+            print(f"  {action:18}{p['n']:>8}{p['p50_ms']:>10.1f}{p['p95_ms']:>10.1f}"
+                  f"{p['p99_ms']:>10.1f}{p['max_ms']:>10.1f}")
+        print("  запросы бота: " + ", ".join(f"{m} {n}" for m, n in sorted(r["calls"].items())))
+        if r["flood"]:
+            print(f"  флудеры: отправлено {r['flood'][0]}, получено ответов {r['flood'][1]}")
+        for line in r["transport"] + r["tenants"] + r["admission"]:
+            print(f"  {line}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Нагрузочный тест бота через поддельный Bot API")
+    parser.add_argument("--modes", default="json,sqlite,memory", help="режимы хранения через запятую")
+    parser.add_argument("--users", type=int, default=1000, help="имитируемых пользователей")
+    parser.add_argument("--duration", type=float, default=30.0, help="секунд нагрузки после разгона")
+    parser.add_argument("--ramp", type=float, default=5.0, help="секунд на подключение всех пользователей")
+    parser.add_argument("--think-min", type=float, default=0.5, help="пауза между сценариями, мин. сек")
+    parser.add_argument("--think-max", type=float, default=3.0, help="пауза между сценариями, макс. сек")
+    parser.add_argument("--reply-timeout", type=float, default=10.0, help="ожидание ответа, сек")
+    parser.add_argument("--admin-every", type=float, default=10.0, help="раз в сколько секунд админ шлёт /users")
+    parser.add_argument("--data", type=Path, default=BASE / "data", help="папка с JSON-файлами каталога")
+    parser.add_argument("--generate", type=int, default=0, help="сгенерировать каталог из N упражнений")
+    parser.add_argument("--keep-limits", action="store_true", help="не снимать лимиты исходящих сообщений")
+    parser.add_argument("--env", action="append", default=[], metavar="KEY=VALUE",
+                        help="переменная окружения бота, например HTTP_SEND_KEEPALIVE=20 (можно несколько)")
+    parser.add_argument("--tenants", type=int, default=0,
+                        help="запустить N ботов (клубов) в одном процессе, пользователи — поровну")
+    parser.add_argument("--api-delay-ms", type=float, default=0.0,
+                        help="задержка ответа Bot API, мс (как до api.telegram.org)")
+    parser.add_argument("--flooders", type=int, default=0,
+                        help="добавить N пользователей, шлющих сообщения без пауз (проверка защиты от флуда)")
+    parser.add_argument("--flood-interval", type=float, default=0.01, help="пауза флудера между сообщениями, сек")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp_name:
+        tmp = Path(tmp_name)
+        source = args.data
+        if args.generate:
+            from gen_dataset import generate
+
+            source = tmp / "source"
+            others = max(10, args.generate // 50)
+            generate(source, args.generate, others, others, others)
+        for mode in args.modes.split(","):
+            print(f"Режим {mode}: {args.users} пользователей, {args.duration:.0f} с...", flush=True)
+            results.extend(asyncio.run(run_mode(mode, source, tmp, args)))
+    print_report(results)
+
+
+if __name__ == "__main__":
+    main()
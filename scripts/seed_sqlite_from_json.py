@@ -2,68 +2,385 @@
 """
 Скрипт заполнения SQLite данными из JSON-файлов.
 Запуск из корня проекта: python scripts/seed_sqlite_from_json.py
+
+Заливка инкрементальная: JSON читается потоково, записи сравниваются с базой
+по id и хэшу содержимого, и в одной транзакции применяются только вставки,
+изменения и удаления (executemany). Полнотекстовые индексы (FTS5) обновляются
+только для изменённых строк: триграммные exercises_trgm и terminology_trgm (по ним ищут
+режимы sqlite и memory) и complexes_fts (фильтр комплексов по словам структуры). Таблицы не пересоздаются, поэтому бот во время
+заливки продолжает читать старые данные (режим WAL), а после COMMIT — новые. Если что-то
+изменилось, в той же транзакции растёт версия контента (content_meta), по которой бот сбрасывает кэши.
+Если id в JSON повторяется, в базу попадает последняя запись, а отчёт считает каждый id
+один раз (повторы — в duplicates).
+Правки из бота (/edit, /delete) ещё не перенесены в JSON, пока бот не остановлен: они лежат
+в журнале content_journal.jsonl рядом с JSON и накладываются поверх файлов, поэтому заливка
+их не откатывает.
+
+Схема таблиц каталога — database/sqlite_db.SCHEMA (та же, что создаёт бот); скрипт добавляет
+к ней только таблицу хэшей seed_hashes.
+
+Параметры: --data DIR (папка с JSON), --db PATH (файл БД).
 """
 
+import argparse
+import hashlib
 import json
+import os
+import re
 import sqlite3
 import sys
+import time
 from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional, Set, Tuple
 
 # Корень проекта (родитель папки scripts)
 BASE = Path(__file__).resolve().parent.parent
 DATA = BASE / "data"
 DB_PATH = DATA / "running_club.db"
 
+sys.path.insert(0, str(BASE))
+# config требует токен при импорте; заливке он не нужен
+os.environ.setdefault("RUNNING_BOT_TOKEN", "seed")
 
-def main() -> None:
-    DATA.mkdir(parents=True, exist_ok=True)
-    conn = sqlite3.connect(DB_PATH)
-    conn.executescript("""
-        DROP TABLE IF EXISTS exercises;
-        DROP TABLE IF EXISTS education;
-        DROP TABLE IF EXISTS complexes;
-        DROP TABLE IF EXISTS terminology;
-        CREATE TABLE exercises (id TEXT PRIMARY KEY, name TEXT, description TEXT, link TEXT, keywords TEXT);
-        CREATE TABLE education (id TEXT PRIMARY KEY, title TEXT, description TEXT, link TEXT, category TEXT);
-        CREATE TABLE complexes (id TEXT PRIMARY KEY, name TEXT, description TEXT, structure TEXT, duration_minutes INTEGER);
-        CREATE TABLE terminology (term TEXT PRIMARY KEY, definition TEXT);
-    """)
-
-    with open(DATA / "exercises.json", "r", encoding="utf-8") as f:
-        exercises = json.load(f).get("exercises", [])
-    for ex in exercises:
-        if isinstance(ex, dict):
-            kw = ex.get("keywords")
-            kw_str = json.dumps(kw, ensure_ascii=False) if isinstance(kw, list) else (kw or "")
-            conn.execute(
-                "INSERT OR REPLACE INTO exercises (id, name, description, link, keywords) VALUES (?,?,?,?,?)",
-                (ex.get("id"), ex.get("name"), ex.get("description"), ex.get("link") or "", kw_str),
+from config import CONTENT_JOURNAL  # noqa: E402
+from database.sqlite_db import BUMP_VERSION, SCHEMA  # noqa: E402
+
+# Журнал правок из бота — в папке с JSON
+JOURNAL_NAME = CONTENT_JOURNAL.name
+
+# Сколько строк отправлять в один executemany
+BATCH_SIZE = 10000
+
+# Таблицы каталога — общая схема бота (database/sqlite_db.SCHEMA); здесь — только служебная таблица заливки
+SEED_SCHEMA = """
+    -- Хэши содержимого для инкрементальной заливки
+    CREATE TABLE IF NOT EXISTS seed_hashes (
+        tbl TEXT NOT NULL,
+        id TEXT NOT NULL,
+        hash INTEGER NOT NULL,
+        PRIMARY KEY (tbl, id)
+    ) WITHOUT ROWID;
+"""
+
+
+def _keywords_str(kw: Any) -> str:
+    return json.dumps(kw, ensure_ascii=False) if isinstance(kw, list) else (kw or "")
+
+
+# Ключевые слова (JSON-массив в колонке keywords) через пробел — для полнотекстового индекса
+_KEYWORDS_TEXT_SQL = (
+    "CASE WHEN json_valid(keywords) AND json_type(keywords) = 'array' "
+    "THEN (SELECT group_concat(value, ' ') FROM json_each(keywords)) ELSE keywords END"
+)
+
+# Текст поиска упражнения — как database/search_rules.exercise_text (в нижнем регистре по Unicode)
+_EXERCISE_TEXT_SQL = (
+    f"lower_u(coalesce(name, '') || ' ' || coalesce({_KEYWORDS_TEXT_SQL}, '') || ' ' || coalesce(description, ''))"
+)
+
+# FTS-таблицы прежних версий скрипта: поиск по ним не шёл, заменены триграммными
+_OBSOLETE_FTS = ("exercises_fts", "terminology_fts")
+
+# Если изменилась большая доля строк, FTS выгоднее пересобрать целиком
+FTS_REBUILD_RATIO = 0.2
+
+
+# Описание таблиц: файл, ключ массива в JSON, первичный ключ, колонки,
+# построение строки из объекта JSON и (опционально) FTS-индекс: таблица, токенизатор и колонки
+# (имя, SQL-выражение). Триграммные индексы находят подстроки — по правилам search_rules.
+TABLES: Dict[str, Dict[str, Any]] = {
+    "exercises": {
+        "file": "exercises.json",
+        "key": "exercises",
+        "pk": "id",
+        "columns": ("id", "name", "description", "link", "keywords"),
+        "row": lambda ex: (ex.get("id"), ex.get("name"), ex.get("description"), ex.get("link") or "",
+                           _keywords_str(ex.get("keywords"))),
+        "fts": {"table": "exercises_trgm", "tokenize": "trigram", "columns": (("text", _EXERCISE_TEXT_SQL),)},
+    },
+    "education": {
+        "file": "education.json",
+        "key": "materials",
+        "pk": "id",
+        "columns": ("id", "title", "description", "link", "category"),
+        "row": lambda m: (m.get("id"), m.get("title"), m.get("description"), m.get("link") or "",
+                          m.get("category") or ""),
+    },
+    "complexes": {
+        "file": "complexes.json",
+        "key": "complexes",
+        "pk": "id",
+        "columns": ("id", "name", "description", "structure", "duration_minutes"),
+        "row": lambda c: (c.get("id"), c.get("name"), c.get("description"), c.get("structure") or "",
+                          c.get("duration_minutes") or 0),
+        "fts": {"table": "complexes_fts", "tokenize": "unicode61", "columns": (("structure", "structure"),)},
+    },
+    "terminology": {
+        "file": "terminology.json",
+        "key": "terms",
+        "pk": "term",
+        "columns": ("term", "definition"),
+        "row": lambda t: (t.get("term"), t.get("definition") or ""),
+        "fts": {"table": "terminology_trgm", "tokenize": "trigram", "columns": (("text", "lower_u(term)"),)},
+    },
+}
+
+
+def iter_json_array(path: Path, key: str, chunk_size: int = 1 << 20) -> Iterator[Tuple[Any, str]]:
+    """
+    Потоково перебрать элементы массива: файл — либо массив, либо объект с массивом по ключу key.
+    Возвращает пары (элемент, его исходный текст). В памяти держится только текущий кусок файла.
+    """
+    if not path.exists():
+        return
+    decoder = json.JSONDecoder()
+    start_re = re.compile(r'^\s*\[|"' + re.escape(key) + r'"\s*:\s*\[')
+    with open(path, "r", encoding="utf-8") as f:
+        buf = f.read(chunk_size)
+        eof = not buf
+        # Найти начало массива
+        while True:
+            m = start_re.search(buf)
+            if m:
+                pos = m.end()
+                break
+            if eof:
+                return
+            more = f.read(chunk_size)
+            eof = not more
+            buf += more
+        while True:
+            # Пропустить пробелы и запятые между элементами
+            while pos < len(buf) and buf[pos] in " \t\r\n,":
+                pos += 1
+            if pos < len(buf) and buf[pos] == "]":
+                return
+            try:
+                if pos >= len(buf):
+                    raise json.JSONDecodeError("need more data", buf, pos)
+                start = pos
+                item, pos = decoder.raw_decode(buf, pos)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+                more = f.read(chunk_size)
+                eof = not more
+                buf = buf[pos:] + more
+                pos = 0
+                continue
+            yield item, buf[start:pos]
+
+
+def load_journal(path: Path) -> Dict[str, Dict[str, Optional[Dict[str, Any]]]]:
+    """
+    Правки из бота (content_journal.jsonl): таблица -> {ключ: запись или None — удалена}.
+    Последняя правка ключа побеждает; повреждённые строки пропускаются.
+    """
+    changes: Dict[str, Dict[str, Optional[Dict[str, Any]]]] = {}
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            lines = f.readlines()
+    except OSError:
+        return changes
+    for line in lines:
+        try:
+            change = json.loads(line)
+            table, key, record = change["kind"], str(change["key"]), change["record"]
+        except (ValueError, KeyError, TypeError):
+            continue
+        if table in TABLES and (record is None or isinstance(record, dict)):
+            changes.setdefault(table, {})[key] = record
+    return changes
+
+
+def with_journal(
+    items: Iterator[Tuple[Any, str]], pk: str, changes: Dict[str, Optional[Dict[str, Any]]]
+) -> Iterator[Tuple[Any, str]]:
+    """Поток записей JSON с наложенными правками: изменённые и удалённые заменяются, новые — в конце."""
+    for item, raw in items:
+        if isinstance(item, dict) and item.get(pk) is not None and str(item[pk]) in changes:
+            continue
+        yield item, raw
+    for record in changes.values():
+        if record is not None:
+            yield record, json.dumps(record, ensure_ascii=False, sort_keys=True)
+
+
+def _hash_text(text: str) -> int:
+    """64-битный хэш исходного текста записи (строка таблицы строится только для изменённых)."""
+    digest = hashlib.blake2b(text.encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "big", signed=True)
+
+
+def _chunks(rows: List[Any], size: int = BATCH_SIZE) -> Iterator[List[Any]]:
+    for i in range(0, len(rows), size):
+        yield rows[i:i + size]
+
+
+def _fts_tokenizers(conn: sqlite3.Connection) -> Set[str]:
+    """Доступные токенизаторы FTS5 (trigram — с SQLite 3.34); пусто, если FTS5 нет."""
+    available = set()
+    for tokenize in ("unicode61", "trigram"):
+        try:
+            conn.execute(f"CREATE VIRTUAL TABLE IF NOT EXISTS temp._fts5_probe USING fts5(x, tokenize='{tokenize}')")
+            conn.execute("DROP TABLE temp._fts5_probe")
+            available.add(tokenize)
+        except sqlite3.OperationalError:
+            pass
+    return available
+
+
+def _ensure_fts(conn: sqlite3.Connection, fts: Dict[str, Any]) -> bool:
+    """Создать FTS-таблицу. Возвращает True, если она только что создана (нужна полная сборка)."""
+    name = fts["table"]
+    exists = conn.execute("SELECT 1 FROM sqlite_master WHERE name = ?", (name,)).fetchone()
+    if exists:
+        return False
+    columns = ", ".join(col for col, _ in fts["columns"])
+    conn.execute(f"CREATE VIRTUAL TABLE {name} USING fts5({columns}, tokenize='{fts['tokenize']}')")
+    return True
+
+
+def seed_table(
+    conn: sqlite3.Connection,
+    table: str,
+    spec: Dict[str, Any],
+    items: Iterator[Tuple[Any, str]],
+    tokenizers: Set[str],
+) -> Dict[str, int]:
+    """Сравнить поток объектов с таблицей и применить разницу. Вызывать внутри транзакции."""
+    pk = spec["pk"]
+    columns = spec["columns"]
+    build_row: Callable[[Dict[str, Any]], Tuple[Any, ...]] = spec["row"]
+    fts_spec = spec.get("fts")
+    fts = fts_spec is not None and fts_spec["tokenize"] in tokenizers
+    fts_table = fts_spec["table"] if fts else ""
+    fts_full = _ensure_fts(conn, fts_spec) if fts else False
+
+    # Текущее состояние: id -> хэш (None — строка есть, но залита не этим скриптом)
+    existing: Dict[str, Optional[int]] = dict(conn.execute(
+        f"SELECT t.{pk}, h.hash FROM {table} t "
+        f"LEFT JOIN seed_hashes h ON h.tbl = ? AND h.id = t.{pk}",
+        (table,),
+    ))
+
+    # id -> строка и хэш; при повторе id в JSON побеждает последняя запись (как у UPSERT)
+    upserts: Dict[str, Tuple[Any, ...]] = {}
+    hashes: Dict[str, int] = {}
+    seen = set()
+    duplicates = 0
+    for item, raw in items:
+        if not isinstance(item, dict) or item.get(pk) is None:
+            continue
+        row_id = str(item[pk])
+        digest = _hash_text(raw)
+        if row_id in seen:
+            duplicates += 1
+        seen.add(row_id)
+        if row_id in existing and existing[row_id] == digest:
+            # Совпадает с базой (в том числе повтор, отменяющий прежнюю версию из этого же JSON)
+            upserts.pop(row_id, None)
+            hashes.pop(row_id, None)
+            continue
+        upserts[row_id] = (row_id,) + tuple(build_row(item)[1:])
+        hashes[row_id] = digest
+    inserted = sum(1 for row_id in upserts if row_id not in existing)
+    updated = len(upserts) - inserted
+
+    deleted_ids = [(row_id,) for row_id in existing if row_id not in seen]
+    changed = len(upserts) + len(deleted_ids)
+    if fts and not fts_full and changed > FTS_REBUILD_RATIO * max(len(existing), 1):
+        conn.execute(f"DELETE FROM {fts_table}")
+        fts_full = True
+
+    # Старые записи FTS для изменённых и удалённых строк (по rowid основной таблицы)
+    if fts and not fts_full:
+        stale = [(row_id,) for row_id in upserts if row_id in existing] + deleted_ids
+        for chunk in _chunks(stale):
+            conn.executemany(
+                f"DELETE FROM {fts_table} WHERE rowid = (SELECT rowid FROM {table} WHERE {pk} = ?)",
+                chunk,
             )
 
-    raw_edu = json.loads((DATA / "education.json").read_text(encoding="utf-8"))
-    for m in raw_edu.get("materials", []):
-        conn.execute(
-            "INSERT OR REPLACE INTO education (id, title, description, link, category) VALUES (?,?,?,?,?)",
-            (m.get("id"), m.get("title"), m.get("description"), m.get("link") or "", m.get("category") or ""),
+    placeholders = ",".join("?" * len(columns))
+    updates = ", ".join(f"{c} = excluded.{c}" for c in columns[1:])
+    for chunk in _chunks(list(upserts.values())):
+        # UPSERT сохраняет rowid строки — на него ссылается FTS
+        conn.executemany(
+            f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({placeholders}) "
+            f"ON CONFLICT({pk}) DO UPDATE SET {updates}",
+            chunk,
         )
+    for chunk in _chunks([(table, row_id, digest) for row_id, digest in hashes.items()]):
+        conn.executemany("INSERT OR REPLACE INTO seed_hashes (tbl, id, hash) VALUES (?,?,?)", chunk)
+    for chunk in _chunks(deleted_ids):
+        conn.executemany(f"DELETE FROM {table} WHERE {pk} = ?", chunk)
+        conn.executemany("DELETE FROM seed_hashes WHERE tbl = ? AND id = ?", [(table, i) for (i,) in chunk])
 
-    raw_comp = json.loads((DATA / "complexes.json").read_text(encoding="utf-8"))
-    for c in raw_comp.get("complexes", []):
-        conn.execute(
-            "INSERT OR REPLACE INTO complexes (id, name, description, structure, duration_minutes) VALUES (?,?,?,?,?)",
-            (c.get("id"), c.get("name"), c.get("description"), c.get("structure") or "", c.get("duration_minutes") or 0),
-        )
+    if fts:
+        fts_cols = ", ".join(col for col, _ in fts_spec["columns"])
+        fts_exprs = ", ".join(expr for _, expr in fts_spec["columns"])
+        insert_fts = f"INSERT INTO {fts_table} (rowid, {fts_cols}) SELECT rowid, {fts_exprs} FROM {table}"
+        if fts_full:
+            conn.execute(insert_fts)
+        else:
+            for chunk in _chunks(list(upserts)):
+                conn.executemany(f"{insert_fts} WHERE {pk} = ?", [(row_id,) for row_id in chunk])
 
-    raw_term = json.loads((DATA / "terminology.json").read_text(encoding="utf-8"))
-    for t in raw_term.get("terms", []):
-        conn.execute(
-            "INSERT OR REPLACE INTO terminology (term, definition) VALUES (?,?)",
-            (t.get("term"), t.get("definition") or ""),
-        )
+    return {
+        "inserted": inserted,
+        "updated": updated,
+        "deleted": len(deleted_ids),
+        "unchanged": len(seen) - len(upserts),
+        "duplicates": duplicates,
+    }
+
+
+def seed(data_dir: Path = DATA, db_path: Path = DB_PATH) -> Dict[str, Dict[str, int]]:
+    """Инкрементально синхронизировать БД с JSON-файлами (и журналом правок) в одной транзакции."""
+    db_path.parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(db_path, isolation_level=None, timeout=30)
+    try:
+        # WAL: читатели не блокируются на время заливки
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.executescript(SCHEMA + SEED_SCHEMA)
+        # Регистр по Unicode, как в database/search_rules.py (встроенный lower() — только ASCII)
+        conn.create_function("lower_u", 1, lambda s: (s or "").lower(), deterministic=True)
+        tokenizers = _fts_tokenizers(conn)
+        report = {}
+        journal = load_journal(data_dir / JOURNAL_NAME)
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            for name in _OBSOLETE_FTS:
+                conn.execute(f"DROP TABLE IF EXISTS {name}")
+            for table, spec in TABLES.items():
+                items = iter_json_array(data_dir / spec["file"], spec["key"])
+                if table in journal:
+                    items = with_journal(items, spec["pk"], journal[table])
+                report[table] = seed_table(conn, table, spec, items, tokenizers)
+            # Версия растёт в той же транзакции: бот сбросит кэши один раз, после COMMIT
+            if any(c["inserted"] or c["updated"] or c["deleted"] for c in report.values()):
+                conn.execute(BUMP_VERSION)
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+    finally:
+        conn.close()
+    return report
 
-    conn.commit()
-    conn.close()
-    print("SQLite заполнена из JSON.")
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Заполнение SQLite из JSON (инкрементально)")
+    parser.add_argument("--data", type=Path, default=DATA, help="папка с JSON-файлами")
+    parser.add_argument("--db", type=Path, default=DB_PATH, help="файл SQLite")
+    args = parser.parse_args()
+    started = time.perf_counter()
+    report = seed(args.data, args.db)
+    for table, counts in report.items():
+        print(f"{table}: " + ", ".join(f"{k}={v}" for k, v in counts.items()))
+    print(f"SQLite заполнена из JSON за {time.perf_counter() - started:.2f} с.")
 
 
 if __name__ == "__main__":
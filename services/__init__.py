@@ -0,0 +1,5 @@
+# -*- coding: utf-8 -*-
+"""
+Служебные компоненты бота: метрики и инфраструктура,
+общие для обработчиков и слоя данных.
+"""
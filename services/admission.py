@@ -0,0 +1,225 @@
+# -*- coding: utf-8 -*-
+"""
+Защита от флуда: допуск апдейтов к обработчикам (подключается к Application как
+concurrent_updates, свой экземпляр у каждого арендатора).
+Одновременно обрабатывается не больше ADMISSION_MAX_CONCURRENT апдейтов, апдейты одного
+пользователя — по очереди, в порядке поступления. Общий слот берётся после очереди
+пользователя: апдейт, ждущий предыдущий апдейт того же пользователя, слот не занимает.
+До обработчиков, а значит и до get_db():
+- повтор сообщения (или нажатия той же кнопки), пока предыдущее такое же ещё обрабатывается,
+  отбрасывается;
+- сообщения и нажатия кнопок сверх token bucket пользователя (ADMISSION_USER_RATE в секунду,
+  запас ADMISSION_USER_BURST) отбрасываются, а пользователь не чаще раза в
+  ADMISSION_NOTICE_INTERVAL сек получает готовый ответ SLOW_DOWN_TEXT.
+На отброшенное нажатие кнопки без такого ответа бот отвечает пустым answer(), чтобы
+у кнопки не крутился индикатор загрузки.
+Админы арендатора (admin_ids) не ограничиваются. Счётчики — в /metrics (группа admission).
+"""
+
+import asyncio
+import inspect
+import logging
+import sys
+import time
+from typing import Any, Awaitable, Dict, Hashable, Optional, Set, Tuple
+
+from telegram import Update
+from telegram.ext import BaseUpdateProcessor
+
+from config import (
+    ADMISSION_MAX_CONCURRENT,
+    ADMISSION_NOTICE_INTERVAL,
+    ADMISSION_USER_BURST,
+    ADMISSION_USER_RATE,
+)
+from services import metrics, tenants
+from services.outbound import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+SLOW_DOWN_TEXT = "⏳ Слишком много сообщений подряд. Подождите несколько секунд и повторите."
+
+# Сколько bucket пользователей держать, прежде чем чистить простаивающие
+_MAX_USER_BUCKETS = 10000
+
+DUPLICATE = "duplicates"
+THROTTLED = "throttled"
+
+# Семафор PTB (берётся до do_process_update) не ограничивает: общий лимит — свой, после очереди пользователя
+_UNLIMITED = sys.maxsize
+
+
+def _request(update: Update) -> Optional[Tuple[str, Hashable]]:
+    """
+    Что запросил пользователь: (вид, текст сообщения или callback_data); «» — без текста
+    (фото, стикер). None — апдейт не ограничивается (inline-запрос, правка сообщения).
+    """
+    if update.message is not None:
+        return "message", update.message.text or ""
+    if update.callback_query is not None:
+        return "callback", update.callback_query.data or ""
+    return None
+
+
+class _UserQueue:
+    """Очередь апдейтов одного пользователя: lock и сколько апдейтов его ждут или держат."""
+
+    __slots__ = ("lock", "users")
+
+    def __init__(self) -> None:
+        self.lock = asyncio.Lock()
+        self.users = 0
+
+
+class AdmissionProcessor(BaseUpdateProcessor):
+    """Допуск апдейтов: общий лимит одновременной обработки, очередь и token bucket пользователя."""
+
+    def __init__(
+        self,
+        scope: str = "",
+        max_concurrent: int = ADMISSION_MAX_CONCURRENT,
+        user_rate: float = ADMISSION_USER_RATE,
+        user_burst: float = ADMISSION_USER_BURST,
+        notice_interval: float = ADMISSION_NOTICE_INTERVAL,
+    ) -> None:
+        super().__init__(_UNLIMITED)
+        self._max_concurrent = max_concurrent
+        self._slots = asyncio.Semaphore(max_concurrent)
+        self._running = 0
+        self._user_rate = user_rate
+        self._user_burst = user_burst
+        self._notice_interval = notice_interval
+        self._buckets: Dict[int, TokenBucket] = {}
+        self._queues: Dict[int, _UserQueue] = {}
+        # (пользователь, вид, текст) апдейтов, которые сейчас обрабатываются
+        self._in_flight: Set[Tuple[int, str, Hashable]] = set()
+        self._noticed: Dict[int, float] = {}
+        self._notices: Set["asyncio.Task[None]"] = set()
+        self._stats = {
+            "admitted": 0, DUPLICATE: 0, THROTTLED: 0, "notices": 0, "answered": 0, "peak_concurrent": 0,
+        }
+        metrics.register(f"admission.{scope}" if scope else "admission", self.stats)
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        if self._notices:
+            await asyncio.gather(*self._notices, return_exceptions=True)
+
+    def _bucket(self, user_id: int) -> TokenBucket:
+        bucket = self._buckets.get(user_id)
+        if bucket is None:
+            if len(self._buckets) >= _MAX_USER_BUCKETS:
+                self._prune_buckets()
+            bucket = self._buckets[user_id] = TokenBucket(self._user_rate, self._user_burst)
+        return bucket
+
+    def _prune_buckets(self) -> None:
+        """Удалить bucket, которые давно не использовались (давно полные)."""
+        cutoff = time.monotonic() - max(60.0, self._user_burst / self._user_rate)
+        for user_id in [u for u, b in self._buckets.items() if b.updated < cutoff]:
+            del self._buckets[user_id]
+            self._noticed.pop(user_id, None)
+
+    def _admit(self, user_id: int, key: Optional[Tuple[int, str, Hashable]]) -> Optional[str]:
+        """None — апдейт допущен, иначе причина отказа (DUPLICATE, THROTTLED)."""
+        if key is not None and key in self._in_flight:
+            return DUPLICATE
+        if self._user_rate <= 0 or user_id in tenants.current().admin_ids:
+            return None
+        if self._bucket(user_id).take() > 0:
+            return THROTTLED
+        return None
+
+    def _notice_due(self, user_id: int) -> bool:
+        """Пора ли снова просить пользователя подождать (не чаще раза в notice_interval сек)."""
+        now = time.monotonic()
+        if now - self._noticed.get(user_id, float("-inf")) < self._notice_interval:
+            return False
+        self._noticed[user_id] = now
+        return True
+
+    def _reject(self, update: Update, user_id: int, verdict: str) -> None:
+        """
+        Ответ на отброшенный апдейт, в фоне: готовый ответ «подождите» (THROTTLED, если пора),
+        иначе на нажатие кнопки — answer() без текста, на сообщение — ничего.
+        """
+        query = update.callback_query
+        if verdict == THROTTLED and self._notice_due(user_id):
+            send = query.answer(SLOW_DOWN_TEXT) if query is not None else update.message.reply_text(SLOW_DOWN_TEXT)
+            counter = "notices"
+        elif query is not None:
+            send = query.answer()
+            counter = "answered"
+        else:
+            return
+        task = asyncio.get_running_loop().create_task(self._send_reply(send, counter))
+        self._notices.add(task)
+        task.add_done_callback(self._notices.discard)
+
+    async def _send_reply(self, send: Awaitable[Any], counter: str) -> None:
+        try:
+            await send
+            self._stats[counter] += 1
+        except Exception:
+            logger.debug("Не удалось ответить на отброшенный апдейт", exc_info=True)
+
+    def _user_queue(self, user_id: int) -> _UserQueue:
+        queue = self._queues.get(user_id)
+        if queue is None:
+            queue = self._queues[user_id] = _UserQueue()
+        queue.users += 1
+        return queue
+
+    async def _run(self, coroutine: Awaitable[Any]) -> None:
+        """Обработать апдейт, заняв общий слот."""
+        async with self._slots:
+            self._running += 1
+            self._stats["peak_concurrent"] = max(self._stats["peak_concurrent"], self._running)
+            try:
+                await coroutine
+            finally:
+                self._running -= 1
+
+    async def do_process_update(self, update: object, coroutine: Awaitable[Any]) -> None:
+        if not isinstance(update, Update) or update.effective_user is None:
+            self._stats["admitted"] += 1
+            await self._run(coroutine)
+            return
+        user = update.effective_user
+        request = _request(update)
+        # Повтором считается только тот же непустой текст или та же кнопка
+        key = (user.id, *request) if request is not None and request[1] else None
+        if request is not None:
+            verdict = self._admit(user.id, key)
+            if verdict is not None:
+                # Обработка не начиналась: закрываем корутину, чтобы не было «never awaited»
+                if inspect.iscoroutine(coroutine):
+                    coroutine.close()
+                self._stats[verdict] += 1
+                self._reject(update, user.id, verdict)
+                return
+        if key is not None:
+            self._in_flight.add(key)
+        self._stats["admitted"] += 1
+        queue = self._user_queue(user.id)
+        try:
+            # Сначала очередь пользователя, потом общий слот: ожидающий своей очереди слот не держит
+            async with queue.lock:
+                await self._run(coroutine)
+        finally:
+            queue.users -= 1
+            if not queue.users:
+                del self._queues[user.id]
+            if key is not None:
+                self._in_flight.discard(key)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            **self._stats,
+            "concurrent": self._running,
+            "max_concurrent": self._max_concurrent,
+            "queued_users": len(self._queues),
+            "users": len(self._buckets),
+        }
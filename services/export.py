@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+"""
+Потоковая выгрузка подписчиков в сжатый CSV.
+Строки пишутся по одной через csv.writer в gzip поверх временного файла:
+в памяти одновременно только текущая пачка строк, сколько бы ни было пользователей.
+Попутно собирается короткий текстовый предпросмотр для ответа в чате.
+"""
+
+import csv
+import gzip
+import io
+import tempfile
+from typing import IO, Any, Dict, Iterable, List, Tuple
+
+from services import metrics
+
+CSV_COLUMNS = ("user_id", "username", "first_name", "last_name", "first_seen", "last_seen")
+# Временный файл остаётся в памяти до этого размера, дальше — на диск
+SPOOL_MAX_BYTES = 1024 * 1024
+PREVIEW_MAX_CHARS = 3500
+
+
+def user_line(i: int, u: Dict[str, Any]) -> str:
+    """Строка списка /users: «N. Имя Фамилия @username (id: ...)»."""
+    name = " ".join(filter(None, (u.get("first_name"), u.get("last_name"))))
+    username = u.get("username") or ""
+    line = f"{i}. {name or '—'}"
+    if username:
+        line += f" @{username}"
+    return line + f" (id: {u.get('user_id', '')})"
+
+
+def export_users_csv_gz(
+    users: Iterable[Dict[str, Any]], preview_max_chars: int = PREVIEW_MAX_CHARS
+) -> Tuple[IO[bytes], int, List[str], bool]:
+    """
+    Записать пользователей в gzip-CSV. Возвращает (файл, количество, строки
+    предпросмотра, полон ли предпросмотр). Файл открыт и перемотан в начало —
+    его закрывает вызывающий. Блокирующая функция: из обработчиков — через asyncio.to_thread.
+    """
+    out = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_BYTES)
+    preview: List[str] = []
+    preview_len = 0
+    complete = True
+    count = 0
+    try:
+        with gzip.GzipFile(filename="users.csv", mode="wb", fileobj=out, mtime=0) as gz:
+            text = io.TextIOWrapper(gz, encoding="utf-8", newline="")
+            writer = csv.writer(text)
+            writer.writerow(CSV_COLUMNS)
+            for u in users:
+                count += 1
+                writer.writerow([u.get(col, "") for col in CSV_COLUMNS])
+                if complete:
+                    line = user_line(count, u)
+                    if preview_len + len(line) + 1 > preview_max_chars:
+                        complete = False
+                    else:
+                        preview.append(line)
+                        preview_len += len(line) + 1
+            text.flush()
+            text.detach()
+    except BaseException:
+        out.close()
+        raise
+    metrics.incr("export.users_rows", count)
+    metrics.incr("export.users_bytes", out.tell())
+    out.seek(0)
+    return out, count, preview, complete
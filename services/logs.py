@@ -0,0 +1,191 @@
+# -*- coding: utf-8 -*-
+"""
+Неблокирующее логирование: вызов logger.info() в цикле событий только кладёт запись
+в очередь (QueueHandler), а форматирование и запись в stdout выполняет отдельный
+поток (QueueListener). Медленный приёмник логов больше не задерживает апдейты.
+До очереди записи проходят два фильтра:
+- семплирование INFO и ниже от шумных логгеров (LOG_SAMPLED_LOGGERS, например httpx,
+  который пишет строку на каждый запрос к Bot API) с долей LOG_INFO_SAMPLE_RATE;
+- ограничение повторов WARNING и выше: одно и то же место (логгер, уровень, шаблон
+  сообщения) — не больше LOG_ERROR_BURST записей за LOG_ERROR_WINDOW секунд;
+  число подавленных дописывается к следующей пропущенной записи.
+Формат: text (как раньше) или json (строка JSON на запись, с trace_id из трассировки).
+Если очередь переполнена, запись отбрасывается и учитывается в метриках.
+"""
+
+import atexit
+import json
+import logging
+import logging.handlers
+import queue
+import random
+import sys
+import time
+from typing import Any, Dict, Optional, Tuple
+
+from config import (
+    LOG_ERROR_BURST,
+    LOG_ERROR_WINDOW,
+    LOG_FORMAT,
+    LOG_INFO_SAMPLE_RATE,
+    LOG_LEVEL,
+    LOG_QUEUE_SIZE,
+    LOG_SAMPLED_LOGGERS,
+)
+from services import metrics, tracing
+
+TEXT_FORMAT = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+
+_stats = {"enqueued": 0, "dropped": 0, "sampled_out": 0, "rate_limited": 0}
+_listener: Optional[logging.handlers.QueueListener] = None
+_queue: Optional["queue.Queue[logging.LogRecord]"] = None
+_format = LOG_FORMAT
+
+
+class SamplingFilter(logging.Filter):
+    """Пропускает долю rate записей уровня INFO и ниже от логгеров из prefixes."""
+
+    def __init__(self, rate: float, prefixes: Tuple[str, ...]) -> None:
+        super().__init__()
+        self.rate = rate
+        self.prefixes = prefixes
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if self.rate >= 1 or record.levelno > logging.INFO:
+            return True
+        name = record.name
+        if not any(name == p or name.startswith(p + ".") for p in self.prefixes):
+            return True
+        if random.random() < self.rate:
+            return True
+        _stats["sampled_out"] += 1
+        return False
+
+
+class RateLimitFilter(logging.Filter):
+    """Не больше burst записей WARNING+ с одного места за window секунд."""
+
+    MAX_KEYS = 10000
+
+    def __init__(self, burst: int, window: float) -> None:
+        super().__init__()
+        self.burst = burst
+        self.window = window
+        # ключ -> [начало окна, записей в окне, подавлено]
+        self._seen: Dict[Tuple[str, int, Any], list] = {}
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno < logging.WARNING or self.burst <= 0:
+            return True
+        key = (record.name, record.levelno, record.msg)
+        now = time.monotonic()
+        state = self._seen.get(key)
+        if state is None or now - state[0] >= self.window:
+            if len(self._seen) >= self.MAX_KEYS:
+                self._seen.clear()
+            suppressed = state[2] if state is not None else 0
+            self._seen[key] = [now, 1, 0]
+            if suppressed:
+                record.suppressed = suppressed
+            return True
+        if state[1] < self.burst:
+            state[1] += 1
+            return True
+        state[2] += 1
+        _stats["rate_limited"] += 1
+        return False
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    """
+    Кладёт запись в очередь без форматирования: в вызывающем потоке только
+    подставляются аргументы и запоминается trace_id (ContextVar в потоке записи недоступен).
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record.msg = record.getMessage()
+        record.args = None
+        record.trace_id = tracing.current_trace_id()
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+            _stats["enqueued"] += 1
+        except queue.Full:
+            _stats["dropped"] += 1
+
+
+class JsonFormatter(logging.Formatter):
+    """Строка JSON на запись: время, уровень, логгер, сообщение, trace_id, исключение."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        data: Dict[str, Any] = {
+            "time": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        trace_id = getattr(record, "trace_id", None)
+        if trace_id:
+            data["trace_id"] = trace_id
+        suppressed = getattr(record, "suppressed", 0)
+        if suppressed:
+            data["suppressed"] = suppressed
+        if record.exc_info:
+            data["exc"] = self.formatException(record.exc_info)
+        return json.dumps(data, ensure_ascii=False)
+
+
+class TextFormatter(logging.Formatter):
+    """Прежний текстовый формат; подавленные повторы — в конце сообщения."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        text = super().format(record)
+        suppressed = getattr(record, "suppressed", 0)
+        if suppressed:
+            text += f" (ещё {suppressed} таких же записей подавлено)"
+        return text
+
+
+def make_formatter(fmt: str = LOG_FORMAT) -> logging.Formatter:
+    return JsonFormatter() if fmt == "json" else TextFormatter(TEXT_FORMAT)
+
+
+def setup_logging(stream: Any = None, fmt: str = LOG_FORMAT, level: str = LOG_LEVEL) -> None:
+    """
+    Настроить корневой логгер: фильтры и очередь в вызывающем потоке,
+    форматирование и запись в stream (по умолчанию stdout) — в фоновом потоке.
+    """
+    global _listener, _queue, _format
+    stop_logging()
+    _format = fmt
+    output = logging.StreamHandler(stream or sys.stdout)
+    output.setFormatter(make_formatter(fmt))
+    _queue = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+    handler = _QueueHandler(_queue)
+    handler.addFilter(SamplingFilter(LOG_INFO_SAMPLE_RATE, LOG_SAMPLED_LOGGERS))
+    handler.addFilter(RateLimitFilter(LOG_ERROR_BURST, LOG_ERROR_WINDOW))
+    root = logging.getLogger()
+    for h in root.handlers[:]:
+        root.removeHandler(h)
+    root.addHandler(handler)
+    root.setLevel(level.upper())
+    _listener = logging.handlers.QueueListener(_queue, output)
+    _listener.start()
+
+
+def stop_logging() -> None:
+    """Дописать очередь и остановить поток записи (блокирующая)."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def stats() -> Dict[str, Any]:
+    return {**_stats, "queued": _queue.qsize() if _queue is not None else 0, "format": _format}
+
+
+atexit.register(stop_logging)
+metrics.register("logging", stats)
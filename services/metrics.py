@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+"""
+Простые метрики процесса: счётчики и «поставщики» статистики.
+Компоненты (кэш, очереди и т.д.) регистрируют функцию, возвращающую словарь,
+а админ-команда /metrics собирает всё в один отчёт.
+"""
+
+import html
+import threading
+from collections import defaultdict, deque
+from typing import Any, Callable, Deque, Dict
+
+_lock = threading.Lock()
+_counters: Dict[str, int] = defaultdict(int)
+_providers: Dict[str, Callable[[], Dict[str, Any]]] = {}
+
+
+class LatencyWindow:
+    """
+    Последние size замеров длительности (в секундах) и их перцентили.
+    Замеры пишут и рабочие потоки, поэтому окно копируется под lock.
+    """
+
+    def __init__(self, size: int = 1000) -> None:
+        self._values: Deque[float] = deque(maxlen=size)
+        self._lock = threading.Lock()
+        self.count = 0
+
+    def observe(self, seconds: float) -> None:
+        with self._lock:
+            self._values.append(seconds)
+            self.count += 1
+
+    def percentiles(self) -> Dict[str, float]:
+        """p50/p95/p99 и максимум в миллисекундах по текущему окну."""
+        with self._lock:
+            values = list(self._values)
+        values.sort()
+        if not values:
+            return {}
+        n = len(values)
+        return {
+            "p50_ms": values[n // 2] * 1000,
+            "p95_ms": values[min(n - 1, int(n * 0.95))] * 1000,
+            "p99_ms": values[min(n - 1, int(n * 0.99))] * 1000,
+            "max_ms": values[-1] * 1000,
+        }
+
+
+def incr(name: str, n: int = 1) -> None:
+    """Увеличить счётчик name на n."""
+    with _lock:
+        _counters[name] += n
+
+
+def register(name: str, provider: Callable[[], Dict[str, Any]]) -> None:
+    """Зарегистрировать поставщика статистики (повторная регистрация заменяет старого)."""
+    _providers[name] = provider
+
+
+def snapshot() -> Dict[str, Dict[str, Any]]:
+    """Срез всех метрик: {группа: {имя: значение}}."""
+    result: Dict[str, Dict[str, Any]] = {}
+    with _lock:
+        if _counters:
+            result["counters"] = dict(sorted(_counters.items()))
+    for name, provider in list(_providers.items()):
+        try:
+            result[name] = provider()
+        except Exception as e:  # отчёт не должен падать из-за одного компонента
+            result[name] = {"error": str(e)}
+    return result
+
+
+def format_report() -> str:
+    """Текстовый отчёт для админ-команды /metrics."""
+    lines = ["📊 <b>Метрики</b>"]
+    for group, values in snapshot().items():
+        lines.append(f"\n<b>{group}</b>")
+        for key, value in values.items():
+            if isinstance(value, float):
+                value = f"{value:.3f}"
+            lines.append(f"• {key}: {html.escape(str(value))}")
+    return "\n".join(lines)
@@ -0,0 +1,228 @@
+# -*- coding: utf-8 -*-
+"""
+Исходящие запросы к Bot API: ограничение частоты и повторы.
+Все вызовы reply_text / edit_message_text / send_message проходят через OutboundLimiter
+(подключается к Application как rate_limiter): общий и поканальные token bucket,
+интерактивные ответы обслуживаются раньше фоновых рассылок, RetryAfter и сетевые
+ошибки обрабатываются повтором с ожиданием, а не пробрасываются пользователю.
+"""
+
+import asyncio
+import logging
+import random
+import time
+from datetime import timedelta
+from typing import Any, Callable, Coroutine, Dict, Optional, Union
+
+from telegram.error import BadRequest, NetworkError, RetryAfter, TimedOut
+from telegram.ext import BaseRateLimiter
+
+from config import (
+    OUTBOUND_CHAT_BURST,
+    OUTBOUND_CHAT_RATE,
+    OUTBOUND_GLOBAL_RATE,
+    OUTBOUND_GROUP_RATE,
+    OUTBOUND_MAX_RETRIES,
+)
+from services import metrics, tracing
+
+logger = logging.getLogger(__name__)
+
+# Приоритеты: передаются через rate_limit_args={"priority": BACKGROUND}
+INTERACTIVE = "interactive"
+BACKGROUND = "background"
+
+# Методы, на которые распространяются лимиты Telegram на отправку сообщений
+_LIMITED_ENDPOINTS = frozenset({
+    "sendMessage",
+    "editMessageText",
+    "sendDocument",
+    "sendPhoto",
+    "copyMessage",
+    "forwardMessage",
+})
+
+# Сколько поканальных bucket держать, прежде чем чистить простаивающие
+_MAX_CHAT_BUCKETS = 10000
+
+
+class TokenBucket:
+    """Token bucket: rate токенов в секунду, не больше capacity в запасе."""
+
+    __slots__ = ("rate", "capacity", "tokens", "updated")
+
+    def __init__(self, rate: float, capacity: float) -> None:
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def take(self) -> float:
+        """Взять токен. Возвращает 0, если удалось, иначе сколько секунд подождать."""
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def pause(self, seconds: float) -> None:
+        """Запретить отправку на seconds секунд (после RetryAfter)."""
+        self.tokens = -seconds * self.rate
+        self.updated = time.monotonic()
+
+
+def _seconds(value: Union[int, float, timedelta]) -> float:
+    return value.total_seconds() if isinstance(value, timedelta) else float(value)
+
+
+class OutboundLimiter(BaseRateLimiter[Dict[str, Any]]):
+    """Центральный диспетчер исходящих запросов."""
+
+    def __init__(
+        self,
+        scope: str = "",
+        global_rate: float = OUTBOUND_GLOBAL_RATE,
+        chat_rate: float = OUTBOUND_CHAT_RATE,
+        group_rate: float = OUTBOUND_GROUP_RATE,
+        chat_burst: float = OUTBOUND_CHAT_BURST,
+        max_retries: int = OUTBOUND_MAX_RETRIES,
+    ) -> None:
+        self._global = TokenBucket(global_rate, global_rate)
+        self._chat_rate = chat_rate
+        self._group_rate = group_rate
+        self._chat_burst = chat_burst
+        self._max_retries = max_retries
+        self._chats: Dict[Any, TokenBucket] = {}
+        self._waiting = {INTERACTIVE: 0, BACKGROUND: 0}
+        self._in_flight = 0
+        self._latency = metrics.LatencyWindow()
+        self.sent = 0
+        self.retries = 0
+        self.flood_waits = 0
+        self.failures = 0
+        metrics.register(f"outbound.{scope}" if scope else "outbound", self.stats)
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        pass
+
+    def _chat_bucket(self, chat_id: Any) -> TokenBucket:
+        bucket = self._chats.get(chat_id)
+        if bucket is None:
+            if len(self._chats) >= _MAX_CHAT_BUCKETS:
+                self._prune_chat_buckets()
+            # Личные чаты — положительные id; группы и каналы ограничены строже
+            private = isinstance(chat_id, int) and chat_id > 0
+            bucket = TokenBucket(self._chat_rate if private else self._group_rate, self._chat_burst)
+            self._chats[chat_id] = bucket
+        return bucket
+
+    def _prune_chat_buckets(self) -> None:
+        """Удалить bucket, которые давно не использовались (давно полные)."""
+        cutoff = time.monotonic() - 60
+        for chat_id in [c for c, b in self._chats.items() if b.updated < cutoff]:
+            del self._chats[chat_id]
+
+    async def _acquire(self, priority: str, chat_id: Any) -> None:
+        """Дождаться токенов чата и общего лимита; фоновые ждут, пока есть интерактивные."""
+        if chat_id is not None:
+            bucket = self._chat_bucket(chat_id)
+            while True:
+                wait = bucket.take()
+                if not wait:
+                    break
+                await asyncio.sleep(wait)
+        self._waiting[priority] += 1
+        try:
+            while True:
+                if priority == BACKGROUND and self._waiting[INTERACTIVE]:
+                    await asyncio.sleep(1 / self._global.rate)
+                    continue
+                wait = self._global.take()
+                if not wait:
+                    return
+                await asyncio.sleep(wait)
+        finally:
+            self._waiting[priority] -= 1
+
+    async def process_request(
+        self,
+        callback: Callable[..., Coroutine[Any, Any, Union[bool, Dict[str, Any], list]]],
+        args: Any,
+        kwargs: Dict[str, Any],
+        endpoint: str,
+        data: Dict[str, Any],
+        rate_limit_args: Optional[Dict[str, Any]],
+    ) -> Union[bool, Dict[str, Any], list]:
+        priority = (rate_limit_args or {}).get("priority", INTERACTIVE)
+        limited = endpoint in _LIMITED_ENDPOINTS
+        chat_id = data.get("chat_id") if limited else None
+        with tracing.span(f"bot.{endpoint}", chat_id=chat_id, priority=priority) as s:
+            return await self._send(callback, args, kwargs, endpoint, s, priority, limited, chat_id)
+
+    async def _send(
+        self,
+        callback: Callable[..., Coroutine[Any, Any, Union[bool, Dict[str, Any], list]]],
+        args: Any,
+        kwargs: Dict[str, Any],
+        endpoint: str,
+        s: Any,
+        priority: str,
+        limited: bool,
+        chat_id: Any,
+    ) -> Union[bool, Dict[str, Any], list]:
+        start = time.monotonic()
+        attempt = 0
+        while True:
+            if limited:
+                await self._acquire(priority, chat_id)
+                # Ожидание в очереди лимитов — отдельно от времени самого запроса
+                s.set(queued_ms=round((time.monotonic() - start) * 1000, 3), attempts=attempt + 1)
+            self._in_flight += 1
+            try:
+                result = await callback(*args, **kwargs)
+            except RetryAfter as e:
+                delay = _seconds(e.retry_after)
+                self.flood_waits += 1
+                # Лимит мог сработать на конкретный чат или на бота целиком
+                (self._chat_bucket(chat_id) if chat_id is not None else self._global).pause(delay)
+                if attempt >= self._max_retries:
+                    self.failures += 1
+                    raise
+                logger.warning("Flood control на %s: повтор через %.1f с", endpoint, delay)
+                if not limited:
+                    await asyncio.sleep(delay)
+            except (BadRequest, TimedOut):
+                # Ошибка запроса не исправится повтором; по таймауту сообщение могло уйти
+                self.failures += 1
+                raise
+            except NetworkError:
+                if attempt >= self._max_retries:
+                    self.failures += 1
+                    raise
+                await asyncio.sleep(min(30.0, 0.5 * 2 ** attempt) * (1 + random.random() / 2))
+            else:
+                self.sent += 1
+                self._latency.observe(time.monotonic() - start)
+                return result
+            finally:
+                self._in_flight -= 1
+            attempt += 1
+            self.retries += 1
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "queued_interactive": self._waiting[INTERACTIVE],
+            "queued_background": self._waiting[BACKGROUND],
+            "in_flight": self._in_flight,
+            "sent": self.sent,
+            "retries": self.retries,
+            "flood_waits": self.flood_waits,
+            "failures": self.failures,
+            "chat_buckets": len(self._chats),
+            **self._latency.percentiles(),
+        }
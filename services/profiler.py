@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+"""
+Семплирующий профилировщик процесса (запускается админ-командой /profile).
+Отдельный поток раз в interval секунд снимает стеки всех потоков через
+sys._current_frames() и считает одинаковые стеки. Пока профилирование не запущено,
+потока нет и накладных расходов тоже нет; во время работы стоимость — один
+обход стеков за интервал, код бота не инструментируется.
+Результат: самые «горячие» функции (собственное и общее время в семплах) и
+collapsed stacks («a;b;c N») для flamegraph.pl, speedscope и подобных.
+"""
+
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from types import CodeType, FrameType
+from typing import Dict, List, Optional, Tuple
+
+from config import BASE_DIR
+
+_BASE = str(BASE_DIR) + os.sep
+
+
+def _code_label(code: CodeType) -> str:
+    """«функция (файл:строка)»; пути проекта — относительные, сторонних библиотек — коротко."""
+    path = code.co_filename
+    if path.startswith(_BASE):
+        path = path[len(_BASE):]
+    else:
+        parts = path.replace("\\", "/").split("/")
+        path = "/".join(parts[-2:])
+    return f"{code.co_name} ({path}:{code.co_firstlineno})".replace(";", ",")
+
+
+class SamplingProfiler:
+    """Сбор стеков всех потоков (кроме собственного) с заданным интервалом."""
+
+    def __init__(self, interval: float = 0.005) -> None:
+        self.interval = interval
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self.started_at = 0.0
+        self.duration = 0.0
+        self._labels: Dict[CodeType, str] = {}
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self) -> None:
+        self._stop.clear()
+        self.started_at = time.monotonic()
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Остановить сбор и дождаться потока (блокирующая)."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.duration = time.monotonic() - self.started_at
+
+    def _label(self, code: CodeType) -> str:
+        label = self._labels.get(code)
+        if label is None:
+            label = self._labels[code] = _code_label(code)
+        return label
+
+    def _stack(self, frame: Optional[FrameType]) -> List[str]:
+        stack = []
+        while frame is not None:
+            stack.append(self._label(frame.f_code))
+            frame = frame.f_back
+        stack.reverse()
+        return stack
+
+    def _run(self) -> None:
+        own = threading.get_ident()
+        names = {}
+        while not self._stop.wait(self.interval):
+            for thread in threading.enumerate():
+                names[thread.ident] = thread.name
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                stack = [names.get(ident, str(ident))] + self._stack(frame)
+                self.stacks[tuple(stack)] += 1
+            self.samples += 1
+
+    def collapsed(self) -> str:
+        """Стеки в формате collapsed: «поток;внешняя;...;внутренняя N», по строке на стек."""
+        return "".join(f"{';'.join(stack)} {n}\n" for stack, n in self.stacks.most_common())
+
+    def top(self, limit: int = 15, thread: Optional[str] = None) -> List[Tuple[str, int, int]]:
+        """
+        Функции по собственному времени: (функция, семплов на вершине стека, семплов в стеке).
+        thread — учитывать только поток с этим именем (например, MainThread с циклом событий).
+        """
+        own: Counter = Counter()
+        total: Counter = Counter()
+        for stack, n in self.stacks.items():
+            if thread is not None and stack[0] != thread:
+                continue
+            frames = stack[1:]
+            if not frames:
+                continue
+            own[frames[-1]] += n
+            for label in set(frames):
+                total[label] += n
+        return [(label, n, total[label]) for label, n in own.most_common(limit)]
@@ -0,0 +1,289 @@
+# -*- coding: utf-8 -*-
+"""
+Аналитика поиска: что ищут участники и какие запросы ничего не находят.
+На горячем пути record() только добавляет кортеж в кольцевой буфер (deque с maxlen) —
+без нормализации, блокировок и ввода-вывода. Фоновая задача раз в
+SEARCH_STATS_FLUSH_INTERVAL секунд забирает события, считает агрегаты по дням
+(запрос, число поисков, из них пустых) и дописывает их в хранилище в рабочем потоке
+(SEARCH_STATS_STORE=off — агрегаты только в памяти процесса, за последние MEMORY_DAYS дней).
+Задержки поиска — в окнах LatencyWindow по видам поиска. Отчёт — админ-команда /searchstats.
+У каждого арендатора (services/tenants.py) свой буфер и свои файлы статистики.
+"""
+
+import asyncio
+import json
+import logging
+import sqlite3
+import threading
+import time
+from collections import defaultdict, deque
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any, Deque, Dict, Iterable, List, Optional, Tuple
+
+from config import (
+    SEARCH_STATS_BUFFER,
+    SEARCH_STATS_DB_PATH,
+    SEARCH_STATS_FLUSH_INTERVAL,
+    SEARCH_STATS_JSONL,
+    SEARCH_STATS_STORE,
+)
+from database.cache import normalize_query
+from services import metrics
+from services.metrics import LatencyWindow
+from services.tenants import Tenant, TenantLocal
+
+logger = logging.getLogger(__name__)
+
+# Запросы длиннее обрезаются: в агрегатах важна суть, а не вставленный абзац
+MAX_QUERY_CHARS = 100
+
+# Сколько дней агрегатов держать в памяти при SEARCH_STATS_STORE=off
+MEMORY_DAYS = 31
+
+# (время, вид поиска, запрос как ввёл пользователь, найдено результатов, длительность в сек)
+Event = Tuple[float, str, str, int, float]
+# (день, вид, нормализованный запрос) -> [поисков, пустых, последний раз]
+Aggregates = Dict[Tuple[str, str, str], List[float]]
+
+
+def _aggregate(events: List[Event], latency: Dict[str, LatencyWindow]) -> Aggregates:
+    aggregates: Aggregates = {}
+    for at, kind, query, results, seconds in events:
+        latency[kind].observe(seconds)
+        q = normalize_query(query)[:MAX_QUERY_CHARS]
+        if not q:
+            continue
+        day = datetime.utcfromtimestamp(at).strftime("%Y-%m-%d")
+        row = aggregates.setdefault((day, kind, q), [0, 0, 0.0])
+        row[0] += 1
+        row[1] += 0 if results else 1
+        row[2] = max(row[2], at)
+    return aggregates
+
+
+class SqliteStatsStore:
+    """Агрегаты по дням в SQLite: одна строка на (день, вид поиска, запрос)."""
+
+    def __init__(self, path: Path) -> None:
+        self._path = path
+
+    def _conn(self) -> sqlite3.Connection:
+        self._path.parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(self._path, timeout=5)
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS search_queries ("
+            " day TEXT NOT NULL, kind TEXT NOT NULL, query TEXT NOT NULL,"
+            " searches INTEGER NOT NULL, empty INTEGER NOT NULL, last_at REAL NOT NULL,"
+            " PRIMARY KEY (day, kind, query)) WITHOUT ROWID"
+        )
+        return conn
+
+    def write(self, aggregates: Aggregates) -> None:
+        conn = self._conn()
+        try:
+            with conn:
+                conn.executemany(
+                    "INSERT INTO search_queries (day, kind, query, searches, empty, last_at) "
+                    "VALUES (?,?,?,?,?,?) ON CONFLICT(day, kind, query) DO UPDATE SET "
+                    "searches = searches + excluded.searches, empty = empty + excluded.empty, "
+                    "last_at = max(last_at, excluded.last_at)",
+                    [(*key, *row) for key, row in aggregates.items()],
+                )
+        finally:
+            conn.close()
+
+    def top(self, since: str, limit: int, empty_only: bool) -> List[Tuple[str, str, int, int]]:
+        """(вид, запрос, поисков, пустых) с дня since, самые частые первыми."""
+        conn = self._conn()
+        try:
+            return conn.execute(
+                "SELECT kind, query, sum(searches) AS n, sum(empty) AS e FROM search_queries "
+                "WHERE day >= ? GROUP BY kind, query "
+                f"{'HAVING e > 0 ORDER BY e DESC' if empty_only else 'ORDER BY n DESC'}, query LIMIT ?",
+                (since, limit),
+            ).fetchall()
+        finally:
+            conn.close()
+
+
+def _top(
+    rows: Iterable[Tuple[str, str, str, int, int]], since: str, limit: int, empty_only: bool
+) -> List[Tuple[str, str, int, int]]:
+    """Сложить строки (день, вид, запрос, поисков, пустых) с дня since и взять самые частые."""
+    totals: Dict[Tuple[str, str], List[int]] = defaultdict(lambda: [0, 0])
+    for day, kind, query, searches, empty in rows:
+        if day >= since:
+            total = totals[(kind, query)]
+            total[0] += searches
+            total[1] += empty
+    result = [(kind, query, n, e) for (kind, query), (n, e) in totals.items() if e or not empty_only]
+    result.sort(key=lambda r: (-(r[3] if empty_only else r[2]), r[1]))
+    return result[:limit]
+
+
+class JsonlStatsStore:
+    """Агрегаты каждого сброса — строками JSON в конец файла; отчёт суммирует их."""
+
+    def __init__(self, path: Path) -> None:
+        self._path = path
+
+    def write(self, aggregates: Aggregates) -> None:
+        self._path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self._path, "a", encoding="utf-8") as f:
+            for (day, kind, query), (searches, empty, last_at) in aggregates.items():
+                f.write(json.dumps(
+                    {"day": day, "kind": kind, "query": query, "searches": searches,
+                     "empty": empty, "last_at": last_at},
+                    ensure_ascii=False,
+                ) + "\n")
+
+    def top(self, since: str, limit: int, empty_only: bool) -> List[Tuple[str, str, int, int]]:
+        rows = []
+        try:
+            with open(self._path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        row = json.loads(line)
+                    except ValueError:
+                        continue
+                    rows.append((row.get("day", ""), row["kind"], row["query"], row["searches"], row["empty"]))
+        except OSError:
+            return []
+        return _top(rows, since, limit, empty_only)
+
+
+class MemoryStatsStore:
+    """Агрегаты в памяти процесса (до перезапуска): дни старше MEMORY_DAYS отбрасываются."""
+
+    def __init__(self) -> None:
+        self._aggregates: Aggregates = {}
+        self._lock = threading.Lock()
+
+    def write(self, aggregates: Aggregates) -> None:
+        oldest = (datetime.utcnow() - timedelta(days=MEMORY_DAYS - 1)).strftime("%Y-%m-%d")
+        with self._lock:
+            for key, (searches, empty, last_at) in aggregates.items():
+                row = self._aggregates.setdefault(key, [0, 0, 0.0])
+                row[0] += searches
+                row[1] += empty
+                row[2] = max(row[2], last_at)
+            for key in [k for k in self._aggregates if k[0] < oldest]:
+                del self._aggregates[key]
+
+    def top(self, since: str, limit: int, empty_only: bool) -> List[Tuple[str, str, int, int]]:
+        with self._lock:
+            rows = [(*key, int(searches), int(empty)) for key, (searches, empty, _) in self._aggregates.items()]
+        return _top(rows, since, limit, empty_only)
+
+
+def _make_store(tenant: Tenant) -> Any:
+    if SEARCH_STATS_STORE == "sqlite":
+        return SqliteStatsStore(tenant.path(SEARCH_STATS_DB_PATH))
+    if SEARCH_STATS_STORE == "jsonl":
+        return JsonlStatsStore(tenant.path(SEARCH_STATS_JSONL))
+    return MemoryStatsStore()
+
+
+class SearchStats:
+    """Буфер событий, окна задержек и хранилище агрегатов одного арендатора."""
+
+    def __init__(self, store: Any) -> None:
+        self.store = store
+        self._buffer: Deque[Event] = deque(maxlen=SEARCH_STATS_BUFFER)
+        self._latency: Dict[str, LatencyWindow] = defaultdict(LatencyWindow)
+        self._stats = {"recorded": 0, "dropped": 0, "flushed_events": 0, "flushes": 0, "errors": 0}
+        self._flush_lock = threading.Lock()
+        self._task: Optional["asyncio.Task[None]"] = None
+
+    def record(self, kind: str, query: str, results: int, seconds: float) -> None:
+        if len(self._buffer) == SEARCH_STATS_BUFFER:
+            # Буфер полон: deque вытеснит самое старое событие
+            self._stats["dropped"] += 1
+        self._buffer.append((time.time(), kind, query, results, seconds))
+        self._stats["recorded"] += 1
+
+    def _drain(self) -> List[Event]:
+        events = []
+        while True:
+            try:
+                events.append(self._buffer.popleft())
+            except IndexError:
+                return events
+
+    def flush(self) -> int:
+        with self._flush_lock:
+            events = self._drain()
+            if not events:
+                return 0
+            aggregates = _aggregate(events, self._latency)
+            if aggregates:
+                try:
+                    self.store.write(aggregates)
+                except (sqlite3.Error, OSError):
+                    logger.exception("Не удалось сохранить статистику поиска")
+                    self._stats["errors"] += 1
+            self._stats["flushes"] += 1
+            self._stats["flushed_events"] += len(events)
+            return len(events)
+
+    def latency(self) -> Dict[str, Dict[str, float]]:
+        return {kind: window.percentiles() for kind, window in sorted(self._latency.items())}
+
+    def start(self) -> None:
+        async def _loop() -> None:
+            while True:
+                await asyncio.sleep(SEARCH_STATS_FLUSH_INTERVAL)
+                await asyncio.to_thread(self.flush)
+
+        self._task = asyncio.get_running_loop().create_task(_loop())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        await asyncio.to_thread(self.flush)
+
+    def stats(self) -> Dict[str, Any]:
+        return {**self._stats, "buffered": len(self._buffer), "store": SEARCH_STATS_STORE}
+
+
+_local: TenantLocal[SearchStats] = TenantLocal(lambda tenant: SearchStats(_make_store(tenant)))
+
+
+def record(kind: str, query: str, results: int, seconds: float) -> None:
+    """Записать поиск (горячий путь: одно добавление в deque, ~1 мкс)."""
+    _local.get().record(kind, query, results, seconds)
+
+
+def flush() -> int:
+    """Забрать события из буфера, обновить окна задержек и записать агрегаты. Блокирующая."""
+    return _local.get().flush()
+
+
+def top_queries(days: int, limit: int = 10, empty_only: bool = False) -> List[Tuple[str, str, int, int]]:
+    """Самые частые (или чаще всего пустые) запросы за последние days дней."""
+    since = (datetime.utcnow() - timedelta(days=days - 1)).strftime("%Y-%m-%d")
+    return _local.get().store.top(since, limit, empty_only)
+
+
+def latency() -> Dict[str, Dict[str, float]]:
+    """Перцентили задержки по видам поиска (последние 1000 событий каждого вида)."""
+    return _local.get().latency()
+
+
+def start() -> None:
+    """Фоновая задача: раз в SEARCH_STATS_FLUSH_INTERVAL сбрасывать буфер в рабочем потоке."""
+    _local.get().start()
+
+
+async def stop() -> None:
+    """Остановить фоновую задачу и сбросить остаток буфера."""
+    await _local.get().stop()
+
+
+def stats() -> Dict[str, Any]:
+    return _local.get().stats()
+
+
+metrics.register("search_stats", stats)
@@ -0,0 +1,256 @@
+# -*- coding: utf-8 -*-
+"""
+Быстрый старт и отчёт о времени запуска.
+Режим STARTUP_MODE:
+- fast — long polling начинается сразу после initialize(); список команд и прогрев
+  (загрузка контента, индекс inline-поиска, users.db) выполняются в фоне после post_init.
+  Обработчики, читающие прогреваемые данные (контент, индексы, users.db; декоратор
+  needs_warmup), до конца прогрева своего арендатора ждут asyncio-события, а не lock потока
+  прогрева: цикл событий не блокируется, остальные апдейты (меню, калькулятор темпа, другие
+  арендаторы) обрабатываются сразу. /start пишет в users.db из рабочего потока и не ждёт прогрева;
+- eager — прогрев в post_init, апдейты принимаются только после загрузки контента;
+- lazy — без прогрева: всё загружается при первом обращении.
+Прогреваемые части регистрируются модулями через register_warmup(имя, функция), как метрики.
+Время запуска: install_import_timer() в начале main.py ставит в sys.meta_path искатель,
+который замеряет выполнение каждого импортируемого модуля (своё время и вместе
+с вложенными импортами); этапы инициализации размечаются через phase(имя).
+Отчёт — report() (команда /startup), сводка — в /metrics (группа startup).
+"""
+
+import asyncio
+import contextvars
+import functools
+import logging
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Awaitable, Callable, Dict, Iterator, List, Tuple, TypeVar
+
+from config import STARTUP_MODE
+from services import metrics, tenants
+
+logger = logging.getLogger(__name__)
+
+# Точка отсчёта — импорт этого модуля (первая строка main.py)
+_t0 = time.perf_counter()
+# модуль -> (всего мс, своё мс)
+_imports: Dict[str, Tuple[float, float]] = {}
+# (этап, начало от старта мс, длительность мс)
+_phases: List[Tuple[str, float, float]] = []
+_marks: Dict[str, float] = {}
+_warmups: List[Tuple[str, Callable[[], Any]]] = []
+_warmup_errors: List[str] = []
+_warm_lock = threading.Lock()
+_local = threading.local()
+# Арендатор -> событие «фоновый прогрев завершён» (режим fast)
+_warmed: Dict[str, asyncio.Event] = {}
+
+R = TypeVar("R")
+
+
+def _since_start() -> float:
+    return (time.perf_counter() - _t0) * 1000
+
+
+class _ImportTimer:
+    """
+    Искатель модулей в начале sys.meta_path: находит спецификацию остальными искателями
+    и подменяет exec_module у экземпляра загрузчика на замеряющую обёртку (на время одного
+    импорта). Встроенные и замороженные модули (загрузчик — класс) не замеряются.
+    """
+
+    def find_spec(self, fullname: str, path: Any, target: Any = None) -> Any:
+        for finder in sys.meta_path:
+            if finder is self or not hasattr(finder, "find_spec"):
+                continue
+            spec = finder.find_spec(fullname, path, target)
+            if spec is not None:
+                break
+        else:
+            return None
+        loader = spec.loader
+        exec_module = getattr(type(loader), "exec_module", None)
+        if loader is None or isinstance(loader, type) or exec_module is None:
+            return spec
+        try:
+            loader.exec_module = _timed(fullname, loader, exec_module)
+        except AttributeError:
+            pass
+        return spec
+
+
+def _timed(name: str, loader: Any, exec_module: Callable[[Any, Any], None]) -> Callable[[Any], None]:
+    def wrapper(module: Any) -> None:
+        stack = _local.__dict__.setdefault("stack", [])
+        stack.append(0.0)
+        started = time.perf_counter()
+        try:
+            exec_module(loader, module)
+        finally:
+            total = time.perf_counter() - started
+            children = stack.pop()
+            if stack:
+                stack[-1] += total
+            _imports[name] = (total * 1000, (total - children) * 1000)
+            loader.__dict__.pop("exec_module", None)
+
+    return wrapper
+
+
+def install_import_timer() -> None:
+    """Замерять импорт всех следующих модулей (вызывать до остальных импортов)."""
+    if not any(isinstance(f, _ImportTimer) for f in sys.meta_path):
+        sys.meta_path.insert(0, _ImportTimer())
+
+
+@contextmanager
+def phase(name: str) -> Iterator[None]:
+    """Замерить этап запуска (в отчёте — начало от старта и длительность)."""
+    started = _since_start()
+    try:
+        yield
+    finally:
+        _phases.append((name, started, _since_start() - started))
+
+
+def mark(name: str) -> None:
+    """Отметить момент запуска (например, ready — бот начал принимать апдейты)."""
+    _marks.setdefault(name, _since_start())
+
+
+def register_warmup(name: str, warm: Callable[[], Any]) -> None:
+    """Добавить прогрев: блокирующая функция, выполняется один раз при старте в порядке регистрации."""
+    _warmups.append((name, warm))
+
+
+def warm_up(scope: str = "") -> None:
+    """
+    Выполнить все прогревы (блокирующая; в режиме fast — в рабочем потоке).
+    scope — арендатор: этапы warmup.<scope>.<имя>, данные — текущего арендатора.
+    """
+    prefix = f"{scope}." if scope else ""
+    # Арендаторы прогреваются по очереди: рост памяти каждого замеряется отдельно
+    with _warm_lock:
+        for name, warm in _warmups:
+            try:
+                with phase(f"warmup.{prefix}{name}"):
+                    warm()
+            except Exception:
+                logger.exception("Прогрев %s не удался — загрузится при первом обращении", prefix + name)
+                _warmup_errors.append(prefix + name)
+        # Отметка warm — конец последнего прогрева (все арендаторы прогреты)
+        _marks["warm"] = _since_start()
+
+
+def module_times(top: int = 15) -> List[Tuple[str, float, float]]:
+    """Самые долгие по собственному времени модули: (модуль, своё мс, всего мс)."""
+    rows = sorted(_imports.items(), key=lambda item: -item[1][1])[:top]
+    return [(name, own, total) for name, (total, own) in rows]
+
+
+def package_times() -> List[Tuple[str, float, int]]:
+    """Собственное время импорта по пакетам верхнего уровня: (пакет, мс, модулей)."""
+    totals: Dict[str, List[float]] = {}
+    for name, (_, own) in _imports.items():
+        row = totals.setdefault(name.partition(".")[0], [0.0, 0])
+        row[0] += own
+        row[1] += 1
+    rows = [(pkg, ms, int(n)) for pkg, (ms, n) in totals.items()]
+    rows.sort(key=lambda r: -r[1])
+    return rows
+
+
+def summary() -> str:
+    ready = _marks.get("ready")
+    warm = _marks.get("warm")
+    imports = sum(own for _, own in _imports.values())
+    parts = [f"режим {STARTUP_MODE}", f"импорт {imports:.0f} мс ({len(_imports)} модулей)"]
+    if ready is not None:
+        parts.append(f"апдейты принимаются через {ready:.0f} мс")
+    if warm is not None:
+        parts.append(f"прогрев завершён через {warm:.0f} мс")
+    if _warmup_errors:
+        parts.append(f"ошибки прогрева: {', '.join(_warmup_errors)}")
+    return ", ".join(parts)
+
+
+def report(top: int = 15) -> str:
+    """Отчёт о запуске: этапы, импорт по пакетам и самые долгие модули (HTML)."""
+    lines = ["🚀 <b>Запуск</b>", summary(), "", "<b>Отметки</b> (мс от старта):"]
+    for name, at in sorted(_marks.items(), key=lambda item: item[1]):
+        lines.append(f"{name}: {at:.0f}")
+    lines += ["", "<b>Этапы</b> (начало / длительность, мс):"]
+    for name, started, duration in _phases:
+        lines.append(f"{name}: {started:.0f} / {duration:.1f}")
+    lines += ["", "<b>Импорт по пакетам</b> (своё время, мс / модулей):"]
+    for pkg, ms, n in package_times()[:top]:
+        lines.append(f"{pkg}: {ms:.1f} / {n}")
+    lines += ["", "<b>Модули</b> (своё / с вложенными, мс):"]
+    for name, own, total in module_times(top):
+        lines.append(f"{name}: {own:.1f} / {total:.1f}")
+    return "\n".join(lines)
+
+
+def stats() -> Dict[str, Any]:
+    project = ("config", "main", "handlers", "database", "services")
+    return {
+        "mode": STARTUP_MODE,
+        "ready_ms": _marks.get("ready", 0.0),
+        "warm_ms": _marks.get("warm", 0.0),
+        "import_ms": sum(own for _, own in _imports.values()),
+        "project_import_ms": sum(own for name, (_, own) in _imports.items() if name.partition(".")[0] in project),
+        "modules": len(_imports),
+        "warmup_errors": len(_warmup_errors),
+    }
+
+
+def _warm_in_background(scope: str, loop: asyncio.AbstractEventLoop, done: asyncio.Event) -> None:
+    try:
+        warm_up(scope)
+        logger.info("Запуск: %s", summary())
+    finally:
+        loop.call_soon_threadsafe(done.set)
+
+
+def warmup_thread(scope: str = "") -> threading.Thread:
+    """
+    Запустить прогрев в фоновом потоке-демоне (режим fast); итог — в лог.
+    Поток получает копию текущего контекста — прогревает данные текущего арендатора.
+    Вызывать из цикла событий: по окончании прогрева срабатывает событие арендатора (needs_warmup).
+    """
+    done = _warmed[tenants.current().name] = asyncio.Event()
+    context = contextvars.copy_context()
+    thread = threading.Thread(
+        target=context.run,
+        args=(_warm_in_background, scope, asyncio.get_running_loop(), done),
+        name="startup-warmup",
+        daemon=True,
+    )
+    thread.start()
+    return thread
+
+
+async def wait_warm() -> None:
+    """Дождаться фонового прогрева текущего арендатора (сразу, если его нет или он закончен)."""
+    done = _warmed.get(tenants.current().name)
+    if done is not None and not done.is_set():
+        await done.wait()
+
+
+def needs_warmup(callback: Callable[..., Awaitable[R]]) -> Callable[..., Awaitable[R]]:
+    """
+    Обработчик читает прогреваемые данные (get_db(), индексы, users.db): в режиме fast сначала
+    дождаться прогрева, иначе синхронное обращение в цикле событий ждало бы lock, который держит
+    поток прогрева, и останавливало все апдейты.
+    """
+
+    @functools.wraps(callback)
+    async def wrapper(*args: Any, **kwargs: Any) -> R:
+        await wait_warm()
+        return await callback(*args, **kwargs)
+
+    return wrapper
+
+
+metrics.register("startup", stats)
@@ -0,0 +1,172 @@
+# -*- coding: utf-8 -*-
+"""
+Арендаторы (клубы): несколько ботов со своими токенами в одном процессе.
+Список — JSON-файл RUNNING_BOT_TENANTS: {"tenants": [{"name", "token" или "token_env",
+"data_dir", "admin_ids"}]}; без него работает один арендатор default из config.py.
+У каждого арендатора свой Application, свои данные (папка data_dir: контент, подписчики,
+состояние диалогов, статистика поиска), кэши и список админов. Общие — код, обработчики
+и маршрутизатор, нормализация запросов.
+Текущий арендатор — в contextvars: задачи и asyncio.to_thread наследуют его от задачи
+арендатора, поэтому get_db(), users_store и прочие берут свои данные без передачи
+арендатора в каждый вызов. Значение «на арендатора» — TenantLocal.
+"""
+
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Any, Callable, Dict, Generic, Iterator, List, NamedTuple, Optional, Tuple, TypeVar
+
+from config import ADMIN_IDS, BOT_TOKEN, DATA_DIR
+from services import metrics
+from services.metrics import LatencyWindow
+
+T = TypeVar("T")
+
+
+class Tenant(NamedTuple):
+    name: str
+    token: str
+    data_dir: Path
+    admin_ids: Tuple[int, ...]
+
+    def path(self, default: Path) -> Path:
+        """Файл арендатора: путь из config.py (внутри DATA_DIR), перенесённый в его data_dir."""
+        return self.data_dir / default.relative_to(DATA_DIR)
+
+
+DEFAULT = Tenant("default", BOT_TOKEN or "", DATA_DIR, tuple(ADMIN_IDS))
+
+_current: ContextVar[Tenant] = ContextVar("tenant", default=DEFAULT)
+
+
+def current() -> Tenant:
+    """Арендатор текущей задачи (или потока, запущенного из неё через to_thread)."""
+    return _current.get()
+
+
+def activate(tenant: Tenant) -> None:
+    """Сделать tenant текущим для этой задачи и всех задач и потоков, созданных из неё."""
+    _current.set(tenant)
+
+
+class TenantLocal(Generic[T]):
+    """Значение на арендатора: создаётся factory(арендатор) при первом обращении из его контекста."""
+
+    def __init__(self, factory: Callable[[Tenant], T]) -> None:
+        self._factory = factory
+        self._values: Dict[str, T] = {}
+        self._lock = threading.Lock()
+
+    def get(self) -> T:
+        tenant = _current.get()
+        value = self._values.get(tenant.name)
+        if value is None:
+            with self._lock:
+                value = self._values.get(tenant.name)
+                if value is None:
+                    value = self._values[tenant.name] = self._factory(tenant)
+        return value
+
+    def peek(self, tenant: Tenant) -> Optional[T]:
+        """Значение арендатора tenant, если уже создано (без создания и смены контекста)."""
+        return self._values.get(tenant.name)
+
+
+def load_tenants(path: Path) -> List[Tenant]:
+    """Арендаторы из JSON-файла; data_dir — относительно папки файла, admin_ids — по умолчанию ADMIN_IDS."""
+    with open(path, "r", encoding="utf-8") as f:
+        items = json.load(f)["tenants"]
+    tenants = []
+    for item in items:
+        name = str(item["name"])
+        token = item.get("token") or os.getenv(item.get("token_env", ""), "")
+        if not token:
+            raise ValueError(f"Арендатор {name!r}: не задан token или переменная token_env")
+        data_dir = path.parent / item.get("data_dir", name)
+        admin_ids = tuple(int(x) for x in item.get("admin_ids", ADMIN_IDS))
+        tenants.append(Tenant(name, token, data_dir.resolve(), admin_ids))
+    names = [t.name for t in tenants]
+    if len(set(names)) != len(names) or len({t.data_dir for t in tenants}) != len(tenants):
+        raise ValueError("Имена и папки данных арендаторов должны быть разными")
+    return tenants
+
+
+# --- Отчёт по арендаторам ---
+
+class _TenantStats:
+    def __init__(self) -> None:
+        self.updates = 0
+        self.errors = 0
+        self.latency = LatencyWindow()
+        # Что загружено (контент, индексы) -> (рост RSS в байтах, длительность в сек)
+        self.loads: Dict[str, Tuple[int, float]] = {}
+
+
+_known: Dict[str, Tenant] = {DEFAULT.name: DEFAULT}
+_stats = TenantLocal(lambda tenant: _TenantStats())
+# Размер кэша арендатора в байтах: имя -> функция(арендатор); регистрируют модули с TenantLocal-кэшами
+_cache_sizes: Dict[str, Callable[[Tenant], int]] = {}
+
+
+def register(tenants: List[Tenant]) -> None:
+    """Арендаторы процесса (для отчёта /metrics, группа tenants)."""
+    _known.clear()
+    _known.update((t.name, t) for t in tenants)
+
+
+def observe_update(seconds: float, failed: bool = False) -> None:
+    """Обработан апдейт текущего арендатора за seconds секунд."""
+    stats = _stats.get()
+    stats.updates += 1
+    stats.errors += failed
+    stats.latency.observe(seconds)
+
+
+@contextmanager
+def measure_load(name: str) -> Iterator[None]:
+    """
+    Замер загрузки name (контент, индекс) текущего арендатора: рост RSS и время.
+    Рост RSS точен, пока загрузки арендаторов идут по очереди (прогрев при старте).
+    """
+    rss, started = rss_bytes(), time.perf_counter()
+    yield
+    _stats.get().loads[name] = (max(rss_bytes() - rss, 0), time.perf_counter() - started)
+
+
+def register_cache_size(name: str, size: Callable[[Tenant], int]) -> None:
+    """Добавить в отчёт размер кэша арендатора (size(арендатор) — байты, 0 если кэша ещё нет)."""
+    _cache_sizes[name] = size
+
+
+def rss_bytes() -> int:
+    """Текущий RSS процесса (Linux: /proc/self/statm; иначе 0)."""
+    try:
+        with open("/proc/self/statm", "r") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return 0
+
+
+def report() -> Dict[str, Dict[str, Any]]:
+    """По арендаторам: апдейты, задержка обработки, память контента и кэшей."""
+    result: Dict[str, Dict[str, Any]] = {}
+    for tenant in _known.values():
+        stats = _stats.peek(tenant) or _TenantStats()
+        row: Dict[str, Any] = {"updates": stats.updates, "errors": stats.errors, **stats.latency.percentiles()}
+        for name, (allocated, seconds) in stats.loads.items():
+            row[f"{name}_mb"] = allocated / 2 ** 20
+            row[f"{name}_load_ms"] = seconds * 1000
+        row["caches_mb"] = sum(size(tenant) for size in _cache_sizes.values()) / 2 ** 20
+        result[tenant.name] = row
+    return result
+
+
+def _flat_report() -> Dict[str, Any]:
+    return {f"{name}.{key}": value for name, row in report().items() for key, value in row.items()}
+
+
+metrics.register("tenants", _flat_report)
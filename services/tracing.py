@@ -0,0 +1,280 @@
+# -*- coding: utf-8 -*-
+"""
+Трассировка апдейтов: у каждого апдейта свой trace id, внутри — спаны обработчика,
+вызовов хранилища (get_db(), users_store), отрисовки карточек и исходящих запросов
+к Bot API. Текущий спан хранится в contextvars, поэтому задачи, запущенные из
+обработчика (create_task), становятся его дочерними спанами.
+Семплирование решается один раз на апдейт (TRACE_SAMPLE_RATE): в невыбранных апдейтах
+span() возвращает общий пустой объект — одно чтение ContextVar на вызов.
+Завершённые спаны кладутся в очередь; отдельный поток дописывает их строками JSON
+в data/traces.jsonl. Если очередь полна, спан отбрасывается и учитывается в метриках.
+"""
+
+import functools
+import inspect
+import json
+import logging
+import os
+import queue
+import random
+import threading
+import time
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, List, Optional, TypeVar
+
+from telegram.ext import Application, BaseHandler
+
+from config import TRACE_MAX_SPANS, TRACE_QUEUE_SIZE, TRACE_SAMPLE_RATE, TRACES_JSONL
+from services import metrics, tenants
+
+logger = logging.getLogger(__name__)
+
+F = TypeVar("F", bound=Callable[..., Any])
+
+_current: ContextVar[Optional["Span"]] = ContextVar("trace_span", default=None)
+_queue: "queue.Queue[Optional[Dict[str, Any]]]" = queue.Queue(maxsize=TRACE_QUEUE_SIZE)
+_writer: Optional[threading.Thread] = None
+_writer_lock = threading.Lock()
+_stats = {"traces": 0, "spans": 0, "dropped": 0, "over_limit": 0, "written": 0, "errors": 0}
+
+
+class _Trace:
+    """Общее состояние спанов одного апдейта."""
+
+    __slots__ = ("trace_id", "spans")
+
+    def __init__(self) -> None:
+        self.trace_id = os.urandom(8).hex()
+        self.spans = 0
+
+
+class Span:
+    """Интервал работы внутри трейса; используется как контекстный менеджер."""
+
+    __slots__ = ("_trace", "span_id", "parent_id", "name", "attrs", "_start", "_t0", "_token")
+
+    def __init__(self, trace: _Trace, parent_id: Optional[str], name: str, attrs: Dict[str, Any]) -> None:
+        self._trace = trace
+        self.span_id = os.urandom(4).hex()
+        self.parent_id = parent_id
+        self.name = name
+        self.attrs = attrs
+        self._token = None
+
+    @property
+    def trace_id(self) -> str:
+        return self._trace.trace_id
+
+    def set(self, **attrs: Any) -> None:
+        """Добавить атрибуты (например, число результатов после вызова)."""
+        self.attrs.update(attrs)
+
+    def __enter__(self) -> "Span":
+        self._start = time.time()
+        self._t0 = time.perf_counter()
+        self._token = _current.set(self)
+        return self
+
+    def __exit__(self, exc_type: Any, exc: Any, tb: Any) -> None:
+        duration = time.perf_counter() - self._t0
+        _current.reset(self._token)
+        record = {
+            "trace_id": self._trace.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "start": round(self._start, 6),
+            "duration_ms": round(duration * 1000, 3),
+        }
+        if self.attrs:
+            record["attrs"] = self.attrs
+        if exc_type is not None:
+            record["error"] = exc_type.__name__
+        _emit(record)
+
+
+class _NoopSpan:
+    """Спан невыбранного апдейта: ничего не замеряет и не пишет."""
+
+    __slots__ = ()
+    trace_id = None
+
+    def set(self, **attrs: Any) -> None:
+        pass
+
+    def __enter__(self) -> "_NoopSpan":
+        return self
+
+    def __exit__(self, exc_type: Any, exc: Any, tb: Any) -> None:
+        pass
+
+
+_NOOP = _NoopSpan()
+
+
+def trace(name: str, **attrs: Any) -> Any:
+    """Корневой спан нового трейса (с вероятностью TRACE_SAMPLE_RATE), иначе пустой спан."""
+    if TRACE_SAMPLE_RATE <= 0 or random.random() >= TRACE_SAMPLE_RATE:
+        return _NOOP
+    _stats["traces"] += 1
+    t = _Trace()
+    t.spans = 1
+    return Span(t, None, name, attrs)
+
+
+def span(name: str, **attrs: Any) -> Any:
+    """Дочерний спан текущего; вне выбранного трейса — пустой спан."""
+    parent = _current.get()
+    if parent is None:
+        return _NOOP
+    t = parent._trace
+    if t.spans >= TRACE_MAX_SPANS:
+        # Например, построение индекса инлайн-поиска форматирует тысячи карточек
+        _stats["over_limit"] += 1
+        return _NOOP
+    t.spans += 1
+    return Span(t, parent.span_id, name, attrs)
+
+
+def current_span() -> Any:
+    """Текущий спан (или пустой), чтобы дописать атрибуты из глубины вызовов."""
+    return _current.get() or _NOOP
+
+
+def current_trace_id() -> Optional[str]:
+    s = _current.get()
+    return s.trace_id if s is not None else None
+
+
+def traced(name: Optional[str] = None) -> Callable[[F], F]:
+    """
+    Декоратор: вызов функции — дочерний спан name (по умолчанию «модуль.функция»).
+    Работает и для обычных, и для async-функций.
+    """
+
+    def decorator(fn: F) -> F:
+        span_name = name or f"{fn.__module__.rsplit('.', 1)[-1]}.{fn.__name__}"
+
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args: Any, **kwargs: Any) -> Any:
+                if _current.get() is None:
+                    return await fn(*args, **kwargs)
+                with span(span_name):
+                    return await fn(*args, **kwargs)
+
+            return async_wrapper  # type: ignore[return-value]
+
+        @functools.wraps(fn)
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            if _current.get() is None:
+                return fn(*args, **kwargs)
+            with span(span_name):
+                return fn(*args, **kwargs)
+
+        return wrapper  # type: ignore[return-value]
+
+    return decorator
+
+
+def trace_handler(handler: BaseHandler) -> BaseHandler:
+    """Обернуть callback хендлера в спан «handler.<имя функции>» (повторно не оборачивает)."""
+    callback = handler.callback
+    if not getattr(callback, "_traced", False):
+        handler.callback = traced(f"handler.{callback.__name__}")(callback)
+        handler.callback._traced = True  # type: ignore[attr-defined]
+    return handler
+
+
+def _update_attrs(update: Any) -> Dict[str, Any]:
+    attrs: Dict[str, Any] = {"update_id": getattr(update, "update_id", None)}
+    for kind in ("message", "callback_query", "inline_query"):
+        if getattr(update, kind, None) is not None:
+            attrs["kind"] = kind
+            break
+    user = getattr(update, "effective_user", None)
+    if user is not None:
+        attrs["user_id"] = user.id
+    return attrs
+
+
+class TracedApplication(Application):
+    """
+    Application, в котором обработка каждого апдейта — корневой спан «update»;
+    время обработки учитывается в отчёте арендатора (services/tenants.py).
+    """
+
+    async def process_update(self, update: object) -> None:
+        started = time.perf_counter()
+        failed = True
+        try:
+            if TRACE_SAMPLE_RATE <= 0:
+                await super().process_update(update)
+            else:
+                with trace("update", **_update_attrs(update)):
+                    await super().process_update(update)
+            failed = False
+        finally:
+            tenants.observe_update(time.perf_counter() - started, failed)
+
+
+# --- Запись ---
+
+
+def _emit(record: Dict[str, Any]) -> None:
+    _stats["spans"] += 1
+    if _writer is None:
+        _start_writer()
+    try:
+        _queue.put_nowait(record)
+    except queue.Full:
+        _stats["dropped"] += 1
+
+
+def _start_writer() -> None:
+    global _writer
+    with _writer_lock:
+        if _writer is None:
+            _writer = threading.Thread(target=_write_loop, name="trace-writer", daemon=True)
+            _writer.start()
+
+
+def _write_loop() -> None:
+    while True:
+        batch: List[Optional[Dict[str, Any]]] = [_queue.get()]
+        while len(batch) < 1000:
+            try:
+                batch.append(_queue.get_nowait())
+            except queue.Empty:
+                break
+        stop = None in batch
+        lines = [json.dumps(r, ensure_ascii=False, default=str) + "\n" for r in batch if r is not None]
+        if lines:
+            try:
+                TRACES_JSONL.parent.mkdir(parents=True, exist_ok=True)
+                with open(TRACES_JSONL, "a", encoding="utf-8") as f:
+                    f.writelines(lines)
+                _stats["written"] += len(lines)
+            except OSError:
+                logger.exception("Не удалось записать трейсы")
+                _stats["errors"] += 1
+        if stop:
+            return
+
+
+def shutdown(timeout: float = 5.0) -> None:
+    """Дописать очередь и остановить поток записи (блокирующая)."""
+    global _writer
+    with _writer_lock:
+        writer, _writer = _writer, None
+    if writer is None:
+        return
+    _queue.put(None)
+    writer.join(timeout)
+
+
+def stats() -> Dict[str, Any]:
+    return {**_stats, "sample_rate": TRACE_SAMPLE_RATE, "queued": _queue.qsize()}
+
+
+metrics.register("tracing", stats)
@@ -0,0 +1,181 @@
+# -*- coding: utf-8 -*-
+"""
+HTTP-транспорт к Bot API: два профиля с отдельными пулами соединений —
+updates (long polling getUpdates, одно долгое соединение) и sends (ответы и рассылки).
+Параметры профилей — в config.py (HTTP_*): размер пула, сколько соединений держать
+открытыми между запросами и сколько секунд, таймауты, версия HTTP.
+Каждый запрос проходит через InstrumentedTransport: по событиям трассировки httpcore
+видно, ждал ли запрос свободного соединения в пуле, открыл новое соединение или
+переиспользовал готовое. Сводка — в /metrics (transport.updates, transport.sends).
+"""
+
+import logging
+import ssl
+import time
+from typing import Any, Dict, NamedTuple, Optional
+
+import httpx
+from telegram.request import HTTPXRequest
+
+from config import (
+    HTTP_CONNECT_TIMEOUT,
+    HTTP_KEEPALIVE_EXPIRY,
+    HTTP_READ_TIMEOUT,
+    HTTP_SEND_KEEPALIVE,
+    HTTP_SEND_POOL_SIZE,
+    HTTP_SEND_POOL_TIMEOUT,
+    HTTP_UPDATES_POOL_SIZE,
+    HTTP_VERSION,
+    HTTP_WRITE_TIMEOUT,
+)
+from services import metrics
+from services.metrics import LatencyWindow
+
+logger = logging.getLogger(__name__)
+
+_ssl: Optional[ssl.SSLContext] = None
+
+
+class TransportProfile(NamedTuple):
+    pool_size: int
+    keepalive: int
+    keepalive_expiry: float
+    connect_timeout: float
+    read_timeout: float
+    write_timeout: float
+    pool_timeout: float
+    http_version: str
+
+
+PROFILES: Dict[str, TransportProfile] = {
+    # Один getUpdates за раз; соединение живёт между опросами
+    "updates": TransportProfile(
+        pool_size=HTTP_UPDATES_POOL_SIZE,
+        keepalive=HTTP_UPDATES_POOL_SIZE,
+        keepalive_expiry=HTTP_KEEPALIVE_EXPIRY,
+        connect_timeout=HTTP_CONNECT_TIMEOUT,
+        read_timeout=HTTP_READ_TIMEOUT,
+        write_timeout=HTTP_WRITE_TIMEOUT,
+        pool_timeout=HTTP_SEND_POOL_TIMEOUT,
+        http_version=HTTP_VERSION,
+    ),
+    "sends": TransportProfile(
+        pool_size=HTTP_SEND_POOL_SIZE,
+        keepalive=HTTP_SEND_KEEPALIVE,
+        keepalive_expiry=HTTP_KEEPALIVE_EXPIRY,
+        connect_timeout=HTTP_CONNECT_TIMEOUT,
+        read_timeout=HTTP_READ_TIMEOUT,
+        write_timeout=HTTP_WRITE_TIMEOUT,
+        pool_timeout=HTTP_SEND_POOL_TIMEOUT,
+        http_version=HTTP_VERSION,
+    ),
+}
+
+
+class InstrumentedTransport(httpx.AsyncBaseTransport):
+    """
+    Обёртка над AsyncHTTPTransport: ожидание соединения (от входа в транспорт до
+    открытия нового соединения или отправки заголовков по готовому), время установки
+    соединения и доля переиспользованных соединений.
+    """
+
+    def __init__(self, name: str, inner: httpx.AsyncBaseTransport) -> None:
+        self.name = name
+        self._inner = inner
+        self.requests = 0
+        self.new_connections = 0
+        self.reused = 0
+        self.errors = 0
+        self.in_flight = 0
+        self._wait = LatencyWindow()
+        self._connect = LatencyWindow()
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        started = time.perf_counter()
+        state: Dict[str, Any] = {"waited": False, "connect_at": None}
+
+        async def trace(event: str, info: Dict[str, Any]) -> None:
+            now = time.perf_counter()
+            if event == "connection.connect_tcp.started":
+                state["connect_at"] = now
+                if not state["waited"]:
+                    state["waited"] = True
+                    self._wait.observe(now - started)
+            elif event.endswith(".send_request_headers.started"):
+                if state["connect_at"] is not None:
+                    self.new_connections += 1
+                    self._connect.observe(now - state["connect_at"])
+                else:
+                    self.reused += 1
+                if not state["waited"]:
+                    state["waited"] = True
+                    self._wait.observe(now - started)
+
+        request.extensions["trace"] = trace
+        self.requests += 1
+        self.in_flight += 1
+        try:
+            return await self._inner.handle_async_request(request)
+        except httpx.TransportError:
+            self.errors += 1
+            raise
+        finally:
+            self.in_flight -= 1
+
+    async def aclose(self) -> None:
+        await self._inner.aclose()
+
+    def stats(self) -> Dict[str, Any]:
+        used = self.new_connections + self.reused
+        wait = self._wait.percentiles()
+        connect = self._connect.percentiles()
+        return {
+            "requests": self.requests,
+            "in_flight": self.in_flight,
+            "new_connections": self.new_connections,
+            "reuse_rate": self.reused / used if used else 0.0,
+            "errors": self.errors,
+            "wait_p50_ms": wait.get("p50_ms", 0.0),
+            "wait_p99_ms": wait.get("p99_ms", 0.0),
+            "connect_p50_ms": connect.get("p50_ms", 0.0),
+        }
+
+
+def _ssl_context() -> ssl.SSLContext:
+    """Один SSL-контекст на все профили: загрузка сертификатов certifi — ~20 мс на каждый."""
+    global _ssl
+    if _ssl is None:
+        _ssl = httpx.create_ssl_context()
+    return _ssl
+
+
+def make_request(name: str, scope: str = "") -> HTTPXRequest:
+    """
+    HTTPXRequest для профиля name (updates или sends) с учётом соединений в /metrics
+    (группа transport.<name>, для арендатора — transport.<scope>.<name>).
+    """
+    p = PROFILES[name]
+    http2 = p.http_version in ("2", "2.0")
+    if http2:
+        try:
+            import h2  # noqa: F401
+        except ImportError:
+            logger.warning("HTTP/2 недоступен (нужен пакет httpx[http2]), используется HTTP/1.1")
+            http2 = False
+    limits = httpx.Limits(
+        max_connections=p.pool_size,
+        max_keepalive_connections=p.keepalive,
+        keepalive_expiry=p.keepalive_expiry,
+    )
+    inner = httpx.AsyncHTTPTransport(verify=_ssl_context(), limits=limits, http1=not http2, http2=http2)
+    transport = InstrumentedTransport(name, inner)
+    metrics.register(f"transport.{scope}.{name}" if scope else f"transport.{name}", transport.stats)
+    return HTTPXRequest(
+        connection_pool_size=p.pool_size,
+        connect_timeout=p.connect_timeout,
+        read_timeout=p.read_timeout,
+        write_timeout=p.write_timeout,
+        pool_timeout=p.pool_timeout,
+        http_version="2" if http2 else "1.1",
+        httpx_kwargs={"transport": transport},
+    )
@@ -0,0 +1,181 @@
+# -*- coding: utf-8 -*-
+"""
+Тёплый перезапуск: после деплоя бот не начинает с пустых кэшей.
+При остановке (post_shutdown) горячие записи кэшей — выдача поиска query_cache (в том числе
+готовые ответы универсального поиска) и готовые inline-карточки — сохраняются в файл
+WARM_STATE_PATH арендатора вместе с версией формата и версией контента; без
+STATE_PERSISTENCE туда же попадают курсоры листания пользователей (с ним они уже в state.db).
+При запуске (post_init, до приёма апдейтов) файл восстанавливается, только если версия
+контента совпадает: ключи кэшей заканчиваются версией, и чужая выдача не нужна.
+Затем шаг прогрева top_queries (регистрирует handlers/search.py) повторяет WARM_TOP_QUERIES
+самых частых запросов за WARM_TOP_DAYS дней из статистики поиска (services/search_stats.py):
+в режиме eager — до приёма апдейтов, в fast — в фоне, как и остальной прогрев.
+Кэши и виды запросов регистрируются модулями: register_cache(имя, кэш) и
+register_replay(вид, функция), как метрики. Формат — pickle: файл пишет и читает
+только сам бот в своей папке данных.
+"""
+
+import logging
+import os
+import pickle
+import time
+from typing import Any, Callable, Dict, Hashable, Iterable, List, Optional, Tuple
+
+from config import WARM_RESTART, WARM_STATE_PATH
+from services import metrics, tenants
+from services.tenants import TenantLocal
+
+logger = logging.getLogger(__name__)
+
+# Меняется при несовместимом изменении содержимого файла: старый файл тогда пропускается
+FORMAT = 1
+
+# Имя -> функция, возвращающая кэш текущего арендатора (QueryCache: dump() / load())
+_caches: Dict[str, Callable[[], Any]] = {}
+# Вид запроса из статистики поиска -> функция, выполняющая запрос (результат попадает в кэш)
+_replays: Dict[str, Callable[[str], Any]] = {}
+_stats: TenantLocal[Dict[str, Any]] = TenantLocal(lambda tenant: {
+    "saved": 0, "save_ms": 0.0, "restored": 0, "restore_ms": 0.0, "stale": 0,
+    "cursors": 0, "replayed": 0, "replay_ms": 0.0, "replay_errors": 0,
+})
+
+
+def register_cache(name: str, cache: Callable[[], Any]) -> None:
+    """Сохранять при остановке кэш cache() (QueryCache с ключами вида (..., версия контента))."""
+    _caches[name] = cache
+
+
+def register_replay(kind: str, run: Callable[[str], Any]) -> None:
+    """Как повторить при прогреве запрос вида kind из статистики поиска."""
+    _replays[kind] = run
+
+
+def _content_version() -> str:
+    # Импорт здесь: database регистрирует свой кэш в этом модуле
+    from database import get_db
+
+    return get_db().content_version()
+
+
+def _cursors(application: Any) -> Dict[int, Dict[str, Any]]:
+    """Курсоры и режим ввода пользователей — только если их не сохраняет state.db."""
+    from database.state_store import STATE_KEYS
+
+    if application is None or application.persistence is not None:
+        return {}
+    result = {}
+    for user_id, data in application.user_data.items():
+        state = {k: data[k] for k in STATE_KEYS if data.get(k) is not None}
+        if state:
+            result[user_id] = state
+    return result
+
+
+def save(application: Any = None) -> int:
+    """
+    Сохранить горячие кэши текущего арендатора в его WARM_STATE_PATH (блокирующая;
+    при остановке бота). Возвращает число сохранённых записей.
+    """
+    if not WARM_RESTART:
+        return 0
+    started = time.perf_counter()
+    version = _content_version()
+    caches: Dict[str, List[Tuple[Hashable, Any]]] = {}
+    for name, cache in _caches.items():
+        caches[name] = [(k, v) for k, v in cache().dump() if isinstance(k, tuple) and k[-1] == version]
+    state = {
+        "format": FORMAT,
+        "content_version": version,
+        "saved_at": time.time(),
+        "caches": caches,
+        "cursors": _cursors(application),
+    }
+    path = tenants.current().path(WARM_STATE_PATH)
+    tmp = path.with_name(path.name + ".tmp")
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(tmp, "wb") as f:
+            pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, path)
+    except OSError:
+        logger.exception("Не удалось сохранить кэши для тёплого перезапуска")
+        return 0
+    stats = _stats.get()
+    stats["saved"] = sum(len(items) for items in caches.values())
+    stats["save_ms"] = (time.perf_counter() - started) * 1000
+    return stats["saved"]
+
+
+def _read() -> Optional[Dict[str, Any]]:
+    path = tenants.current().path(WARM_STATE_PATH)
+    try:
+        with open(path, "rb") as f:
+            state = pickle.load(f)
+    except FileNotFoundError:
+        return None
+    except Exception:
+        logger.warning("Файл тёплого перезапуска %s не читается — запуск с пустыми кэшами", path, exc_info=True)
+        return None
+    if not isinstance(state, dict) or state.get("format") != FORMAT:
+        logger.info("Файл тёплого перезапуска %s другого формата — пропущен", path)
+        return None
+    return state
+
+
+def restore(application: Any = None) -> int:
+    """
+    Восстановить кэши (и курсоры) текущего арендатора, если версия контента в файле
+    совпадает с текущей (блокирующая; до приёма апдейтов). Возвращает число записей.
+    """
+    if not WARM_RESTART:
+        return 0
+    started = time.perf_counter()
+    state = _read()
+    if state is None:
+        return 0
+    stats = _stats.get()
+    if state["content_version"] != _content_version():
+        stats["stale"] = 1
+        logger.info("Контент изменился после остановки — кэши тёплого перезапуска не восстановлены")
+        return 0
+    restored = 0
+    for name, items in state["caches"].items():
+        cache = _caches.get(name)
+        if cache is not None:
+            restored += cache().load(items)
+    if application is not None and application.persistence is None:
+        for user_id, cursor in state["cursors"].items():
+            application.user_data[user_id].update(cursor)
+        stats["cursors"] = len(state["cursors"])
+    stats["restored"] = restored
+    stats["restore_ms"] = (time.perf_counter() - started) * 1000
+    logger.info("Тёплый перезапуск: восстановлено записей кэшей %d за %.0f мс", restored, stats["restore_ms"])
+    return restored
+
+
+def replay(queries: Iterable[Tuple[str, str, int, int]]) -> int:
+    """
+    Повторить запросы (вид, запрос, поисков, пустых) — самые частые из статистики поиска
+    (шаг прогрева). Результаты попадают в кэши; возвращает число выполненных запросов.
+    """
+    if not WARM_RESTART:
+        return 0
+    started = time.perf_counter()
+    stats = _stats.get()
+    replayed = 0
+    for kind, query, _, _ in queries:
+        run = _replays.get(kind)
+        if run is None:
+            continue
+        try:
+            run(query)
+            replayed += 1
+        except Exception:
+            logger.warning("Повтор запроса %s %r не удался", kind, query, exc_info=True)
+            stats["replay_errors"] += 1
+    stats["replayed"] = replayed
+    stats["replay_ms"] = (time.perf_counter() - started) * 1000
+    return replayed
+
+
+metrics.register("warm_restart", lambda: dict(_stats.get()))